@@ -0,0 +1,68 @@
+#!/usr/bin/python
+'''
+This script compares the memory used by a synthetic, AAT-like vocabulary held
+as :mod:`skosprovider.skos` objects and as a
+:class:`skosprovider_getty.compact.CompactVocabulary`.
+
+    $ python benchmarks/compact_memory.py 100000
+'''
+import random
+import sys
+import time
+import tracemalloc
+
+from skosprovider.skos import Concept
+from skosprovider.skos import Label
+from skosprovider.skos import Note
+
+from skosprovider_getty.compact import CompactVocabularyBuilder
+
+LANGUAGES = ['en', 'nl', 'de', 'fr', 'es', 'zh-Latn-pinyin']
+WORDS = ['church', 'abbey', 'tower', 'chapel', 'cathedral', 'basilica', 'nave', 'apse', 'crypt']
+
+
+def concepts(count):
+    rnd = random.Random(42)
+    for i in range(count):
+        id = str(300000000 + i)
+        labels = [
+            Label(' '.join(rnd.sample(WORDS, 2)) + ' %d' % i, 'prefLabel', lang)
+            for lang in rnd.sample(LANGUAGES, 3)
+        ] + [Label(' '.join(rnd.sample(WORDS, 3)), 'altLabel', 'en')]
+        yield Concept(
+            id,
+            uri='http://vocab.getty.edu/aat/' + id,
+            labels=labels,
+            notes=[Note(' '.join(rnd.choices(WORDS, k=30)), 'scopeNote', 'en')],
+            broader=[str(300000000 + i // 10)] if i else [],
+            narrower=[str(300000000 + i * 10 + j) for j in range(10) if i * 10 + j < count and i * 10 + j],
+        )
+
+
+def main(count):
+    tracemalloc.start()
+    objects = list(concepts(count))
+    object_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+    builder.add_all(objects)
+    vocabulary = builder.build()
+    build_seconds = time.perf_counter() - start
+    del objects, builder
+
+    start = time.perf_counter()
+    for i in range(0, count, max(1, count // 1000)):
+        vocabulary.get_by_id(str(300000000 + i))
+    lookup_us = (time.perf_counter() - start) / len(range(0, count, max(1, count // 1000))) * 1e6
+
+    print('concepts:                    %d' % count)
+    print('skos objects, bytes/concept: %.0f' % (object_bytes / count))
+    print('compact, bytes/concept:      %.0f' % vocabulary.bytes_per_concept())
+    print('build time:                  %.2f s' % build_seconds)
+    print('get_by_id:                   %.1f us' % lookup_us)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+'''
+This script measures the latency of
+:meth:`skosprovider_getty.indexes.LabelIndex.search` with typos and missing
+accents.
+
+Pass the full AAT N-Triples dump, as downloaded from
+http://vocab.getty.edu/dataset/aat/full.zip, to measure it on the real
+label set. Without a dump a synthetic, AAT-like set of labels is used.
+
+    $ python benchmarks/fuzzy_search.py AATOut_Full.nt
+    $ python benchmarks/fuzzy_search.py 100000
+'''
+import os
+import random
+import sys
+import time
+
+from skosprovider_getty.indexes import LabelIndex
+
+LANGUAGES = ['en', 'nl', 'de', 'fr', 'es']
+WORDS = ['church', 'abbey', 'tower', 'chapel', 'cathedral', 'basilica', 'nave', 'apse', 'crypt',
+         'église', 'kerk', 'kapel', 'toren', 'abdij', 'kathedrale', 'gothic', 'romanesque',
+         'baroque', 'vault', 'buttress', 'transept', 'cloister', 'refectory']
+QUERIES = ['eglise', 'chruch', 'cathedrel', 'gothic cathedral', 'romanesqe abbey',
+           'buttres', 'kathedraal', 'cloistre', 'xylophone']
+
+
+def synthetic(index, count):
+    rnd = random.Random(42)
+    for i in range(count):
+        uri = 'http://vocab.getty.edu/aat/%d' % (300000000 + i)
+        for lang in rnd.sample(LANGUAGES, 3):
+            index.add(uri, ' '.join(rnd.sample(WORDS, 2)) + ' %d' % i, 'prefLabel', lang)
+        index.add(uri, ' '.join(rnd.sample(WORDS, 3)), 'altLabel', 'en')
+
+
+def main(arg):
+    index = LabelIndex()
+    start = time.perf_counter()
+    if os.path.exists(arg):
+        with open(arg, 'rb') as f:
+            index.load_ntriples(f)
+    else:
+        synthetic(index, int(arg))
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index.search('warm up')
+    build_seconds = time.perf_counter() - start
+
+    print('labels:             %d' % len(index))
+    print('load time:          %.2f s' % load_seconds)
+    print('trigram index time: %.2f s' % build_seconds)
+    for query in QUERIES:
+        start = time.perf_counter()
+        for i in range(10):
+            results = index.search(query, 'en', limit=10, budget=1)
+        ms = (time.perf_counter() - start) / 10 * 1000
+        print('%-20s %7.2f ms  %s' % (repr(query), ms, results[0]['label'] if results else '-'))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '100000')
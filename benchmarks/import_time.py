@@ -0,0 +1,59 @@
+#!/usr/bin/python
+'''
+This script measures the cost of `import skosprovider_getty.providers` and
+of constructing an :class:`~skosprovider_getty.providers.AATProvider` in a
+fresh interpreter, with `python -X importtime`. It also lists which heavy
+dependencies were imported.
+
+    $ python benchmarks/import_time.py 10
+'''
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ('rdflib', 'requests', 'language_tags')
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import skosprovider_getty.providers
+imported = time.perf_counter()
+provider = skosprovider_getty.providers.AATProvider({'id': 'AAT'})
+provider.get_vocabulary_uri()
+constructed = time.perf_counter()
+print(imported - start, constructed - imported, ','.join(m for m in %r if m in sys.modules))
+''' % (HEAVY,)
+
+
+def run():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, ['.', os.environ.get('PYTHONPATH')])))
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        capture_output=True, text=True, env=env, check=True
+    )
+    cumulative = {}
+    for line in res.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if cumulative_us.strip().isdigit():
+                cumulative[name.strip()] = int(cumulative_us)
+    imported, constructed, heavy = res.stdout.split(' ')
+    return float(imported), float(constructed), heavy.strip(), cumulative
+
+
+def main(count):
+    runs = [run() for i in range(count)]
+    print('runs:                %d' % count)
+    print('import providers:    %.1f ms' % (statistics.median(r[0] for r in runs) * 1000))
+    print('construct provider:  %.1f ms' % (statistics.median(r[1] for r in runs) * 1000))
+    print('heavy dependencies:  %s' % (runs[-1][2] or '-'))
+    modules = ('skosprovider_getty.providers', 'skosprovider', 'language_tags', 'rdflib', 'requests')
+    for module in modules:
+        times = [r[3][module] for r in runs if module in r[3]]
+        if times:
+            print('  %-28s %.1f ms (-X importtime)' % (module, statistics.median(times) / 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
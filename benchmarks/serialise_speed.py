@@ -0,0 +1,88 @@
+#!/usr/bin/python
+'''
+This script compares the size and speed of the ways to keep a built concept
+in a cache: the RDF/XML document that is parsed again with rdflib, a pickle,
+the JSON dict of :func:`skosprovider_getty.serialise.thing_to_dict` and the
+binary format of :func:`skosprovider_getty.serialise.encode_thing`.
+
+    $ python benchmarks/serialise_speed.py 1000
+'''
+import json
+import pickle
+import sys
+import time
+
+from rdflib.graph import Graph
+from skosprovider.skos import ConceptScheme
+
+from skosprovider_getty.serialise import decode_thing
+from skosprovider_getty.serialise import encode_thing
+from skosprovider_getty.serialise import thing_from_dict
+from skosprovider_getty.serialise import thing_to_dict
+from skosprovider_getty.utils import GVP
+from skosprovider_getty.utils import SubClassCollector
+from skosprovider_getty.utils import things_from_graph
+
+LABELS = [('churches', 'en'), ('kerken', 'nl'), ('Kirchen', 'de'), ('églises', 'fr'),
+          ('iglesias', 'es'), ('chiese', 'it'), ('教堂', 'zh')]
+
+
+def concept_rdf(id):
+    uri = 'http://vocab.getty.edu/aat/%s' % id
+    labels = ''.join(
+        '<skos:prefLabel xml:lang="%s">%s</skos:prefLabel>'
+        '<skos:altLabel xml:lang="%s">%s buildings</skos:altLabel>' % (lang, label, lang, label)
+        for label, lang in LABELS)
+    relations = ''.join(
+        '<skos:narrower rdf:resource="http://vocab.getty.edu/aat/%d"/>' % (300007500 + i) for i in range(12))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+        'xmlns:skos="http://www.w3.org/2004/02/skos/core#">'
+        '<skos:Concept rdf:about="%s">%s%s'
+        '<skos:broader rdf:resource="http://vocab.getty.edu/aat/300007391"/>'
+        '<skos:scopeNote rdf:resource="%s-scope"/>'
+        '<skos:exactMatch rdf:resource="http://id.loc.gov/authorities/subjects/sh85025615"/>'
+        '</skos:Concept>'
+        '<rdf:Description rdf:about="%s-scope">'
+        '<rdf:value xml:lang="en">Buildings used for public Christian worship, '
+        'as distinguished from chapels and cathedrals.</rdf:value>'
+        '</rdf:Description>'
+        '</rdf:RDF>' % (uri, labels, relations, uri, uri)
+    ).encode('utf-8')
+
+
+def measure(name, dump, load, things):
+    start = time.perf_counter()
+    data = [dump(thing) for thing in things]
+    dump_us = (time.perf_counter() - start) / len(things) * 1e6
+    start = time.perf_counter()
+    for d in data:
+        load(d)
+    load_us = (time.perf_counter() - start) / len(things) * 1e6
+    size = sum(len(d) for d in data) / len(things)
+    print('%-8s %8.0f bytes %10.1f us dump %10.1f us load' % (name, size, dump_us, load_us))
+
+
+def main(count):
+    scheme = ConceptScheme('http://vocab.getty.edu/aat/')
+    subclasses = SubClassCollector(GVP)
+    documents = [concept_rdf(300007466 + i) for i in range(count)]
+
+    def parse(document):
+        graph = Graph()
+        graph.parse(data=document, format='application/rdf+xml')
+        return things_from_graph(graph, subclasses, scheme)[0]
+
+    things = [parse(document) for document in documents]
+    print('concepts: %d' % count)
+    measure('rdf/xml', lambda thing: concept_rdf(thing.id), parse,
+            things[:max(1, count // 10)])
+    measure('pickle', pickle.dumps, pickle.loads, things)
+    measure('json', lambda thing: json.dumps(thing_to_dict(thing)).encode('utf-8'),
+            lambda data: thing_from_dict(json.loads(data), scheme), things)
+    measure('binary', encode_thing, lambda data: decode_thing(data, scheme), things)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
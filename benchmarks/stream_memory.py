@@ -0,0 +1,87 @@
+#!/usr/bin/python
+'''
+This script compares reading an RDF document completely before parsing it
+with parsing it while it is being received (`stream=True`). A local server
+sends a large, ULAN-like document in chunks with a small delay between
+them, like a slow connection. The peak memory is measured with
+:mod:`tracemalloc`.
+
+    $ python benchmarks/stream_memory.py 20000
+'''
+import http.server
+import sys
+import threading
+import time
+import tracemalloc
+
+from skosprovider_getty.transport import Transport
+from skosprovider_getty.utils import uri_to_graph
+
+CHUNK = 64 * 1024
+DELAY = 0.02
+
+
+def document(count):
+    names = ''.join(
+        '<skos:altLabel xml:lang="en">Name %d of a person with many names, '
+        'as found in ULAN agent records</skos:altLabel>' % i
+        for i in range(count))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+        'xmlns:skos="http://www.w3.org/2004/02/skos/core#">'
+        '<skos:Concept rdf:about="http://vocab.getty.edu/ulan/500115493">%s</skos:Concept>'
+        '</rdf:RDF>' % names
+    ).encode('utf-8')
+
+
+def serve(body):
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rdf+xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            for i in range(0, len(body), CHUNK):
+                self.wfile.write(body[i:i + CHUNK])
+                time.sleep(DELAY)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(url, stream):
+    session = Transport()
+    # Timed without tracemalloc, which slows parsing down a lot.
+    start = time.perf_counter()
+    triples = len(uri_to_graph(url, session=session, stream=stream))
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    graph = uri_to_graph(url, session=session, stream=stream)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+    return triples, seconds, peak, current
+
+
+def main(count):
+    body = document(count)
+    server = serve(body)
+    url = 'http://127.0.0.1:%d/ulan/500115493.rdf' % server.server_address[1]
+    transfer = (len(body) + CHUNK - 1) // CHUNK * DELAY
+    print('document:     %.1f MB, about %.2f s to transfer' % (len(body) / 1e6, transfer))
+    for stream in (False, True):
+        triples, seconds, peak, graph = measure(url, stream)
+        print('%-13s %d triples in %.2f s, peak %.1f MB, graph %.1f MB, peak above graph %.1f MB' % (
+            'stream:' if stream else 'read first:', triples, seconds, peak / 1e6, graph / 1e6,
+            (peak - graph) / 1e6))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+'''
+This script measures the latency of
+:meth:`skosprovider_getty.indexes.LabelIndex.suggest` on a synthetic,
+AAT-like set of labels.
+
+    $ python benchmarks/suggest_latency.py 100000
+'''
+import random
+import sys
+import time
+
+from skosprovider_getty.indexes import LabelIndex
+
+LANGUAGES = ['en', 'nl', 'de', 'fr', 'es']
+WORDS = ['church', 'abbey', 'tower', 'chapel', 'cathedral', 'basilica', 'nave', 'apse', 'crypt',
+         'église', 'kerk', 'kapel', 'toren', 'abdij', 'kathedrale']
+PREFIXES = ['c', 'ch', 'chu', 'chur', 'eg', 'ka', 'kape', 'tower 1', 'basilica apse', 'x']
+
+
+def main(count):
+    rnd = random.Random(42)
+    index = LabelIndex()
+    start = time.perf_counter()
+    for i in range(count):
+        uri = 'http://vocab.getty.edu/aat/%d' % (300000000 + i)
+        for lang in rnd.sample(LANGUAGES, 3):
+            index.add(uri, ' '.join(rnd.sample(WORDS, 2)) + ' %d' % i, 'prefLabel', lang)
+        index.add(uri, ' '.join(rnd.sample(WORDS, 3)), 'altLabel', 'en')
+    index.suggest('warm up')
+    build_seconds = time.perf_counter() - start
+
+    print('concepts:    %d' % count)
+    print('labels:      %d' % len(index))
+    print('build time:  %.2f s' % build_seconds)
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        for i in range(20):
+            index.suggest(prefix, 'nl', limit=10)
+        ms = (time.perf_counter() - start) / 20 * 1000
+        print('%-12s %.2f ms' % (repr(prefix), ms))
+    # Concepts fetched by a provider are added between the suggestions.
+    start = time.perf_counter()
+    for i in range(20):
+        index.add('http://vocab.getty.edu/aat/%d' % (400000000 + i), 'chapel %d' % i, 'prefLabel', 'en')
+        index.suggest('chur', 'nl', limit=10)
+    print('after add    %.2f ms' % ((time.perf_counter() - start) / 20 * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
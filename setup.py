@@ -27,6 +27,11 @@ setup(
     install_requires=requires,
     license='MIT',
     zip_safe=False,
+    entry_points={
+        'console_scripts': [
+            'getty_warmup = skosprovider_getty.warmup:main',
+        ],
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'Natural Language :: English',
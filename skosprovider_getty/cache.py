@@ -0,0 +1,529 @@
+'''
+This module contains caches that can be used by the providers in
+:mod:`skosprovider_getty.providers` to avoid fetching the same data from the
+Getty services over and over again.
+
+All caches store :class:`bytes` values under :class:`str` keys, so they
+can be shared between providers and, for the persistent caches, between
+processes.
+'''
+import hashlib
+import logging
+import os
+import re
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+#: String literals of a SPARQL query, or a run of whitespace outside them.
+SPARQL_LITERAL_OR_SPACE = re.compile(
+    r"""('''(?:[^\\]|\\.)*?'''"""
+    r'|"""(?:[^\\]|\\.)*?"""'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|"(?:[^"\\\n]|\\.)*")'
+    r'|\s+'
+)
+
+
+class CacheBackend:
+    '''
+    The interface every cache implements.
+
+    A cache maps string keys to bytes. Every entry can have a time to live,
+    after which it is considered expired and no longer returned.
+    '''
+
+    def get(self, key):
+        '''
+        Get a value from the cache.
+
+        :param str key: The key to look up.
+        :returns: The cached bytes or `None` if the key is not present or
+            has expired.
+        '''
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        '''
+        Get a value from the cache, together with the moment it was stored.
+
+        :param str key: The key to look up.
+        :returns: A tuple of the cached bytes and the timestamp it was
+            stored at, or `None` if the key is not present or has expired.
+        '''
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        '''
+        Store a value in the cache.
+
+        :param str key: The key to store the value under.
+        :param bytes value: The value to store.
+        :param int ttl: Optional. Number of seconds after which the value
+            expires. If not present, the default ttl of the cache is used.
+        '''
+        raise NotImplementedError()
+
+    def delete(self, key):
+        '''
+        Remove a key from the cache.
+
+        :param str key: The key to remove.
+        '''
+        raise NotImplementedError()
+
+    def clear(self):
+        '''
+        Remove all keys from the cache.
+        '''
+        raise NotImplementedError()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class MemoryCache(CacheBackend):
+    '''
+    An in-process cache that evicts the least recently used entries.
+
+    :param int maxsize: Maximum number of entries to keep.
+    :param int ttl: Default number of seconds an entry is valid. `None`
+        means entries never expire.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self._lock:
+            try:
+                value, expires, stored = self._data[key]
+            except KeyError:
+                return None
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, stored
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    '''
+    A persistent cache stored in an SQLite database.
+
+    With `wal` set, the database uses write-ahead logging, so all worker
+    processes on a host can share the same database file: readers never
+    block and writers wait up to `timeout` seconds for each other. Every
+    process uses its own connection, also after a fork.
+
+    :param str path: Path of the database file. It is created if it does not
+        exist yet.
+    :param int ttl: Default number of seconds an entry is valid. `None`
+        means entries never expire.
+    :param int maxsize: Optional. Maximum number of entries to keep. When
+        exceeded, the oldest entries are removed.
+    :param int max_bytes: Optional. Maximum total size of the values. When
+        exceeded, the oldest entries are removed.
+    :param bool wal: Use write-ahead logging to share the cache between
+        processes.
+    :param float timeout: Number of seconds to wait for another process that
+        is writing to the database.
+    '''
+
+    def __init__(self, path, ttl=None, maxsize=None, max_bytes=None, wal=False, timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.wal = wal
+        self.timeout = timeout
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._pid = None
+        self._connection()
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            # A connection must never be used across a fork.
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            if self.wal:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+            with self._conn:
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS cache ('
+                    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, stored REAL)'
+                )
+                # The total size of the values is kept up to date by
+                # triggers, so `max_bytes` never needs a full table scan.
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO cache_meta (name, value) "
+                    "SELECT 'bytes', COALESCE(SUM(LENGTH(value)), 0) FROM cache"
+                )
+                self._conn.execute(
+                    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN '
+                    "UPDATE cache_meta SET value = value + LENGTH(new.value) WHERE name = 'bytes'; END"
+                )
+                self._conn.execute(
+                    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN '
+                    "UPDATE cache_meta SET value = value - LENGTH(old.value) WHERE name = 'bytes'; END"
+                )
+                self._conn.execute(
+                    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value ON cache BEGIN '
+                    "UPDATE cache_meta SET value = value - LENGTH(old.value) + LENGTH(new.value) "
+                    "WHERE name = 'bytes'; END"
+                )
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_entry(self, key):
+        conn = self._connection()
+        with self._lock:
+            row = conn.execute(
+                'SELECT value, expires, stored FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires, stored = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return bytes(value), stored
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        conn = self._connection()
+        with self._lock, conn:
+            # A REPLACE would not fire the delete trigger.
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            conn.execute(
+                'INSERT INTO cache (key, value, expires, stored) VALUES (?, ?, ?, ?)',
+                (key, sqlite3.Binary(value), expires, now)
+            )
+            if self.maxsize is not None:
+                conn.execute(
+                    'DELETE FROM cache WHERE rowid IN ('
+                    'SELECT rowid FROM cache ORDER BY rowid '
+                    'LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?))',
+                    (self.maxsize,)
+                )
+            if self.max_bytes is not None and self._size(conn) > self.max_bytes:
+                self._evict_bytes(conn)
+
+    def _evict_bytes(self, conn):
+        # Evict the oldest entries in one batch, until there is room for a
+        # tenth of `max_bytes`, so most writes do not have to evict.
+        excess = self._size(conn) - int(self.max_bytes * 0.9)
+        cutoff = None
+        for rowid, size in conn.execute('SELECT rowid, LENGTH(value) FROM cache ORDER BY rowid'):
+            cutoff = rowid
+            excess -= size
+            if excess <= 0:
+                break
+        if cutoff is not None:
+            conn.execute('DELETE FROM cache WHERE rowid <= ?', (cutoff,))
+
+    def _size(self, conn):
+        return conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0]
+
+    @property
+    def size(self):
+        '''
+        Total number of bytes of the values in the cache.
+        '''
+        conn = self._connection()
+        with self._lock:
+            return self._size(conn)
+
+    def delete(self, key):
+        conn = self._connection()
+        with self._lock, conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        conn = self._connection()
+        with self._lock, conn:
+            conn.execute('DELETE FROM cache')
+
+    def __len__(self):
+        conn = self._connection()
+        with self._lock:
+            return conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def purge(self):
+        '''
+        Remove all expired entries.
+        '''
+        conn = self._connection()
+        with self._lock, conn:
+            conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisError(Exception):
+    '''
+    An error reply from a Redis server.
+    '''
+
+
+class RedisCache(CacheBackend):
+    '''
+    A cache stored in a Redis server, or any server speaking the Redis
+    protocol, so it can be shared by several processes and hosts.
+
+    Only a handful of commands is used (`GET`, `SET`, `DEL` and `SCAN`), so
+    no Redis client library is needed. Connection problems are logged and
+    treated as a cache miss. Limit the size of the cache by configuring
+    `maxmemory` and an eviction policy on the server. Every value is
+    prefixed with the moment it was stored, as a big-endian double.
+
+    :param str host: Host of the Redis server.
+    :param int port: Port of the Redis server.
+    :param int db: Number of the Redis database.
+    :param str prefix: Prefix for all keys, so several caches can share a
+        database.
+    :param int ttl: Default number of seconds an entry is valid. `None`
+        means entries never expire.
+    :param float timeout: Socket timeout in seconds.
+    '''
+
+    def __init__(self, host='localhost', port=6379, db=0, prefix='skosprovider_getty:',
+                 ttl=None, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.db:
+            self._send('SELECT', str(self.db))
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+        self._sock = None
+        self._reader = None
+
+    def _send(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by the Redis server.')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RedisError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self._read_reply() for i in range(length)]
+        raise RedisError('Unknown reply from the Redis server: %r' % line)
+
+    def _execute(self, *args):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._send(*args)
+            except (OSError, RedisError) as e:
+                log.warning('Redis cache at %s:%s unavailable: %s', self.host, self.port, e)
+                self._disconnect()
+                return None
+
+    def get_entry(self, key):
+        value = self._execute('GET', self.prefix + key)
+        if value is None or len(value) < 8:
+            return None
+        return value[8:], struct.unpack('>d', value[:8])[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        value = struct.pack('>d', time.time()) + value
+        if ttl is None:
+            self._execute('SET', self.prefix + key, value)
+        elif ttl > 0:
+            self._execute('SET', self.prefix + key, value, 'PX', str(int(ttl * 1000)))
+        else:
+            self.delete(key)
+
+    def delete(self, key):
+        self._execute('DEL', self.prefix + key)
+
+    def clear(self):
+        cursor = b'0'
+        while True:
+            reply = self._execute('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', '1000')
+            if reply is None:
+                return
+            cursor, keys = reply
+            if keys:
+                self._execute('DEL', *keys)
+            if cursor == b'0':
+                return
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+class BackgroundRefresher:
+    '''
+    Refreshes stale cache entries on a small pool of worker threads.
+
+    A refresh is only scheduled once per key until it has finished, and no
+    more than `max_pending` refreshes are queued at the same time. Refreshes
+    that do not fit are dropped, the stale entry will be served a little
+    longer.
+
+    :param int max_workers: Number of worker threads.
+    :param int max_pending: Maximum number of refreshes queued or running.
+    '''
+
+    def __init__(self, max_workers=2, max_pending=64):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='getty-refresh')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, key, refresh):
+        '''
+        Schedule a refresh.
+
+        :param str key: Key of the cache entry that is refreshed.
+        :param refresh: A callable that refreshes the entry.
+        :returns: `True` if the refresh was scheduled, `False` if it was
+            dropped because it is pending already or the queue is full.
+        '''
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(key)
+
+        def run():
+            try:
+                refresh()
+            except Exception:
+                log.warning('Refreshing %s failed.', key, exc_info=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            log.debug('Refresher has been shut down, not refreshing %s.', key)
+            with self._lock:
+                self._pending.discard(key)
+            return False
+        return True
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_default_refresher = None
+_default_refresher_lock = threading.Lock()
+
+
+def get_default_refresher():
+    '''
+    Get the :class:`BackgroundRefresher` shared by all providers in this
+    process that were not given one.
+    '''
+    global _default_refresher
+    with _default_refresher_lock:
+        if _default_refresher is None:
+            _default_refresher = BackgroundRefresher()
+        return _default_refresher
+
+
+def normalise_query(query):
+    '''
+    Normalise the whitespace in a SPARQL query, so queries that only differ in
+    layout share a cache entry. Whitespace inside string literals is kept.
+    '''
+    return SPARQL_LITERAL_OR_SPACE.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+def query_key(endpoint, query, language=None):
+    '''
+    Get the cache key for the answer of a SPARQL query.
+
+    :param str endpoint: URL of the SPARQL endpoint.
+    :param str query: The SPARQL query.
+    :param str language: Optional. The language the answer was built for.
+    :rtype: str
+    '''
+    digest = hashlib.sha1(
+        '\n'.join((endpoint, normalise_query(query), language or '')).encode('utf-8')
+    ).hexdigest()
+    return 'sparql:' + digest
@@ -0,0 +1,429 @@
+'''
+This module contains a compact, columnar representation of a Getty
+vocabulary that is small enough to keep an entire vocabulary like the
+:term:`AAT` in memory.
+
+Concepts and collections are numbered densely. All strings (ids, labels,
+notes and languages) live in a single pool of UTF-8 encoded bytes, and all
+relations are stored as CSR (compressed sparse row) arrays: for every
+concept `i`, its broader concepts are
+`broader_targets[broader_offsets[i]:broader_offsets[i + 1]]`.
+:class:`skosprovider.skos.Concept` and :class:`skosprovider.skos.Collection`
+instances are only built when they are asked for.
+
+.. code-block:: python
+
+    builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+    for id in ids:
+        builder.add(provider.get_by_id(id))
+    vocabulary = builder.build()
+    provider = AATProvider({'id': 'AAT'}, local_vocabulary=vocabulary)
+'''
+import logging
+from array import array
+
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import Label
+from skosprovider.skos import Note
+
+log = logging.getLogger(__name__)
+
+THING_TYPES = ('concept', 'collection', None)
+LABEL_TYPES = ('prefLabel', 'altLabel', 'hiddenLabel', 'sortLabel')
+NOTE_TYPES = (
+    'note', 'changeNote', 'definition', 'editorialNote', 'example', 'historyNote', 'scopeNote'
+)
+MATCH_TYPES = ('close', 'exact', 'related', 'broad', 'narrow')
+LINKS = ('broader', 'narrower', 'related', 'subordinate_arrays', 'members', 'superordinates')
+
+#: Every column of a :class:`CompactVocabulary`, with the
+#: :mod:`array` typecode it is stored in.
+COLUMNS = (
+    ('string_offsets', 'I'),
+    ('ids', 'I'),
+    ('id_order', 'I'),
+    ('types', 'B'),
+    ('label_offsets', 'I'),
+    ('label_text', 'I'),
+    ('label_lang', 'I'),
+    ('label_type', 'B'),
+    ('note_offsets', 'I'),
+    ('note_text', 'I'),
+    ('note_lang', 'I'),
+    ('note_type', 'B'),
+    ('match_offsets', 'I'),
+    ('match_target', 'I'),
+    ('match_type', 'B'),
+) + tuple(
+    (f'{link}_{part}', 'I') for link in LINKS for part in ('offsets', 'targets')
+)
+
+
+class CompactVocabulary:
+    '''
+    A read-only, columnar representation of a vocabulary.
+
+    Use a :class:`CompactVocabularyBuilder` to create one.
+
+    :param str uri_prefix: Prefix that turns an id into a :term:`URI`,
+        eg. `http://vocab.getty.edu/aat/`.
+    :param bytes strings: The string pool.
+    :param dict columns: Maps every name in :data:`COLUMNS` to a sequence of
+        integers, eg. an :class:`array.array` or a :class:`memoryview`.
+    '''
+
+    def __init__(self, uri_prefix, strings, columns):
+        self.uri_prefix = uri_prefix
+        self.strings = strings
+        for name, typecode in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return self.index_of(id) is not None
+
+    def string(self, i):
+        '''
+        Get a string from the string pool.
+        '''
+        return bytes(self.strings[self.string_offsets[i]:self.string_offsets[i + 1]]).decode('utf-8')
+
+    def id_of(self, index):
+        return self.string(self.ids[index])
+
+    def index_of(self, id):
+        '''
+        Get the index of a concept or collection.
+
+        :param str id: The id of the concept or collection.
+        :returns: The index, or `None` if it is not part of this vocabulary.
+        '''
+        id = str(id)
+        order = self.id_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.id_of(order[mid]) < id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self.id_of(order[lo]) == id:
+            index = order[lo]
+            if THING_TYPES[self.types[index]] is not None:
+                return index
+        return None
+
+    def _range(self, offsets, index):
+        return range(offsets[index], offsets[index + 1])
+
+    def _links(self, link, index):
+        offsets = getattr(self, f'{link}_offsets')
+        targets = getattr(self, f'{link}_targets')
+        return [targets[i] for i in self._range(offsets, index)]
+
+    def labels(self, index):
+        return [
+            Label(
+                self.string(self.label_text[i]),
+                LABEL_TYPES[self.label_type[i]],
+                self.string(self.label_lang[i])
+            ) for i in self._range(self.label_offsets, index)
+        ]
+
+    def notes(self, index):
+        return [
+            Note(
+                self.string(self.note_text[i]),
+                NOTE_TYPES[self.note_type[i]],
+                self.string(self.note_lang[i])
+            ) for i in self._range(self.note_offsets, index)
+        ]
+
+    def get_by_id(self, id, concept_scheme=None):
+        '''
+        Build a :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection`.
+
+        :param str id: The id of the concept or collection.
+        :param concept_scheme: Optional. The
+            :class:`skosprovider.skos.ConceptScheme` it belongs to.
+        :returns: The concept or collection, or `False` if the id is not
+            part of this vocabulary.
+        '''
+        index = self.index_of(id)
+        if index is None:
+            return False
+        id = self.id_of(index)
+        kwargs = {
+            'uri': self.uri_prefix + id,
+            'concept_scheme': concept_scheme,
+            'labels': self.labels(index),
+            'notes': self.notes(index),
+            'sources': [],
+        }
+        if THING_TYPES[self.types[index]] == 'collection':
+            return Collection(
+                id,
+                members=[self.id_of(i) for i in self._links('members', index)],
+                superordinates=[self.id_of(i) for i in self._links('superordinates', index)],
+                **kwargs
+            )
+        matches = {k: [] for k in MATCH_TYPES}
+        for i in self._range(self.match_offsets, index):
+            matches[MATCH_TYPES[self.match_type[i]]].append(self.string(self.match_target[i]))
+        return Concept(
+            id,
+            broader=[self.id_of(i) for i in self._links('broader', index)],
+            narrower=[self.id_of(i) for i in self._links('narrower', index)],
+            related=[self.id_of(i) for i in self._links('related', index)],
+            subordinate_arrays=[self.id_of(i) for i in self._links('subordinate_arrays', index)],
+            matches=matches,
+            **kwargs
+        )
+
+    def label(self, index, language='en', fallback_language=None):
+        '''
+        Pick the prefLabel of a concept or collection to display.
+
+        A prefLabel in `language` is preferred, then one in the primary
+        language of `fallback_language`, then one in English and finally any
+        prefLabel. This is the order the providers use for the answers of
+        the Getty services.
+
+        :param str language: The preferred language, eg. `nl-BE`.
+        :param str fallback_language: Optional. The language to fall back
+            to, usually the default language of the provider. Defaults to
+            `language`.
+        :returns: The label or `None` if there are no prefLabels.
+        '''
+        primary = (fallback_language or language).split('-')[0].lower()
+        best = None
+        best_rank = 4
+        for i in self._range(self.label_offsets, index):
+            if LABEL_TYPES[self.label_type[i]] != 'prefLabel':
+                continue
+            lang = self.string(self.label_lang[i])
+            if lang.lower() == language.lower():
+                rank = 0
+            elif lang.split('-')[0].lower() == primary:
+                rank = 1
+            elif lang.split('-')[0].lower() == 'en':
+                rank = 2
+            else:
+                rank = 3
+            if rank < best_rank:
+                best, best_rank = self.label_text[i], rank
+        return self.string(best) if best is not None else None
+
+    def _find_dict(self, index, language, fallback_language=None):
+        id = self.id_of(index)
+        label = self.label(index, language, fallback_language)
+        return {
+            'id': id,
+            'uri': self.uri_prefix + id,
+            'type': THING_TYPES[self.types[index]],
+            'label': label if label is not None else '<not available>'
+        }
+
+    def children(self, index):
+        '''
+        Get the indexes of the concepts and collections displayed under a
+        concept or collection.
+        '''
+        if THING_TYPES[self.types[index]] == 'collection':
+            return self._links('members', index)
+        return self._links('narrower', index) + self._links('subordinate_arrays', index)
+
+    def get_children_display(self, id, language='en', fallback_language=None):
+        '''
+        Get the concepts and collections displayed under a concept or
+        collection, in the same shape as
+        :meth:`skosprovider_getty.providers.GettyProvider.find`. See
+        :meth:`label` for the labels that are picked.
+
+        :returns: A :class:`lst` of dicts, or `False` if the id is not part
+            of this vocabulary.
+        '''
+        index = self.index_of(id)
+        if index is None:
+            return False
+        return [
+            self._find_dict(i, language, fallback_language) for i in self.children(index)
+            if THING_TYPES[self.types[i]] is not None
+        ]
+
+    def expand(self, id):
+        '''
+        Expand a concept or collection to all it's narrower concepts and
+        collections, like the `gvp:broaderExtended` query of
+        :meth:`skosprovider_getty.providers.GettyProvider.expand`. The id
+        itself is only included if it is a concept.
+
+        :returns: A :class:`lst` of ids, or `False` if the id is not part of
+            this vocabulary.
+        '''
+        index = self.index_of(id)
+        if index is None:
+            return False
+        seen = {index}
+        todo = [index]
+        result = [self.id_of(index)] if THING_TYPES[self.types[index]] == 'concept' else []
+        while todo:
+            i = todo.pop()
+            for child in self.children(i):
+                if child not in seen:
+                    seen.add(child)
+                    todo.append(child)
+                    result.append(self.id_of(child))
+        return result
+
+    def memory_usage(self):
+        '''
+        The number of bytes used by the string pool and the columns.
+        '''
+        size = len(self.strings)
+        for name, typecode in COLUMNS:
+            column = getattr(self, name)
+            size += len(column) * array(typecode).itemsize
+        return size
+
+    def bytes_per_concept(self):
+        '''
+        The average number of bytes used per concept or collection.
+        '''
+        count = sum(1 for t in self.types if THING_TYPES[t] is not None)
+        return self.memory_usage() / count if count else 0
+
+
+class CompactVocabularyBuilder:
+    '''
+    Collects concepts and collections and builds a :class:`CompactVocabulary`.
+
+    Concepts and collections can be added in any order. Relations to
+    concepts that are never added are kept, but those concepts can not be
+    looked up.
+
+    :param str uri_prefix: Prefix that turns an id into a :term:`URI`,
+        eg. `http://vocab.getty.edu/aat/`.
+    '''
+
+    def __init__(self, uri_prefix):
+        self.uri_prefix = uri_prefix
+        self._strings = {}
+        self._index = {}
+        self._things = []
+
+    def _string(self, value):
+        try:
+            return self._strings[value]
+        except KeyError:
+            i = self._strings[value] = len(self._strings)
+            return i
+
+    def _thing_index(self, id):
+        id = str(id)
+        try:
+            return self._index[id]
+        except KeyError:
+            i = self._index[id] = len(self._things)
+            self._things.append(None)
+            return i
+
+    def add(self, thing):
+        '''
+        Add a :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection`.
+        '''
+        if thing.type == 'collection':
+            links = {'members': thing.members, 'superordinates': thing.superordinates}
+            matches = []
+        else:
+            links = {
+                link: getattr(thing, link) for link in ('broader', 'narrower', 'related', 'subordinate_arrays')
+            }
+            matches = [(t, type) for type, targets in thing.matches.items() for t in targets]
+        self.add_record(
+            thing.id,
+            thing.type,
+            [(label.label, label.language, label.type) for label in thing.labels],
+            [(note.note, note.language, note.type) for note in thing.notes],
+            links,
+            matches
+        )
+
+    def add_record(self, id, type, labels=(), notes=(), links=None, matches=()):
+        '''
+        Add a concept or collection without building a
+        :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection` first, eg. when reading a bulk
+        dump.
+
+        :param str id: The id of the concept or collection.
+        :param str type: `concept` or `collection`.
+        :param labels: A list of `(label, language, type)` tuples.
+        :param notes: A list of `(note, language, type)` tuples.
+        :param dict links: Maps the names in :data:`LINKS` to lists of ids.
+        :param matches: A list of `(target, type)` tuples, the type being
+            one of :data:`MATCH_TYPES`.
+        '''
+        index = self._thing_index(id)
+        self._things[index] = (
+            THING_TYPES.index(type),
+            [(self._string(text), self._string(lang), LABEL_TYPES.index(t)) for text, lang, t in labels],
+            [(self._string(text), self._string(lang), NOTE_TYPES.index(t)) for text, lang, t in notes],
+            {link: [self._thing_index(i) for i in ids] for link, ids in (links or {}).items()},
+            [(self._string(target), MATCH_TYPES.index(t)) for target, t in matches]
+        )
+
+    def add_all(self, things):
+        '''
+        Add every concept and collection in an iterable, skipping `False`
+        and `None` values.
+        '''
+        for thing in things:
+            if thing:
+                self.add(thing)
+
+    def build(self):
+        '''
+        Build the :class:`CompactVocabulary`.
+        '''
+        columns = {name: array(typecode) for name, typecode in COLUMNS}
+        columns['ids'] = array('I', (self._string(id) for id in self._index))
+        columns['string_offsets'].append(0)
+        for link in LINKS:
+            columns[f'{link}_offsets'].append(0)
+        for name in ('label_offsets', 'note_offsets', 'match_offsets'):
+            columns[name].append(0)
+        for thing in self._things:
+            if thing is None:
+                thing = (THING_TYPES.index(None), [], [], {}, [])
+            type, labels, notes, links, matches = thing
+            columns['types'].append(type)
+            for text, lang, label_type in labels:
+                columns['label_text'].append(text)
+                columns['label_lang'].append(lang)
+                columns['label_type'].append(label_type)
+            columns['label_offsets'].append(len(columns['label_text']))
+            for text, lang, note_type in notes:
+                columns['note_text'].append(text)
+                columns['note_lang'].append(lang)
+                columns['note_type'].append(note_type)
+            columns['note_offsets'].append(len(columns['note_text']))
+            for target, match_type in matches:
+                columns['match_target'].append(target)
+                columns['match_type'].append(match_type)
+            columns['match_offsets'].append(len(columns['match_target']))
+            for link in LINKS:
+                columns[f'{link}_targets'].extend(links.get(link, []))
+                columns[f'{link}_offsets'].append(len(columns[f'{link}_targets']))
+        strings = bytearray()
+        for value in self._strings:
+            strings += value.encode('utf-8')
+            columns['string_offsets'].append(len(strings))
+        id_list = list(self._index)
+        columns['id_order'] = array('I', sorted(range(len(id_list)), key=id_list.__getitem__))
+        return CompactVocabulary(self.uri_prefix, bytes(strings), columns)
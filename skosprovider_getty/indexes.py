@@ -0,0 +1,883 @@
+'''
+This module contains local indexes over Getty data. They allow answering
+frequent questions without a round trip to the Getty services.
+'''
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from bisect import bisect_right
+from itertools import chain
+
+from skosprovider_getty.utils import NAMESPACES
+from skosprovider_getty.utils import collation_key
+from skosprovider_getty.utils import normalise_uri
+from skosprovider_getty.utils import uri_to_id
+
+log = logging.getLogger(__name__)
+
+MATCH_TYPES = ('exact', 'close', 'broad', 'narrow', 'related')
+
+NTRIPLES_MATCH = re.compile(
+    r'^<([^>]+)>\s+<http://www\.w3\.org/2004/02/skos/core#(%s)Match>\s+<([^>]+)>'
+    % '|'.join(MATCH_TYPES)
+)
+
+#: Label types in the :class:`LabelIndex`, in order of preference.
+SUGGEST_LABEL_TYPES = ('prefLabel', 'altLabel')
+
+NTRIPLES_LABEL = re.compile(
+    r'^<([^>]+)>\s+<http://www\.w3\.org/2004/02/skos/core#(prefLabel|altLabel)>\s+'
+    r'"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+))?'
+)
+
+NTRIPLES_TYPE = re.compile(
+    r'^<([^>]+)>\s+<http://www\.w3\.org/1999/02/22-rdf-syntax-ns#type>\s+<([^>]+)>'
+)
+
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+
+#: The `rdf:type` URIs of collections in the Getty vocabularies, the same
+#: as the subclasses of `skos:Collection` in
+#: :class:`skosprovider_getty.utils.SubClassCollector`.
+COLLECTION_TYPES = (
+    SKOS + 'Collection',
+    SKOS + 'OrderedCollection',
+    NAMESPACES['ISO'] + 'ThesaurusArray',
+    NAMESPACES['GVP'] + 'Hierarchy',
+    NAMESPACES['GVP'] + 'Facet',
+    NAMESPACES['GVP'] + 'GuideTerm',
+)
+
+WORD = re.compile(r'\w+')
+
+NTRIPLES_COORDINATE = re.compile(
+    r'^<([^>]+)>\s+<http://www\.w3\.org/2003/01/geo/wgs84_pos#(lat|long)>\s+"([-+0-9.eE]+)"'
+)
+
+#: Mean radius of the earth, in kilometres.
+EARTH_RADIUS = 6371.0088
+
+NTRIPLES_ESCAPE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+
+NTRIPLES_ESCAPES = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f'}
+
+
+def _language_rank(lang, language, primary, fallback_language):
+    if lang == language:
+        return 0
+    if lang.startswith(primary) and lang[len(primary):len(primary) + 1] in ('', '-'):
+        return 1
+    if lang.startswith(fallback_language):
+        return 2
+    return 3
+
+
+def _max_distance(word):
+    '''
+    The number of typos tolerated in a word of a fuzzy search.
+    '''
+    if len(word) <= 3:
+        return 0
+    if len(word) <= 6:
+        return 1
+    return 2
+
+
+def _trigrams(word):
+    padded = '$%s$' % word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    '''
+    Compute the edit distance between two strings, giving up as soon as it
+    exceeds `max_distance`. Insertions, deletions, substitutions and swaps
+    of two adjacent characters count as one edit.
+
+    :returns: The distance, or `max_distance + 1` if it is larger than
+        `max_distance`.
+    '''
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                # Two swapped characters count as one typo.
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def unescape_literal(literal):
+    '''
+    Undo the escapes in an N-Triples string literal, eg. `\\u00E9`.
+    '''
+    def replace(m):
+        escape = m.group(1)
+        if escape[0] in 'uU' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return NTRIPLES_ESCAPES.get(escape, escape)
+    return NTRIPLES_ESCAPE.sub(replace, literal)
+
+
+class MatchIndex:
+    '''
+    A reverse index from external :term:`URI` to the Getty concepts that
+    have a SKOS mapping to it.
+
+    The index can be filled from RDF graphs fetched from the Getty services
+    (see :meth:`add_graph`) or from a bulk N-Triples dump (see
+    :meth:`load_ntriples`).
+    '''
+
+    def __init__(self):
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def add(self, uri, getty_uri, type):
+        '''
+        Register a match.
+
+        :param str uri: The external URI.
+        :param str getty_uri: URI of the Getty concept that matches `uri`.
+        :param str type: Type of the match: `exact`, `close`, `broad`,
+            `narrow` or `related`.
+        '''
+        if type not in MATCH_TYPES:
+            raise ValueError(
+                "type: only the following values are allowed: %s" % ', '.join(MATCH_TYPES))
+        with self._lock:
+            self._index.setdefault(uri, {})[getty_uri] = type
+
+    def add_graph(self, graph):
+        '''
+        Register all SKOS mappings present in an :class:`rdflib.graph.Graph`.
+
+        :returns: The number of mappings registered.
+        '''
+        from rdflib.namespace import SKOS
+
+        count = 0
+        for type in MATCH_TYPES:
+            for s, p, o in graph.triples((None, SKOS[type + 'Match'], None)):
+                self.add(str(o), str(s), type)
+                count += 1
+        return count
+
+    def load_ntriples(self, lines):
+        '''
+        Register all SKOS mappings in an N-Triples dump, such as the full
+        downloads of the Getty vocabularies. The dump is read line by line.
+
+        :param lines: An iterable of lines, eg. an open file.
+        :returns: The number of mappings registered.
+        '''
+        count = 0
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            m = NTRIPLES_MATCH.match(line)
+            if m:
+                self.add(m.group(3), m.group(1), m.group(2))
+                count += 1
+        return count
+
+    def remove(self, getty_uris):
+        '''
+        Remove all matches of some Getty concepts, eg. because they
+        changed.
+
+        :param getty_uris: An iterable of URIs of Getty concepts.
+        :returns: The number of matches removed.
+        '''
+        getty_uris = set(getty_uris)
+        count = 0
+        with self._lock:
+            for uri in list(self._index):
+                matches = self._index[uri]
+                for getty_uri in getty_uris.intersection(matches):
+                    del matches[getty_uri]
+                    count += 1
+                if not matches:
+                    del self._index[uri]
+        return count
+
+    def lookup(self, uri, type=None, prefix=None):
+        '''
+        Find the Getty concepts that match an external URI.
+
+        :param str uri: The external URI.
+        :param str type: Optional. Only return matches of this type.
+        :param str prefix: Optional. Only return Getty concepts whose URI
+            starts with this prefix, eg. `http://vocab.getty.edu/aat/`.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri` and
+            `match`, ordered by id.
+        '''
+        res = [
+            {'id': uri_to_id(getty_uri), 'uri': getty_uri, 'match': match}
+            for getty_uri, match in self._index.get(uri, {}).items()
+            if (type is None or match == type) and (prefix is None or getty_uri.startswith(prefix))
+        ]
+        res.sort(key=lambda item: item['id'])
+        return res
+
+    def __contains__(self, uri):
+        return uri in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _SortedLabels:
+    '''
+    Label entries sorted on their collation key, in a main array and a
+    small delta. New entries are sorted into the delta, which is searched
+    alongside the main array and only merged into it once it grows past a
+    size, so a single new label never re-sorts all labels.
+
+    The arrays are replaced, never changed, so a search can go on while
+    entries are added.
+    '''
+
+    def __init__(self):
+        self.main = ([], [])
+        self.delta = ([], [])
+        self.pending = []
+
+    def merge(self, merge_size):
+        '''
+        Sort the pending entries in.
+
+        :returns: The entries that were pending.
+        '''
+        pending, self.pending = self.pending, []
+        if pending:
+            entries = self.delta[1] + pending
+            if len(entries) > merge_size:
+                # Timsort merges the sorted runs in linear time.
+                entries = sorted(self.main[1] + sorted(entries))
+                self.main = ([entry[0] for entry in entries], entries)
+                self.delta = ([], [])
+            else:
+                entries.sort()
+                self.delta = ([entry[0] for entry in entries], entries)
+        return pending
+
+    def find(self, key):
+        '''
+        Get the entries with a key.
+        '''
+        for keys, entries in (self.main, self.delta):
+            start = bisect_left(keys, key)
+            yield from entries[start:bisect_right(keys, key, start)]
+
+    def prefix(self, key, max_scan):
+        '''
+        Get the entries with a key starting with a prefix, at most
+        `max_scan` of both arrays.
+        '''
+        for keys, entries in (self.main, self.delta):
+            start = bisect_left(keys, key)
+            end = min(len(keys), start + max_scan)
+            if end > start and not keys[end - 1].startswith(key):
+                # Only look at the labels that match the prefix.
+                end = bisect_left(keys, key + '\U0010ffff', start, end)
+            yield from entries[start:end]
+
+    def remove(self, uris):
+        self.pending = [entry for entry in self.pending if entry[4] not in uris]
+        for name in ('main', 'delta'):
+            entries = [entry for entry in getattr(self, name)[1] if entry[4] not in uris]
+            setattr(self, name, ([entry[0] for entry in entries], entries))
+
+    def __len__(self):
+        return len(self.main[1]) + len(self.delta[1]) + len(self.pending)
+
+
+class LabelIndex:
+    '''
+    Sorted arrays of the prefLabels and altLabels of concepts and
+    collections, to suggest labels starting with a prefix without a round
+    trip to the Getty services.
+
+    Labels are compared ignoring case and accents (see
+    :func:`skosprovider_getty.utils.collation_key`) and found with a binary
+    search. The index can be filled incrementally, with the concepts and
+    collections fetched by a provider (see :meth:`add_thing`) or from a
+    bulk N-Triples dump (see :meth:`load_ntriples`). Added labels are
+    sorted into the index on the next :meth:`suggest`, in a small sorted
+    delta that is merged with the rest of the labels once it holds more
+    than `merge_size` labels.
+
+    :param int max_scan: Maximum number of prefLabels and of altLabels looked
+        at for one suggestion, this bounds the time needed for very short
+        prefixes. Exact matches are always looked at.
+    :param int merge_size: Maximum number of labels in the delta.
+    '''
+
+    def __init__(self, max_scan=5000, merge_size=4096):
+        self.max_scan = max_scan
+        self.merge_size = merge_size
+        self._labels = tuple(_SortedLabels() for _ in SUGGEST_LABEL_TYPES)
+        self._types = {}
+        self._fuzzy = None
+        self._lock = threading.Lock()
+
+    def add(self, uri, label, type='prefLabel', language='und'):
+        '''
+        Register a label.
+
+        :param str uri: URI of the concept or collection.
+        :param str label: The label.
+        :param str type: `prefLabel` or `altLabel`.
+        :param str language: Language of the label.
+        '''
+        entry = self._entry(uri, label, type, language)
+        with self._lock:
+            self._labels[entry[2]].pending.append(entry)
+
+    def _entry(self, uri, label, type, language):
+        if type not in SUGGEST_LABEL_TYPES:
+            raise ValueError(
+                "type: only the following values are allowed: %s" % ', '.join(SUGGEST_LABEL_TYPES))
+        return (collation_key(label)[0], label, SUGGEST_LABEL_TYPES.index(type), language.lower(), uri)
+
+    def add_thing(self, thing):
+        '''
+        Register the labels of a :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection`. Things that were registered
+        before are skipped.
+
+        :returns: The number of labels registered.
+        '''
+        entries = [
+            self._entry(thing.uri, label.label, label.type, label.language)
+            for label in thing.labels if label.type in SUGGEST_LABEL_TYPES
+        ]
+        with self._lock:
+            if thing.uri in self._types:
+                return 0
+            self._types[thing.uri] = thing.type
+            for entry in entries:
+                self._labels[entry[2]].pending.append(entry)
+        return len(entries)
+
+    def add_all(self, things):
+        '''
+        Register the labels of several concepts and collections.
+
+        :returns: The number of labels registered.
+        '''
+        return sum(self.add_thing(thing) for thing in things if thing)
+
+    def load_ntriples(self, lines, collection_types=COLLECTION_TYPES):
+        '''
+        Register all labels in an N-Triples dump, such as the full downloads
+        of the Getty vocabularies. The dump is read line by line.
+
+        :param lines: An iterable of lines, eg. an open file.
+        :param collection_types: The `rdf:type` URIs of collections, eg.
+            `provider.subclasses.get_subclasses(SKOS.Collection)`.
+        :returns: The number of labels registered.
+        '''
+        collection_types = {str(t) for t in collection_types}
+        count = 0
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            m = NTRIPLES_LABEL.match(line)
+            if m:
+                self.add(m.group(1), unescape_literal(m.group(3)), m.group(2), m.group(4) or 'und')
+                count += 1
+                continue
+            m = NTRIPLES_TYPE.match(line)
+            if m and m.group(2) in collection_types:
+                with self._lock:
+                    self._types[m.group(1)] = 'collection'
+        return count
+
+    def remove(self, uris):
+        '''
+        Remove all labels of some concepts or collections, eg. because they
+        changed. They can be registered again with :meth:`add_thing`.
+
+        :param uris: An iterable of URIs.
+        :returns: The number of labels removed.
+        '''
+        uris = set(uris)
+        with self._lock:
+            count = len(self)
+            for labels in self._labels:
+                labels.remove(uris)
+            for uri in uris:
+                self._types.pop(uri, None)
+            return count - len(self)
+
+    def _merge(self):
+        with self._lock:
+            for labels in self._labels:
+                pending = labels.merge(self.merge_size)
+                if pending and self._fuzzy is not None:
+                    self._add_words(entry[0] for entry in pending)
+            return self._labels
+
+    def _add_words(self, keys):
+        words, grams = self._fuzzy
+        for key in keys:
+            for word in WORD.findall(key):
+                labels = words.get(word)
+                if labels is None:
+                    labels = words[word] = set()
+                    for gram in _trigrams(word):
+                        grams.setdefault(gram, []).append(word)
+                labels.add(key)
+
+    def _get_fuzzy(self):
+        with self._lock:
+            if self._fuzzy is None:
+                # Built on the first fuzzy search, kept up to date by _merge.
+                self._fuzzy = ({}, {})
+                for labels in self._labels:
+                    self._add_words(entry[0] for keys, entries in (labels.main, labels.delta) for entry in entries)
+        self._merge()
+        return self._fuzzy
+
+    def _match_word(self, word, deadline):
+        words, grams = self._fuzzy
+        max_distance = _max_distance(word)
+        if max_distance == 0:
+            return {key: 0 for key in words.get(word, ())}
+        # Every typo changes at most 4 trigrams of a word.
+        wanted = _trigrams(word)
+        counts = {}
+        for gram in wanted:
+            for candidate in grams.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        threshold = len(wanted) - 4 * max_distance
+        matches = {}
+        for i, (candidate, count) in enumerate(counts.items()):
+            if i % 256 == 0 and time.monotonic() > deadline:
+                log.debug('Fuzzy search for %s stopped after the latency budget.', word)
+                break
+            if count < threshold:
+                continue
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                for key in words[candidate]:
+                    if distance < matches.get(key, distance + 1):
+                        matches[key] = distance
+        return matches
+
+    def search(self, label, language='en', limit=10, fallback_language='en', uri_prefix=None, budget=0.05):
+        '''
+        Find concepts and collections with labels that contain all words of
+        `label`, ignoring case and accents and tolerating a few typos.
+
+        Words of up to 3 characters must match exactly, longer words may
+        contain one typo and words of 7 characters or more two typos.
+        Candidate words are found with a trigram index, built on the first
+        search, and verified with :func:`edit_distance`.
+
+        :param str label: The label to search for.
+        :param str language: The preferred language, eg. `nl-BE`.
+        :param int limit: Maximum number of results. `None` for all results.
+        :param str fallback_language: The language to prefer next.
+        :param str uri_prefix: Optional. Only find concepts and collections
+            whose URI starts with this prefix.
+        :param float budget: Number of seconds the search may take. When
+            exceeded, the results found so far are returned.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`,
+            `label` and `score`. Results with the fewest typos come first,
+            followed by shorter labels, prefLabels before altLabels and
+            labels in `language` and `fallback_language`. The score is 1
+            for an exact match and lower for every typo.
+        '''
+        deadline = time.monotonic() + budget
+        query = WORD.findall(collation_key(label)[0])
+        if not query or limit == 0:
+            return []
+        self._get_fuzzy()
+        labels = self._merge()
+        distances = None
+        for word in query:
+            matches = self._match_word(word, deadline)
+            if distances is None:
+                distances = matches
+            else:
+                distances = {
+                    key: distance + matches[key] for key, distance in distances.items() if key in matches
+                }
+            if not distances:
+                return []
+        language = language.lower()
+        primary = language.split('-')[0]
+        fallback_language = fallback_language.lower()
+        size = sum(len(word) for word in query)
+        buckets = {}
+        for key, distance in distances.items():
+            buckets.setdefault(distance, []).append((len(key), key))
+        best = {}
+        for distance in sorted(buckets):
+            # Labels are visited from the fewest typos and the shortest label
+            # on, so we can stop as soon as enough results have been found.
+            heap = buckets[distance]
+            heapq.heapify(heap)
+            while heap:
+                if limit is not None and len(best) >= limit or time.monotonic() > deadline:
+                    break
+                length = heap[0][0]
+                while heap and heap[0][0] == length:
+                    key = heapq.heappop(heap)[1]
+                    for folded, text, type_rank, lang, uri in chain.from_iterable(
+                            part.find(key) for part in labels):
+                        if uri_prefix is not None and not uri.startswith(uri_prefix):
+                            continue
+                        language_rank = _language_rank(lang, language, primary, fallback_language)
+                        rank = (distance, length, type_rank, language_rank, folded, text)
+                        previous = best.get(uri)
+                        if previous is None or rank < previous[0]:
+                            best[uri] = (rank, text)
+            if limit is not None and len(best) >= limit:
+                break
+        if limit is None:
+            results = sorted(best.items(), key=lambda item: item[1][0])
+        else:
+            results = heapq.nsmallest(limit, best.items(), key=lambda item: item[1][0])
+        ret = []
+        for uri, (rank, text) in results:
+            result = self._result(uri, text)
+            result['score'] = round(1 - rank[0] / size, 3)
+            ret.append(result)
+        return ret
+
+    def suggest(self, prefix, language='en', limit=10, fallback_language='en', uri_prefix=None):
+        '''
+        Suggest concepts and collections with a label starting with a prefix.
+
+        Every concept or collection is suggested once, with its best
+        matching label. Exact matches come first, followed by prefLabels
+        before altLabels, labels in `language`, labels in
+        `fallback_language` and shorter labels.
+
+        :param str prefix: The prefix typed so far.
+        :param str language: The preferred language, eg. `nl-BE`.
+        :param int limit: Maximum number of suggestions.
+        :param str fallback_language: The language to prefer next.
+        :param str uri_prefix: Optional. Only suggest concepts and
+            collections whose URI starts with this prefix.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`
+            and `label`.
+        '''
+        key = collation_key(prefix.strip())[0]
+        if not key or not limit:
+            return []
+        labels = self._merge()
+        language = language.lower()
+        primary = language.split('-')[0]
+        fallback_language = fallback_language.lower()
+        best = {}
+        # Exact matches of every type are ranked first, then the prefLabels
+        # and the altLabels. Labels of a type are only looked at when the
+        # better ranked ones did not give enough suggestions.
+        scans = [part.find(key) for part in labels] + [part.prefix(key, self.max_scan) for part in labels]
+        for i, entries in enumerate(scans):
+            if i >= len(labels) and len(best) >= limit:
+                break
+            for folded, label, type_rank, lang, uri in entries:
+                if uri_prefix is not None and not uri.startswith(uri_prefix):
+                    continue
+                language_rank = _language_rank(lang, language, primary, fallback_language)
+                rank = (folded != key, type_rank, language_rank, len(folded), folded, label)
+                previous = best.get(uri)
+                if previous is None or rank < previous[0]:
+                    best[uri] = (rank, label)
+        suggestions = heapq.nsmallest(limit, best.items(), key=lambda item: item[1][0])
+        return [self._result(uri, label) for uri, (rank, label) in suggestions]
+
+    def _result(self, uri, label):
+        return {'id': uri_to_id(uri), 'uri': uri, 'type': self._types.get(uri, 'concept'), 'label': label}
+
+    def __len__(self):
+        return sum(len(labels) for labels in self._labels)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    '''
+    Compute the great-circle distance between two points.
+
+    :returns: The distance in kilometres.
+    '''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+class SpatialIndex:
+    '''
+    A grid over the coordinates of TGN places, to find places within a
+    bounding box or near a point without a round trip to the Getty
+    services.
+
+    Places are registered under the :term:`URI` of their TGN concept, the
+    `-place` suffix of the place resources is removed. The index can be
+    filled with the places fetched by a provider (see :meth:`add_graph`) or
+    from a bulk N-Triples dump (see :meth:`load_ntriples`), which also
+    provides the prefLabels shown in the results.
+
+    :param float cell_size: Size of the grid cells in degrees.
+    '''
+
+    def __init__(self, cell_size=1.0):
+        self.cell_size = cell_size
+        self._columns = int(math.ceil(360 / cell_size))
+        self._rows = int(math.ceil(180 / cell_size))
+        self._cells = {}
+        self._places = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return (
+            int((lon + 180) // self.cell_size) % self._columns,
+            min(int((lat + 90) // self.cell_size), self._rows - 1)
+        )
+
+    def add(self, uri, lat, lon):
+        '''
+        Register the coordinates of a place.
+
+        :param str uri: URI of the TGN concept or place.
+        :param float lat: Latitude in degrees.
+        :param float lon: Longitude in degrees.
+        '''
+        uri = normalise_uri(uri) or uri
+        lat = float(lat)
+        lon = float(lon)
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise ValueError('%s: coordinates out of range: %s, %s' % (uri, lat, lon))
+        with self._lock:
+            if uri in self._places:
+                old = self._places[uri]
+                self._cells[self._cell(*old)].remove((old[0], old[1], uri))
+            self._places[uri] = (lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, uri))
+
+    def add_label(self, uri, label, language='und'):
+        '''
+        Register the prefLabel of a place in a language.
+        '''
+        self._labels.setdefault(normalise_uri(uri) or uri, {}).setdefault(language.lower(), label)
+
+    def add_graph(self, graph):
+        '''
+        Register all places with coordinates present in an
+        :class:`rdflib.graph.Graph`, together with the prefLabels of their
+        concepts.
+
+        :returns: The number of places registered.
+        '''
+        from rdflib.namespace import SKOS
+        from rdflib.namespace import Namespace
+        from rdflib.term import URIRef
+
+        wgs = Namespace('http://www.w3.org/2003/01/geo/wgs84_pos#')
+        count = 0
+        for subject, lat in graph.subject_objects(wgs.lat):
+            lon = graph.value(subject, wgs.long)
+            if lon is None:
+                continue
+            uri = normalise_uri(str(subject)) or str(subject)
+            self.add(uri, lat.toPython(), lon.toPython())
+            for label in graph.objects(URIRef(uri), SKOS.prefLabel):
+                self.add_label(uri, str(label), label.language or 'und')
+            count += 1
+        return count
+
+    def load_ntriples(self, lines):
+        '''
+        Register all places and prefLabels in an N-Triples dump, such as the
+        full download of the TGN. The dump is read line by line.
+
+        :param lines: An iterable of lines, eg. an open file.
+        :returns: The number of places registered.
+        '''
+        count = 0
+        partial = {}
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            m = NTRIPLES_COORDINATE.match(line)
+            if m:
+                coordinates = partial.setdefault(m.group(1), {})
+                coordinates[m.group(2)] = m.group(3)
+                if len(coordinates) == 2:
+                    del partial[m.group(1)]
+                    self.add(m.group(1), coordinates['lat'], coordinates['long'])
+                    count += 1
+                continue
+            m = NTRIPLES_LABEL.match(line)
+            if m and m.group(2) == 'prefLabel':
+                self.add_label(m.group(1), unescape_literal(m.group(3)), m.group(4) or 'und')
+        return count
+
+    def remove(self, uris):
+        '''
+        Remove some places and their labels, eg. because they changed.
+
+        :param uris: An iterable of URIs of TGN concepts or places.
+        :returns: The number of places removed.
+        '''
+        count = 0
+        with self._lock:
+            for uri in uris:
+                uri = normalise_uri(uri) or uri
+                self._labels.pop(uri, None)
+                place = self._places.pop(uri, None)
+                if place is not None:
+                    self._cells[self._cell(*place)].remove((place[0], place[1], uri))
+                    count += 1
+        return count
+
+    def _label(self, uri, language, fallback_language):
+        labels = self._labels.get(uri)
+        if not labels:
+            return uri_to_id(uri)
+        primary = language.split('-')[0]
+        return min(
+            labels.items(),
+            key=lambda item: (_language_rank(item[0], language, primary, fallback_language), item[0])
+        )[1]
+
+    def _result(self, uri, language, fallback_language):
+        return {
+            'id': uri_to_id(uri),
+            'uri': uri,
+            'type': 'concept',
+            'label': self._label(uri, language.lower(), fallback_language.lower())
+        }
+
+    def _columns_between(self, west, east):
+        first = int((west + 180) // self.cell_size)
+        last = int((east + 180) // self.cell_size)
+        if last - first + 1 >= self._columns:
+            return range(self._columns)
+        return [column % self._columns for column in range(first, last + 1)]
+
+    def _rows_between(self, south, north):
+        return range(
+            max(0, int((south + 90) // self.cell_size)),
+            min(self._rows - 1, int((north + 90) // self.cell_size)) + 1
+        )
+
+    def _places_in(self, columns, rows):
+        if len(columns) * len(rows) > len(self._cells):
+            rows = set(rows)
+            columns = set(columns)
+            cells = (places for (x, y), places in self._cells.items() if x in columns and y in rows)
+        else:
+            cells = (self._cells.get((x, y), ()) for x in columns for y in rows)
+        for places in cells:
+            yield from places
+
+    def find_within(self, bbox, language='en', fallback_language='en'):
+        '''
+        Find the places within a bounding box.
+
+        :param bbox: A tuple `(west, south, east, north)` in degrees, as in
+            GeoJSON. When `west` is larger than `east`, the box crosses the
+            antimeridian.
+        :param str language: The language of the labels.
+        :param str fallback_language: The language to use when no label in
+            `language` is known.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`
+            and `label`.
+        '''
+        west, south, east, north = map(float, bbox)
+        if south > north or not -90 <= south <= 90 or not -90 <= north <= 90 \
+                or not -180 <= west <= 180 or not -180 <= east <= 180:
+            raise ValueError('bbox: should be (west, south, east, north) in degrees')
+        if west <= east:
+            ranges = [(west, east)]
+        else:
+            ranges = [(west, 180), (-180, east)]
+        rows = self._rows_between(south, north)
+        ret = {}
+        for low, high in ranges:
+            for lat, lon, uri in self._places_in(self._columns_between(low, high), rows):
+                if south <= lat <= north and low <= lon <= high:
+                    ret[uri] = self._result(uri, language, fallback_language)
+        return list(ret.values())
+
+    def find_nearest(self, lat, lon, k=10, language='en', fallback_language='en'):
+        '''
+        Find the places nearest to a point.
+
+        :param float lat: Latitude in degrees.
+        :param float lon: Longitude in degrees.
+        :param int k: Number of places to return.
+        :param str language: The language of the labels.
+        :param str fallback_language: The language to use when no label in
+            `language` is known.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`,
+            `type`, `label` and `distance`, the distance in kilometres. The
+            nearest place comes first.
+        '''
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise ValueError('coordinates out of range: %s, %s' % (lat, lon))
+        k = min(k, len(self._places))
+        if k <= 0:
+            return []
+        # Grow a square of cells around the point until it holds k places.
+        x, y = self._cell(lat, lon)
+        visited = set()
+        candidates = []
+        radius = 0
+        while len(candidates) < k:
+            if len(visited) > len(self._cells):
+                # A sparse index, it is cheaper to look at every place.
+                candidates = [place for places in self._cells.values() for place in places]
+                break
+            ring = [(dx, dy) for dx in range(-radius, radius + 1) for dy in (-radius, radius)]
+            ring += [(dx, dy) for dx in (-radius, radius) for dy in range(-radius + 1, radius)]
+            for dx, dy in ring:
+                cell = ((x + dx) % self._columns, y + dy)
+                if 0 <= cell[1] < self._rows and cell not in visited:
+                    visited.add(cell)
+                    candidates.extend(self._cells.get(cell, ()))
+            radius += 1
+        # A place outside the square can still be closer than the kth
+        # candidate, so look at all cells within that distance.
+        reach = sorted(haversine(lat, lon, c[0], c[1]) for c in candidates)[k - 1]
+        degrees = math.degrees(reach / EARTH_RADIUS)
+        south, north = lat - degrees, lat + degrees
+        if south <= -90 or north >= 90:
+            columns = range(self._columns)
+        else:
+            spread = degrees / math.cos(math.radians(max(abs(south), abs(north))))
+            columns = self._columns_between(lon - spread, lon + spread)
+        places = self._places_in(columns, self._rows_between(south, north))
+        nearest = heapq.nsmallest(k, ((haversine(lat, lon, p[0], p[1]), p[2]) for p in places))
+        ret = []
+        for distance, uri in nearest:
+            result = self._result(uri, language, fallback_language)
+            result['distance'] = round(distance, 3)
+            ret.append(result)
+        return ret
+
+    def __contains__(self, uri):
+        return uri in self._places
+
+    def __len__(self):
+        return len(self._places)
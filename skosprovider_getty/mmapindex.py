@@ -0,0 +1,354 @@
+'''
+This module contains a read-only binary file format for a
+:class:`skosprovider_getty.compact.CompactVocabulary`.
+
+The file is opened with :mod:`mmap`, so opening it takes milliseconds and
+every worker process that opens the same file shares the same physical
+memory pages.
+
+.. code-block:: python
+
+    # Once, eg. in a deploy script
+    write_index(builder.build(), '/var/lib/getty/aat.idx')
+
+    # In every worker
+    provider = AATProvider(
+        {'id': 'AAT'},
+        local_vocabulary=open_index('/var/lib/getty/aat.idx')
+    )
+
+An index file can also be built straight from a bulk N-Triples dump of a
+Getty vocabulary, see :func:`build_index_from_ntriples`.
+
+The file starts with a magic string, followed by the string pool and the
+columns, each aligned on 8 bytes and stored in the native byte order of the
+machine that wrote the file. Next to the columns of the vocabulary, the file
+holds a label index: the prefLabels and altLabels, normalised with
+:func:`skosprovider_getty.utils.collation_key` and sorted, so labels can be
+looked up with a binary search (see :meth:`MappedVocabulary.lookup_label`).
+A JSON header at the end of the file describes where every column can be
+found.
+'''
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+from skosprovider_getty.compact import COLUMNS
+from skosprovider_getty.compact import LABEL_TYPES
+from skosprovider_getty.compact import MATCH_TYPES
+from skosprovider_getty.compact import NOTE_TYPES
+from skosprovider_getty.compact import THING_TYPES
+from skosprovider_getty.compact import CompactVocabulary
+from skosprovider_getty.compact import CompactVocabularyBuilder
+from skosprovider_getty.indexes import SUGGEST_LABEL_TYPES
+from skosprovider_getty.indexes import unescape_literal
+from skosprovider_getty.utils import collation_key
+from skosprovider_getty.utils import uri_to_id
+
+MAGIC = b'SPGETTY1'
+VERSION = 2
+#: Offset and length of the JSON header, followed by the magic string again.
+FOOTER = struct.Struct('<QI8s')
+
+#: The columns of the label index. For every normalised label, sorted, the
+#: offset of the key in the key pool, the index of the concept or collection
+#: and the index of the label in the label columns.
+LABEL_KEY_COLUMNS = (
+    ('label_key_offsets', 'I'),
+    ('label_key_things', 'I'),
+    ('label_key_labels', 'I'),
+)
+
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+RDF_VALUE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#value'
+SUBORDINATE_ARRAY = 'http://purl.org/iso25964/skos-thes#subordinateArray'
+
+NTRIPLES_STATEMENT = re.compile(
+    r'^<([^>]+)>\s+<([^>]+)>\s+(?:<([^>]+)>|"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<[^>]+>)?)'
+)
+
+
+def _align(f):
+    padding = -f.tell() % 8
+    f.write(b'\0' * padding)
+
+
+def write_index(vocabulary, path):
+    '''
+    Write a vocabulary to an index file.
+
+    The file is written next to `path` and then moved into place, so
+    processes that have the old file open are not disturbed.
+
+    :param vocabulary: A :class:`skosprovider_getty.compact.CompactVocabulary`.
+    :param str path: Path of the index file.
+    '''
+    header = {
+        'version': VERSION,
+        'byteorder': sys.byteorder,
+        'uri_prefix': vocabulary.uri_prefix,
+        'columns': {},
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        _align(f)
+        header['strings'] = [f.tell(), len(vocabulary.strings)]
+        f.write(bytes(vocabulary.strings))
+        keys, label_columns = _label_index(vocabulary)
+        _align(f)
+        header['label_keys'] = [f.tell(), len(keys)]
+        f.write(keys)
+        for name, typecode in COLUMNS + LABEL_KEY_COLUMNS:
+            _align(f)
+            column = label_columns[name] if name in label_columns else getattr(vocabulary, name)
+            if not isinstance(column, array):
+                column = array(typecode, column)
+            header['columns'][name] = [f.tell(), len(column), typecode]
+            column.tofile(f)
+        encoded = json.dumps(header, sort_keys=True).encode('utf-8')
+        offset = f.tell()
+        f.write(encoded)
+        f.write(FOOTER.pack(offset, len(encoded), MAGIC))
+    os.replace(tmp, path)
+
+
+def _label_index(vocabulary):
+    entries = []
+    for index in range(len(vocabulary)):
+        if THING_TYPES[vocabulary.types[index]] is None:
+            continue
+        for i in vocabulary._range(vocabulary.label_offsets, index):
+            if LABEL_TYPES[vocabulary.label_type[i]] in SUGGEST_LABEL_TYPES:
+                entries.append((collation_key(vocabulary.string(vocabulary.label_text[i]))[0], index, i))
+    entries.sort()
+    keys = bytearray()
+    columns = {name: array(typecode) for name, typecode in LABEL_KEY_COLUMNS}
+    columns['label_key_offsets'].append(0)
+    for key, index, i in entries:
+        keys += key.encode('utf-8')
+        columns['label_key_offsets'].append(len(keys))
+        columns['label_key_things'].append(index)
+        columns['label_key_labels'].append(i)
+    return bytes(keys), columns
+
+
+class MappedVocabulary(CompactVocabulary):
+    '''
+    A :class:`skosprovider_getty.compact.CompactVocabulary` read from a
+    memory-mapped index file. Use :func:`open_index` to create one.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        self._views = [view]
+        if len(view) < len(MAGIC) + FOOTER.size or bytes(view[:len(MAGIC)]) != MAGIC \
+                or bytes(view[-len(MAGIC):]) != MAGIC:
+            self.close()
+            raise ValueError('%s is not a Getty index file.' % path)
+        start, length, magic = FOOTER.unpack(view[-FOOTER.size:])
+        header = json.loads(bytes(view[start:start + length]).decode('utf-8'))
+        if header['version'] != VERSION or header['byteorder'] != sys.byteorder:
+            self.close()
+            raise ValueError('%s was written for another version or platform.' % path)
+        offset, size = header['strings']
+        strings = view[offset:offset + size]
+        columns = {}
+        for name, (offset, count, typecode) in header['columns'].items():
+            itemsize = array(typecode).itemsize
+            columns[name] = view[offset:offset + count * itemsize].cast(typecode)
+        offset, size = header['label_keys']
+        self.label_keys = view[offset:offset + size]
+        self._views += [strings, self.label_keys] + list(columns.values())
+        CompactVocabulary.__init__(self, header['uri_prefix'], strings, columns)
+        for name, typecode in LABEL_KEY_COLUMNS:
+            setattr(self, name, columns[name])
+
+    def _label_key(self, i):
+        offsets = self.label_key_offsets
+        return bytes(self.label_keys[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def lookup_label(self, label, language='en', prefix=False, limit=None, fallback_language=None):
+        '''
+        Find the concepts and collections with a prefLabel or altLabel, with
+        a binary search in the label index of the file.
+
+        Labels are compared ignoring case and accents. Every concept or
+        collection is returned once, exact matches first.
+
+        :param str label: The label to look for.
+        :param str language: The language of the labels that are returned.
+        :param bool prefix: Also find labels starting with `label`.
+        :param int limit: Optional. Maximum number of results.
+        :param str fallback_language: Optional. The language of the labels
+            that are returned next, see
+            :meth:`~skosprovider_getty.compact.CompactVocabulary.label`.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`
+            and `label`, in the same shape as the results of
+            :meth:`skosprovider_getty.providers.GettyProvider.find`.
+        '''
+        key = collation_key(label.strip())[0]
+        if not key or limit == 0:
+            return []
+        count = len(self.label_key_things)
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._label_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        ret = []
+        seen = set()
+        for i in range(lo, count):
+            found = self._label_key(i)
+            if found != key and not (prefix and found.startswith(key)):
+                break
+            index = self.label_key_things[i]
+            if index in seen:
+                continue
+            seen.add(index)
+            ret.append(self._find_dict(index, language, fallback_language))
+            if limit is not None and len(ret) >= limit:
+                break
+        return ret
+
+    def memory_usage(self):
+        return len(self._mmap)
+
+    def close(self):
+        '''
+        Release the memory map and close the file.
+        '''
+        for view in getattr(self, '_views', []):
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_index(path):
+    '''
+    Open an index file written by :func:`write_index`.
+
+    :param str path: Path of the index file.
+    :rtype: MappedVocabulary
+    '''
+    return MappedVocabulary(path)
+
+
+def build_index_from_ntriples(lines, path, uri_prefix,
+                              concept_types=(SKOS + 'Concept',),
+                              collection_types=(SKOS + 'Collection', SKOS + 'OrderedCollection')):
+    '''
+    Build an index file from an N-Triples dump, such as the full downloads
+    of the Getty vocabularies. The dump is read line by line, no
+    :mod:`rdflib` graph is built.
+
+    The type, labels, notes (also through their `rdf:value`), relations,
+    subordinate arrays and mappings of every concept and collection whose
+    URI starts with `uri_prefix` are read. The superordinates of collections are
+    derived from the subordinate arrays. The revision history is not.
+
+    .. code-block:: python
+
+        with open('aat.nt', 'rb') as dump:
+            build_index_from_ntriples(dump, '/var/lib/getty/aat.idx', 'http://vocab.getty.edu/aat/')
+
+    :param lines: An iterable of lines, eg. an open file.
+    :param str path: Path of the index file.
+    :param str uri_prefix: Prefix of the concepts and collections to index,
+        eg. `http://vocab.getty.edu/aat/`.
+    :param concept_types: The `rdf:type` URIs of concepts.
+    :param collection_types: The `rdf:type` URIs of collections.
+    :returns: The number of concepts and collections written.
+    '''
+    concept_types = set(concept_types)
+    collection_types = set(collection_types)
+    links = {
+        SKOS + 'broader': 'broader', SKOS + 'narrower': 'narrower', SKOS + 'related': 'related',
+        SKOS + 'member': 'members', SUBORDINATE_ARRAY: 'subordinate_arrays',
+    }
+    things = {}
+    notes = {}
+    values = {}
+
+    def record(uri):
+        try:
+            return things[uri]
+        except KeyError:
+            thing = things[uri] = {'type': None, 'labels': [], 'notes': [], 'links': {}, 'matches': []}
+            return thing
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        m = NTRIPLES_STATEMENT.match(line)
+        if m is None:
+            continue
+        subject, predicate, obj, literal, language = m.groups()
+        if predicate == RDF_VALUE and literal is not None:
+            values[subject] = (unescape_literal(literal), language or 'und')
+            continue
+        if not subject.startswith(uri_prefix):
+            continue
+        if predicate == RDF_TYPE:
+            if obj in collection_types:
+                record(subject)['type'] = 'collection'
+            elif obj in concept_types and record(subject)['type'] is None:
+                record(subject)['type'] = 'concept'
+            continue
+        if not predicate.startswith(SKOS) and predicate != SUBORDINATE_ARRAY:
+            continue
+        name = predicate[len(SKOS):]
+        if literal is not None and name in LABEL_TYPES:
+            record(subject)['labels'].append((unescape_literal(literal), language or 'und', name))
+        elif literal is not None and name in NOTE_TYPES:
+            record(subject)['notes'].append((unescape_literal(literal), language or 'und', name))
+        elif obj is None:
+            continue
+        elif name in NOTE_TYPES:
+            notes.setdefault(subject, []).append((obj, name))
+        elif predicate in links:
+            record(subject)['links'].setdefault(links[predicate], []).append(uri_to_id(obj))
+            if predicate == SUBORDINATE_ARRAY:
+                record(obj)['links'].setdefault('superordinates', []).append(uri_to_id(subject))
+        elif name.endswith('Match') and name[:-len('Match')] in MATCH_TYPES:
+            record(subject)['matches'].append((uri_to_id(obj), name[:-len('Match')]))
+    for subject, resources in notes.items():
+        for note, type in resources:
+            if note in values:
+                text, language = values[note]
+                record(subject)['notes'].append((text, language, type))
+    builder = CompactVocabularyBuilder(uri_prefix)
+    count = 0
+    for uri, thing in things.items():
+        if thing['type'] is None:
+            continue
+        if thing['type'] == 'collection':
+            thing_links = {k: v for k, v in thing['links'].items() if k in ('members', 'superordinates')}
+        else:
+            thing_links = {
+                k: v for k, v in thing['links'].items()
+                if k in ('broader', 'narrower', 'related', 'subordinate_arrays')
+            }
+        builder.add_record(
+            uri_to_id(uri), thing['type'], thing['labels'], thing['notes'], thing_links,
+            thing['matches'] if thing['type'] == 'concept' else ())
+        count += 1
+    write_index(builder.build(), path)
+    return count
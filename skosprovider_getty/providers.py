@@ -10,25 +10,54 @@ the Getty Vocabularies (AAT, TGN and ULAN).
 
 '''
 
+import heapq
+import json
 import logging
+import time
 import warnings
+from datetime import datetime
+from functools import partial
+from operator import itemgetter
 
-import requests
 from language_tags import tags
 from skosprovider.providers import VocabularyProvider
 from skosprovider.skos import ConceptScheme
 from skosprovider.skos import Label
 
-from skosprovider_getty.utils import GVP
+from skosprovider_getty import tracing
+from skosprovider_getty.cache import MemoryCache
+from skosprovider_getty.cache import get_default_refresher
+from skosprovider_getty.cache import query_key
+from skosprovider_getty.indexes import MATCH_TYPES
+from skosprovider_getty.serialise import dump_thing
+from skosprovider_getty.serialise import load_thing
+from skosprovider_getty.tracing import Tracing
+from skosprovider_getty.tracing import traced
+from skosprovider_getty.transport import get_default_transport
 from skosprovider_getty.utils import SubClassCollector
+from skosprovider_getty.utils import collation_key
 from skosprovider_getty.utils import conceptscheme_from_uri
 from skosprovider_getty.utils import do_get_request
+from skosprovider_getty.utils import normalise_uri
+from skosprovider_getty.utils import sparql_literal
+from skosprovider_getty.utils import stream_to_graph
 from skosprovider_getty.utils import things_from_graph
 from skosprovider_getty.utils import uri_to_graph
 from skosprovider_getty.utils import uri_to_id
+from skosprovider_getty.utils import uri_to_vocab_id
 
 log = logging.getLogger(__name__)
 
+GETTY_VOCABULARIES = ('aat', 'tgn', 'ulan')
+
+RESOLVABLE_RELATIONS = (
+    'broader', 'narrower', 'related', 'subordinate_arrays', 'members', 'superordinates'
+)
+
+REVALIDATED_METHODS = (
+    'get_by_id', 'find', 'get_top_concepts', 'get_top_display', 'get_children_display', 'expand'
+)
+
 
 class GettyProvider(VocabularyProvider):
     """A provider that can work with the GETTY rdf files of
@@ -45,7 +74,70 @@ class GettyProvider(VocabularyProvider):
                 The `url` is a composition of the `base_url` and `vocab_id`
             * You can also pass a custom :class:`skosprovider_getty.utils.SubClassCollector`
                 to override default behaviour with the subclasses keyword.
-            * You can also pass a custom requests session with the session keyword.
+            * You can also pass a custom requests session or a
+                :class:`skosprovider_getty.transport.Transport` with the
+                session keyword. By default, all providers share the
+                transport returned by
+                :func:`skosprovider_getty.transport.get_default_transport`.
+            * You can pass a :class:`skosprovider_getty.ratelimit.AdaptiveRateController`
+                with the rate_controller keyword to pace all requests to the
+                Getty services. Pass the same controller to all providers.
+            * You can set the stream_rdf keyword to parse RDF documents
+                while they are being received, instead of reading them
+                completely first. This saves memory on large documents.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the cache keyword to keep the fetched RDF documents.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the expand_cache keyword to keep the results of :meth:`expand`.
+                Use a cache with a ttl, eg. :class:`skosprovider_getty.cache.MemoryCache`.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the sparql_cache keyword to keep the answers of SPARQL
+                queries, as used by eg. :meth:`find`, :meth:`get_top_display`,
+                :meth:`get_children_display` and :meth:`expand`. Pass the same
+                cache to several providers to share it.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the object_cache keyword to keep the concepts and
+                collections built by :meth:`get_by_id`, serialised with
+                :mod:`skosprovider_getty.serialise`. A
+                :class:`skosprovider_getty.cache.SQLiteCache` with `wal` set
+                can be shared by all worker processes on a host.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the path_cache keyword to keep the paths found by
+                :meth:`get_path_to_root`. By default, every provider keeps
+                4096 paths for a day in a :class:`skosprovider_getty.cache.MemoryCache`.
+            * You can pass a :class:`skosprovider_getty.cache.CacheBackend`
+                with the label_cache keyword to keep the labels found by
+                :meth:`get_labels`. By default, every provider keeps 16384
+                labels for a day in a :class:`skosprovider_getty.cache.MemoryCache`.
+            * You can pass a dict with the stale_while_revalidate keyword,
+                mapping the names of the methods `get_by_id`, `find`,
+                `get_top_concepts`, `get_top_display`, `get_children_display`
+                and `expand` to a number of seconds. Cached results older
+                than this are still returned, but refreshed in the background
+                by the :class:`skosprovider_getty.cache.BackgroundRefresher`
+                passed with the refresher keyword, or a default one shared
+                by all providers.
+            * You can pass a :class:`skosprovider_getty.compact.CompactVocabulary`
+                with the local_vocabulary keyword. :meth:`get_by_id`,
+                :meth:`get_children_display` and :meth:`expand` are answered
+                from it for the concepts and collections it contains.
+            * You can pass a :class:`skosprovider_getty.indexes.MatchIndex`
+                with the match_index keyword. It is used by :meth:`find_matches`
+                and kept up to date with every concept that is fetched.
+            * You can pass a :class:`skosprovider_getty.indexes.LabelIndex`
+                with the label_index keyword. It is used by :meth:`suggest`
+                and kept up to date with every concept that is fetched.
+            * You can pass a :class:`skosprovider_getty.indexes.SpatialIndex`
+                with the spatial_index keyword. It is used by
+                :meth:`TGNProvider.find_within` and
+                :meth:`TGNProvider.find_nearest` and kept up to date with
+                every place that is fetched.
+            * You can pass an OpenTelemetry tracer with the tracer keyword to
+                get a span for every call and every stage of it, see
+                :mod:`skosprovider_getty.tracing`.
+            * You can pass a number of seconds with the slow_query_threshold
+                keyword. Slower calls are logged with their SPARQL queries
+                and the time spent in every stage.
             * The :class:`skosprovider_getty.providers.AATProvider`
                 is the default :class:`skosprovider_getty.providers.GettyProvider`
         """
@@ -59,8 +151,32 @@ class GettyProvider(VocabularyProvider):
         if 'uri' not in metadata:
             metadata['uri'] = self.url + '/'
         self.metadata = metadata
-        self.subclasses = kwargs.get('subclasses', SubClassCollector(GVP))
-        self.session = kwargs.get('session', requests.Session())
+        self._subclasses = kwargs.get('subclasses', None)
+        self._session = kwargs.get('session', None)
+        self.rate_controller = kwargs.get('rate_controller', None)
+        self.stream_rdf = kwargs.get('stream_rdf', False)
+        self.cache = kwargs.get('cache', None)
+        self.expand_cache = kwargs.get('expand_cache', None)
+        self.sparql_cache = kwargs.get('sparql_cache', None)
+        self.object_cache = kwargs.get('object_cache', None)
+        self.path_cache = kwargs.get('path_cache', None)
+        if self.path_cache is None:
+            self.path_cache = MemoryCache(maxsize=4096, ttl=86400)
+        self.label_cache = kwargs.get('label_cache', None)
+        if self.label_cache is None:
+            self.label_cache = MemoryCache(maxsize=16384, ttl=86400)
+        self.stale_while_revalidate = kwargs.get('stale_while_revalidate', {})
+        for method in self.stale_while_revalidate:
+            if method not in REVALIDATED_METHODS:
+                raise ValueError(
+                    "stale_while_revalidate: only the following methods are allowed: %s"
+                    % ', '.join(REVALIDATED_METHODS))
+        self._refresher = kwargs.get('refresher', None)
+        self.match_index = kwargs.get('match_index', None)
+        self.label_index = kwargs.get('label_index', None)
+        self.spatial_index = kwargs.get('spatial_index', None)
+        self.local_vocabulary = kwargs.get('local_vocabulary', None)
+        self.tracing = Tracing(kwargs.get('tracer', None), kwargs.get('slow_query_threshold', None))
         self.allowed_instance_scopes = kwargs.get(
             'allowed_instance_scopes',
             ['single', 'threaded_thread']
@@ -70,6 +186,38 @@ class GettyProvider(VocabularyProvider):
         else:
             self._conceptscheme = None
 
+    @property
+    def subclasses(self):
+        if self._subclasses is None:
+            from skosprovider_getty.utils import GVP
+            self._subclasses = SubClassCollector(GVP, session=self.session)
+        return self._subclasses
+
+    @subclasses.setter
+    def subclasses(self, subclasses):
+        # `None` creates a new collector on first use.
+        self._subclasses = subclasses
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = get_default_transport()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        if self._session is not None and self._subclasses is not None \
+                and self._subclasses.session is self._session:
+            # The collector created for the previous session follows along.
+            self._subclasses.session = session
+        self._session = session
+
+    @property
+    def refresher(self):
+        if self._refresher is None:
+            self._refresher = get_default_refresher()
+        return self._refresher
+
     @property
     def concept_scheme(self):
         if self._conceptscheme is None:
@@ -79,49 +227,306 @@ class GettyProvider(VocabularyProvider):
     def _get_concept_scheme(self):
         return conceptscheme_from_uri(
             self.metadata['uri'],
-            session=self.session
+            session=self.session,
+            rate_controller=self.rate_controller
         )
 
+    def _do_get_request(self, url, params=None, stream=False):
+        return do_get_request(url, self.session, params=params, rate_controller=self.rate_controller, stream=stream)
+
     def _get_language(self, **kwargs):
         if 'language' in kwargs:
             return kwargs['language']
         return self.metadata['default_language']
 
-    def get_by_id(self, id, change_notes=False):
+    @traced
+    def get_by_id(self, id, change_notes=False, resolve=None, language=None):
         """ Get a :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Collection` by id
 
+        .. code-block:: python
+
+            # Get a concept with the labels of its broader and narrower concepts.
+            concept = provider.get_by_id('300007466', resolve=['broader', 'narrower'], language='nl')
+            for broader in concept.neighbours['broader']:
+                print(broader['id'], broader['label'])
+
         :param (str) id: integer id of the :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Concept`
+        :param (bool) change_notes: Include the revision history as `changeNote` notes.
+        :param list resolve: Optional. The relations to resolve: `broader`,
+            `narrower`, `related`, `subordinate_arrays`, `members` or
+            `superordinates`. The labels of all neighbours are requested with
+            one SPARQL query per 100 neighbours and set as `neighbours` on
+            the concept or collection: a dict mapping every relation to a
+            :class:`lst` of dicts with the keys `id`, `uri`, `type` and
+            `label`, in the same shape as the results of :meth:`find`.
+            Neighbours that are not found have `None` as `type` and `label`.
+        :param str language: Optional. The language of the labels of the
+            neighbours, defaults to the default language of the provider.
         :return: corresponding :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Concept`.
             Returns None if non-existing id
         """
-        graph = uri_to_graph(f'{self.url}/{id}.rdf', session=self.session)
+        if resolve is not None:
+            for relation in resolve:
+                if relation not in RESOLVABLE_RELATIONS:
+                    raise ValueError(
+                        "resolve: only the following values are allowed: %s" % ', '.join(RESOLVABLE_RELATIONS))
+        thing = self._get_thing(id, change_notes)
+        if resolve and thing:
+            kwargs = {} if language is None else {'language': language}
+            thing.neighbours = self._resolve_neighbours(thing, resolve, **kwargs)
+        return thing
+
+    def _get_thing(self, id, change_notes=False):
+        if self.local_vocabulary is not None and id in self.local_vocabulary:
+            thing = self.local_vocabulary.get_by_id(id, self.concept_scheme)
+            if not change_notes:
+                thing.notes = [n for n in thing.notes if n.type != 'changeNote']
+            return thing
+        if self.object_cache is not None:
+            key = self._get_object_key(id, change_notes)
+            data = self._get_cached(
+                self.object_cache, key, 'get_by_id', partial(self._refresh_object, id, change_notes))
+            if data is not None:
+                return load_thing(data, self.concept_scheme)
+        thing = self._build_thing(id, change_notes)
+        if thing is not False and self.object_cache is not None:
+            self.object_cache.set(key, dump_thing(thing))
+        return thing
+
+    def _build_thing(self, id, change_notes=False):
+        url = self.get_rdf_url(id)
+        if self.cache is not None and 'get_by_id' in self.stale_while_revalidate:
+            self._get_cached(self.cache, url, 'get_by_id', partial(self._refresh_rdf, url))
+        graph = uri_to_graph(
+            url, session=self.session, cache=self.cache, rate_controller=self.rate_controller, stream=self.stream_rdf)
         if graph is False:
-            log.debug(f'Failed to retrieve data for {self.url}/{id}.rdf')
+            log.debug(f'Failed to retrieve data for {url}')
             return False
+        if self.match_index is not None:
+            self.match_index.add_graph(graph)
+        if self.spatial_index is not None:
+            self.spatial_index.add_graph(graph)
         # get the concept
         things = things_from_graph(
             graph,
             self.subclasses,
             self.concept_scheme,
-            session=self.session
+            session=self.session,
+            change_notes=change_notes,
+            rate_controller=self.rate_controller
         )
         if len(things) == 0:
             return False
         c = things[0]
+        if self.label_index is not None:
+            self.label_index.add_thing(c)
         return c
 
-    def get_by_uri(self, uri, change_notes=False):
+    def _resolve_neighbours(self, thing, resolve, **kwargs):
+        relations = {
+            relation: [str(id) for id in getattr(thing, relation, [])]
+            for relation in resolve
+        }
+        found = self._get_labelled(
+            ['{}/{}'.format(self.url, id) for ids in relations.values() for id in ids], 'get_by_id', **kwargs)
+        ret = {}
+        for relation, ids in relations.items():
+            ret[relation] = []
+            for id in ids:
+                uri = '{}/{}'.format(self.url, id)
+                ret[relation].append(found.get(uri, {'id': id, 'uri': uri, 'type': None, 'label': None}))
+        return ret
+
+    def _get_labelled(self, uris, method=None, batch_size=100, **kwargs):
+        """ Get the concepts and collections with a label for a list of uris.
+
+        One SPARQL query is sent per `batch_size` uris.
+
+        :returns: A :class:`dict` mapping the uris that were found to a dict
+            in the same shape as the results of :meth:`find`.
+        """
+        uris = list(dict.fromkeys(uris))
+        found = {}
+        for i in range(0, len(uris), batch_size):
+            pattern = "VALUES ?Subject {{{}}} ?Subject rdf:type ?Type; dc:identifier ?Id.".format(
+                ' '.join('<%s>' % uri for uri in uris[i:i + batch_size]))
+            with tracing.span('build_query'):
+                query = self._build_select(
+                    pattern, "((?Type = skos:Concept) || (?Type = skos:Collection))", **kwargs)
+            for item in self._get_answer(query, method, **kwargs):
+                found[item['uri']] = item
+        return found
+
+    @traced
+    def get_labels(self, ids, language=None, batch_size=100):
+        """ Get the preferred labels of a batch of concepts and collections.
+
+        Only the labels are requested, with one SPARQL query per
+        `batch_size` ids, instead of a full RDF document per id. The label
+        is chosen like the labels of :meth:`find`: one in the requested
+        language, the default language of the provider or English.
+
+        The labels are kept in the `label_cache` of the provider, so ids that
+        were looked up before in the same language do not send a request.
+
+        :param ids: An iterable of ids.
+        :param str language: Optional. The language of the labels, defaults
+            to the default language of the provider.
+        :param int batch_size: Number of ids to look up per query.
+        :returns: A :class:`dict` mapping every id to its label, or `None`
+            if it does not exist.
+        """
+        kwargs = {} if language is None else {'language': language}
+        key = 'label:{}/{{}}|{}|{}'.format(self.url, self._get_language(**kwargs), self.metadata['default_language'])
+        ret = {}
+        todo = []
+        for id in dict.fromkeys(str(id) for id in ids):
+            label = self.label_cache.get(key.format(id))
+            if label is not None:
+                ret[id] = label.decode('utf-8')
+            else:
+                ret[id] = None
+                todo.append('{}/{}'.format(self.url, id))
+        for item in self._get_labelled(todo, batch_size=batch_size, **kwargs).values():
+            ret[item['id']] = item['label']
+            self.label_cache.set(key.format(item['id']), item['label'].encode('utf-8'))
+        return ret
+
+    def _get_object_key(self, id, change_notes=False):
+        return 'thing:{}/{}{}'.format(self.url, id, '#changes' if change_notes else '')
+
+    def _refresh_object(self, id, change_notes=False):
+        if self.cache is not None:
+            self._refresh_rdf(self.get_rdf_url(id))
+        thing = self._build_thing(id, change_notes)
+        if thing is not False:
+            self.object_cache.set(self._get_object_key(id, change_notes), dump_thing(thing))
+
+    def get_rdf_url(self, id):
+        '''
+        Get the URL of the RDF document of a concept or collection. This is
+        also the key under which the document is kept in the `cache`.
+
+        :param str id: The id of a concept or collection.
+        :rtype: str
+        '''
+        return f'{self.url}/{id}.rdf'
+
+    def _refresh_rdf(self, url):
+        res = self._do_get_request(url)
+        if res.status_code == 200:
+            self.cache.set(url, res.content)
+
+    @traced
+    def get_by_uri(self, uri, change_notes=False, resolve=None, language=None):
         """ Get a :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Collection` by uri
 
         :param (str) uri: string uri of the :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Concept`
+        :param list resolve: Optional. The relations to resolve, see :meth:`get_by_id`.
+        :param str language: Optional. The language of the labels of the
+            resolved neighbours.
         :return: corresponding :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Concept`.
             Returns None if non-existing id
+            Returns None if the uri does not belong to this vocabulary.
         """
+        id = self.id_from_uri(uri)
+        if id is None:
+            return None
+        return self.get_by_id(id, change_notes, resolve, language)
 
-        id = uri_to_id(uri)
+    def id_from_uri(self, uri):
+        """ Get the id of a concept or collection of this vocabulary from its uri.
 
-        return self.get_by_id(id, change_notes) if 'vocab.getty.edu' in uri else None
+        The variants of Getty uris are accepted (see
+        :func:`skosprovider_getty.utils.normalise_uri`), as are uris
+        starting with the `url` of the provider, eg. when a custom
+        `base_url` is used.
 
+        :param str uri: A :term:`uri`.
+        :returns: The id, or `None` if the uri does not belong to this vocabulary.
+        """
+        normalised = normalise_uri(uri)
+        if normalised is not None:
+            return uri_to_id(normalised) if uri_to_vocab_id(normalised) == self.vocab_id else None
+        prefix = self.url + '/'
+        uri = uri.strip()
+        if uri.startswith(prefix):
+            id = uri[len(prefix):].strip('/')
+            if id and '/' not in id:
+                return id
+        return None
+
+    @traced
+    def get_by_ids(self, ids, batch_size=100):
+        """ Get a batch of :class:`skosprovider.skos.Concept` or :class:`skosprovider.skos.Collection` by id
+
+        Concepts and collections that are not available locally, in the
+        `object_cache` or in the `cache` are fetched with one SPARQL
+        CONSTRUCT query per `batch_size` ids, instead of one request per
+        id. The query does not return entire RDF documents, eg. no revision
+        history and no coordinates, so the results are only kept in the
+        `object_cache` and never in the `cache` of RDF documents.
+
+        :param ids: An iterable of ids.
+        :param int batch_size: Number of ids to fetch per query.
+        :returns: A :class:`dict` mapping every id to the corresponding
+            :class:`skosprovider.skos.Concept` or
+            :class:`skosprovider.skos.Collection`, or `False` if it does
+            not exist.
+        """
+        ret = {}
+        todo = []
+        for id in dict.fromkeys(str(id) for id in ids):
+            if self.local_vocabulary is not None and id in self.local_vocabulary:
+                ret[id] = self.get_by_id(id)
+                continue
+            if self.object_cache is not None:
+                data = self.object_cache.get(self._get_object_key(id))
+                if data is not None:
+                    ret[id] = load_thing(data, self.concept_scheme)
+                    continue
+            if self.cache is not None and self.get_rdf_url(id) in self.cache:
+                ret[id] = self._build_thing(id)
+                if ret[id] is not False and self.object_cache is not None:
+                    self.object_cache.set(self._get_object_key(id), dump_thing(ret[id]))
+                continue
+            todo.append(id)
+        for i in range(0, len(todo), batch_size):
+            batch = todo[i:i + batch_size]
+            for thing in self._fetch_things(batch):
+                if thing.id in ret or thing.id not in batch:
+                    continue
+                ret[thing.id] = thing
+                if self.label_index is not None:
+                    self.label_index.add_thing(thing)
+                if self.object_cache is not None:
+                    self.object_cache.set(self._get_object_key(thing.id), dump_thing(thing))
+        for id in todo:
+            ret.setdefault(id, False)
+        return ret
+
+    def _fetch_things(self, ids):
+        from rdflib.graph import Graph
+
+        query = """CONSTRUCT {{?Subject ?Pred ?Object. ?Object rdf:value ?Value.}}
+            WHERE {{
+            VALUES ?Subject {{{}}}
+            ?Subject ?Pred ?Object.
+            OPTIONAL {{?Object rdf:value ?Value}}
+            }}""".format(' '.join('<%s/%s>' % (self.url, id) for id in ids))
+        res = self._do_get_request(self.base_url + "sparql.rdf", params={'query': query}, stream=self.stream_rdf)
+        with tracing.span('parse'):
+            if self.stream_rdf:
+                graph = stream_to_graph(res)
+            else:
+                graph = Graph()
+                graph.parse(data=res.content, format="application/rdf+xml")
+        if self.match_index is not None:
+            self.match_index.add_graph(graph)
+        return things_from_graph(
+            graph, self.subclasses, self.concept_scheme, session=self.session, rate_controller=self.rate_controller)
+
+    @traced
     def find(self, query, **kwargs):
         '''Find concepts that match a certain query.
 
@@ -167,7 +572,31 @@ class GettyProvider(VocabularyProvider):
                     should return concepts and collections that are a member \
                     of the collection or are a narrower concept of a member \
                     of the collection.
-
+            * `matches`: Search only for concepts having a match to a \
+                certain external concept. This argument should be a dict \
+                with the keys `uri` (required) and `type` (optional, \
+                `exact`, `close`, `broad`, `narrow` or `related`).
+            * `vocabularies`: Search in several Getty vocabularies at once, \
+                eg. `['aat', 'tgn', 'ulan']`. A single query is sent to the \
+                Getty services and every result gets an extra `vocabulary` \
+                key. Ids given in `collection` belong to the vocabulary of \
+                this provider.
+            * `fuzzy`: Search the `label` in the \
+                :class:`skosprovider_getty.indexes.LabelIndex` of the \
+                provider instead of the Getty services. Accents and case are \
+                ignored and a few typos are tolerated. Only `label` and \
+                `type` can be combined with it. Every result gets an extra \
+                `score` key and results are ordered by score unless a \
+                `sort` is given. Pass `budget` to limit the number of \
+                seconds the search may take, it defaults to 0.05.
+
+        :param int limit: Optional. Only return the first `limit` results.
+            The ordering and limiting will be done by the Getty SPARQL endpoint,
+            so only a single page of results is transferred. The endpoint
+            sorts labels byte-wise, ignoring case, so which results are
+            selected follows that order: labels starting with an accented
+            letter come after `z`. The selected results are then sorted
+            ignoring accents.
         :returns: A :class:`lst` of concepts and collections. Each of these
             is a dict with the following keys:
 
@@ -215,6 +644,18 @@ class GettyProvider(VocabularyProvider):
             match_type = query['matches'].get('type', None)
             if match_type:
                 match_pred = 'skos:%sMatch' % match_type
+        # Vocabularies to search in (optional)
+        vocabularies = query.get('vocabularies', None)
+        if vocabularies is not None:
+            if not vocabularies or not set(vocabularies) <= set(GETTY_VOCABULARIES):
+                raise ValueError(
+                    "vocabularies: only the following values are allowed: %s" % ', '.join(GETTY_VOCABULARIES))
+        if query.get('fuzzy', False):
+            if self.label_index is None:
+                raise ValueError('fuzzy: the provider has no label_index')
+            if not label or coll_id is not None or match_uri is not None or vocabularies is not None:
+                raise ValueError("fuzzy: only 'label' and 'type' can be used in a fuzzy search")
+            return self._find_fuzzy(label, type_c, **kwargs)
 
         # build sparql query
         coll_x = ""
@@ -232,39 +673,199 @@ class GettyProvider(VocabularyProvider):
             type_values = "(?Type = skos:Concept)"
         elif type_c == 'collection':
             type_values = "(?Type = skos:Collection)"
-        query = """
-            SELECT ?Subject ?Term ?Type ?Id (lang(?Term) as ?Lang) {{
-            ?Subject rdf:type ?Type; dc:identifier ?Id; skos:inScheme {}:; {}{}{}.
-                            OPTIONAL {{
-                  {{?Subject xl:prefLabel [skosxl:literalForm ?Term]}}
-                          }}
-            FILTER({})
-            }}""".format(
-                self.vocab_id,
-                self._build_keywords(label), coll_x, match_values,
-                type_values)
-        ret = self._get_answer(query, **kwargs)
+        if vocabularies is None:
+            scheme = self.vocab_id + ":"
+        else:
+            scheme = "?Scheme"
+        pattern = "?Subject rdf:type ?Type; dc:identifier ?Id; skos:inScheme {}; {}{}{}.".format(
+            scheme,
+            self._build_keywords(label), coll_x, match_values)
+        if vocabularies is not None:
+            pattern = "VALUES ?Scheme {{{}}} {}".format(
+                ' '.join(v + ':' for v in vocabularies), pattern)
+        with tracing.span('build_query'):
+            query = self._build_select(pattern, type_values, **kwargs)
+        ret = self._get_answer(query, 'find', **kwargs)
+        if vocabularies is not None:
+            for item in ret:
+                item['vocabulary'] = uri_to_vocab_id(item['uri'])
         language = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
-        return self._sort(ret, sort, language, sort_order == 'desc')
+        return self._sort(ret, sort, language, sort_order == 'desc', self._get_limit(**kwargs))
 
-    def get_all(self, **kwargs):
+    def _find_fuzzy(self, label, type_c='all', **kwargs):
+        language = self._get_language(**kwargs)
+        limit = self._get_limit(**kwargs)
+        ret = self.label_index.search(
+            label,
+            language,
+            limit=limit if type_c == 'all' and 'sort' not in kwargs else None,
+            fallback_language=self.metadata['default_language'],
+            uri_prefix=self.url + '/',
+            budget=kwargs.get('budget', 0.05)
+        )
+        if type_c != 'all':
+            ret = [item for item in ret if item['type'] == type_c]
+        if 'sort' not in kwargs:
+            return ret[:limit]
+        return self._sort(ret, self._get_sort(**kwargs), language,
+                          self._get_sort_order(**kwargs) == 'desc', limit)
+
+    @traced
+    def find_matches(self, uris, type=None):
+        """ Find the concepts in this vocabulary that match a batch of external URIs.
+
+        When the provider has a :class:`skosprovider_getty.indexes.MatchIndex`,
+        the matches are read from it and no request is sent to the Getty
+        services. Otherwise, the URIs are looked up with one SPARQL query per
+        100 URIs.
+
+        :param uris: An iterable of external :term:`URI`.
+        :param str type: Optional. Only return matches of this type:
+            `exact`, `close`, `broad`, `narrow` or `related`.
+        :returns: A :class:`dict` mapping every URI to a :class:`lst` of
+            dicts with the keys `id`, `uri` and `match`.
         """
-        Not supported: This provider does not support this. The amount of results is too large
+        if type is not None and type not in MATCH_TYPES:
+            raise ValueError(
+                "type: only the following values are allowed: %s" % ', '.join(MATCH_TYPES))
+        uris = list(dict.fromkeys(uris))
+        prefix = self.url + '/'
+        if self.match_index is not None:
+            return {uri: self.match_index.lookup(uri, type, prefix) for uri in uris}
+        types = MATCH_TYPES if type is None else (type,)
+        ret = {uri: [] for uri in uris}
+        for i in range(0, len(uris), 100):
+            query = """SELECT ?Subject ?Match ?Pred {{
+                VALUES ?Match {{{}}}
+                VALUES ?Pred {{{}}}
+                ?Subject ?Pred ?Match; skos:inScheme {}:.
+                }}""".format(
+                    ' '.join('<%s>' % uri for uri in uris[i:i + 100]),
+                    ' '.join('skos:%sMatch' % t for t in types),
+                    self.vocab_id)
+            res = self._do_get_request(self.base_url + "sparql.json", params={'query': query})
+            with tracing.span('parse'):
+                bindings = res.json()["results"]["bindings"]
+            tracing.record(bindings=len(bindings))
+            for result in bindings:
+                getty_uri = result["Subject"]["value"]
+                ret[result["Match"]["value"]].append({
+                    'id': uri_to_id(getty_uri),
+                    'uri': getty_uri,
+                    'match': result["Pred"]["value"].rsplit('#', 1)[1][:-len('Match')]
+                })
+        for matches in ret.values():
+            matches.sort(key=itemgetter('id'))
+        return ret
+
+    def suggest(self, prefix, language=None, limit=10):
+        """ Suggest concepts and collections with a label starting with a prefix.
+
+        Meant for type-ahead, the suggestions are read from the
+        :class:`skosprovider_getty.indexes.LabelIndex` of the provider
+        and no request is sent to the Getty services. Accents and case are
+        ignored. Exact matches are ranked first, then prefLabels before
+        altLabels and labels in the requested language before labels in
+        the default language of the provider.
+
+        :param str prefix: The prefix typed so far.
+        :param str language: Optional. The preferred language, defaults to
+            the default language of the provider.
+        :param int limit: Maximum number of suggestions.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`
+            and `label`.
         """
-        warnings.warn(
-            'This provider does not support this. The amount of results is too large',
-            UserWarning
+        if self.label_index is None:
+            raise ValueError('suggest: the provider has no label_index')
+        return self.label_index.suggest(
+            prefix,
+            language or self.metadata['default_language'],
+            limit,
+            fallback_language=self.metadata['default_language'],
+            uri_prefix=self.url + '/'
         )
-        return False
 
-    def _get_answer(self, query, **kwargs):
+    def get_all(self, **kwargs):
+        """
+        Not supported as a list: the amount of results is too large.
+
+        When called with `stream=True`, a generator is returned that walks
+        the entire vocabulary. See :meth:`iter_all`.
+        """
+        if kwargs.pop('stream', False):
+            return self._iter_all('get_all', **kwargs)
+        with self.tracing.trace('get_all'):
+            warnings.warn(
+                'This provider does not support this. The amount of results is too large',
+                UserWarning
+            )
+            return False
+
+    def iter_all(self, type='all', page_size=1000, cursor=None, **kwargs):
+        """ Iterate over all concepts and/or collections in the vocabulary.
+
+        The vocabulary is walked in pages ordered by id. Every page is
+        requested with a SPARQL query that only asks for ids greater than the
+        last id seen, so memory use is bounded by the page size and an
+        interrupted walk can be resumed by passing the id of the last item
+        that was processed as `cursor`.
+
+        :param str type: `all`, `concept` or `collection`.
+        :param int page_size: Number of concepts or collections per query.
+        :param str cursor: Only return items with an id greater than this one.
+        :returns: A generator of dicts with the keys `id`, `uri`, `type` and
+            `label`, in the same shape as the results of :meth:`find`.
+        """
+        return self._iter_all('iter_all', type, page_size, cursor, **kwargs)
+
+    def _iter_all(self, name, type='all', page_size=1000, cursor=None, **kwargs):
+        # Every page is traced as a call to `name`. A trace can't stay open
+        # while the caller consumes the generator, since the caller's own
+        # calls would become part of it.
+        if type not in ('all', 'concept', 'collection'):
+            raise ValueError("type: only the following values are allowed: 'all', 'concept', 'collection'")
+        if page_size < 1:
+            raise ValueError('page_size: should be a positive integer')
+        type_values = "((?Type = skos:Concept) || (?Type = skos:Collection))"
+        if type == 'concept':
+            type_values = "(?Type = skos:Concept)"
+        elif type == 'collection':
+            type_values = "(?Type = skos:Collection)"
+        while True:
+            cursor_filter = ""
+            if cursor is not None:
+                cursor_filter = "FILTER(STR(?Id) > {})".format(sparql_literal(cursor))
+            query = """SELECT ?Subject ?Id ?Type ?Term (lang(?Term) as ?Lang)
+                {{
+                {{
+                SELECT ?Subject ?Id ?Type {{
+                ?Subject rdf:type ?Type; dc:identifier ?Id; skos:inScheme {}:.
+                FILTER({})
+                {}
+                }} ORDER BY STR(?Id) LIMIT {}
+                }}
+                OPTIONAL {{
+                  {{?Subject xl:prefLabel [skosxl:literalForm ?Term]}}
+                          }}
+                }}""".format(self.vocab_id, type_values, cursor_filter, page_size)
+            with self.tracing.trace(name):
+                page = self._sort(self._get_answer(query, **kwargs), 'id')
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            cursor = page[-1]['id']
+
+    def _get_answer(self, query, method=None, **kwargs):
         # send request to getty
         """ Returns the results of the Sparql query to a :class:`lst` of concepts and collections.
             The return :class:`lst`  can be empty.
 
         :param query (str): Sparql query
+        :param method (str): The public method the query is sent for, used
+            to look up the `stale_while_revalidate` settings.
         :returns: A :class:`lst` of concepts and collections. Each of these
             is a dict with the following keys:
             * id: id within the conceptscheme
@@ -272,11 +873,26 @@ class GettyProvider(VocabularyProvider):
             * type: concept or collection
             * label: A label to represent the concept or collection.
         """
+        # The labels depend on both the requested and the default language
+        language = '{}|{}'.format(self._get_language(**kwargs), self.metadata['default_language'])
+        cached = self._get_cached_answer(
+            query, language, method, lambda: self._fetch_answer(query, language, **kwargs))
+        if cached is not None:
+            return cached
+        return self._fetch_answer(query, language, **kwargs)
+
+    def _fetch_answer(self, query, cache_language, **kwargs):
         request = self.base_url + "sparql.json"
-        res = do_get_request(request, self.session, params={'query': query})
-        r = res.json()
+        res = self._do_get_request(request, params={'query': query})
+        with tracing.span('parse'):
+            ret = self._read_answer(res.json()["results"]["bindings"], **kwargs)
+        self._set_cached_answer(query, cache_language, ret)
+        return ret
+
+    def _read_answer(self, bindings, **kwargs):
+        tracing.record(bindings=len(bindings))
         d = {}
-        for result in r["results"]["bindings"]:
+        for result in bindings:
             uri = result["Subject"]["value"]
             if "Term" in result:
                 label = result["Term"]["value"]
@@ -305,6 +921,43 @@ class GettyProvider(VocabularyProvider):
                 d[uri] = item
         return list(d.values())
 
+    def _get_cached_answer(self, query, language=None, method=None, refresh=None):
+        if self.sparql_cache is None:
+            return None
+        cached = self._get_cached(
+            self.sparql_cache,
+            query_key(self.base_url + "sparql.json", query, language),
+            method, refresh
+        )
+        if cached is None:
+            return None
+        return json.loads(cached)
+
+    def _get_cached(self, cache, key, method=None, refresh=None):
+        """ Get a value from a cache, serving stale values while they are refreshed.
+
+        If the value is older than the `stale_while_revalidate` setting for
+        `method`, it is returned anyway and `refresh` is scheduled on the
+        background refresher.
+        """
+        entry = cache.get_entry(key)
+        if entry is None:
+            return None
+        value, stored = entry
+        max_age = self.stale_while_revalidate.get(method)
+        if max_age is not None and refresh is not None and stored is not None \
+                and time.time() - stored > max_age:
+            self.refresher.schedule(key, refresh)
+        return value
+
+    def _set_cached_answer(self, query, language, answer):
+        if self.sparql_cache is None:
+            return
+        self.sparql_cache.set(
+            query_key(self.base_url + "sparql.json", query, language),
+            json.dumps(answer).encode('utf-8')
+        )
+
     def _get_top(self, type='All', **kwargs):
         """ Returns all top-level facets. The returned values depend on the given type:
             Concept or All (Concepts and Collections). Default All is used.
@@ -318,90 +971,352 @@ class GettyProvider(VocabularyProvider):
         else:
             type_values = "((?Type = skos:Concept) || (?Type = skos:Collection))"
 
-        query = """SELECT ?Subject ?Id ?Type ?Term (lang(?Term) as ?Lang)
-                {{
-                ?Subject a gvp:Facet; rdf:type ?Type;
-                 dc:identifier ?Id; skos:inScheme {}:;.
-                 OPTIONAL {{
-                  {{?Subject xl:prefLabel [skosxl:literalForm ?Term]}}
-                          }}
-                FILTER ({})
-                }}""".format(self.vocab_id, type_values)
-        ret = self._get_answer(query, **kwargs)
+        pattern = "?Subject a gvp:Facet; rdf:type ?Type; dc:identifier ?Id; skos:inScheme {}:;.".format(
+            self.vocab_id)
+        with tracing.span('build_query'):
+            query = self._build_select(pattern, type_values, **kwargs)
+        method = 'get_top_concepts' if type == 'concepts' else 'get_top_display'
+        ret = self._get_answer(query, method, **kwargs)
         language = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
-        return self._sort(ret, sort, language, sort_order == 'desc')
+        return self._sort(ret, sort, language, sort_order == 'desc', self._get_limit(**kwargs))
 
+    @traced
     def get_top_concepts(self, **kwargs):
         """  Returns all concepts that form the top-level of a display hierarchy.
 
+        :param int limit: Optional. Only return the first `limit` results,
+            selected in the byte order of the Getty SPARQL endpoint as
+            explained for :meth:`find`.
         :return: A :class:`lst` of concepts.
         """
         return self._get_top("concepts", **kwargs)
 
+    @traced
     def get_top_display(self, **kwargs):
         """  Returns all concepts or collections that form the top-level of a display hierarchy.
 
+        :param int limit: Optional. Only return the first `limit` results,
+            selected in the byte order of the Getty SPARQL endpoint as
+            explained for :meth:`find`.
         :return: A :class:`lst` of concepts and collections.
         """
         return self._get_top(**kwargs)
 
+    @traced
     def get_children_display(self, id, **kwargs):
         """ Return a list of concepts or collections that should be displayed under this concept or collection.
 
         :param str id: A concept or collection id.
+        :param int limit: Optional. Only return the first `limit` results,
+            selected in the byte order of the Getty SPARQL endpoint as
+            explained for :meth:`find`.
         :returns: A :class:`lst` of concepts and collections.
         """
+        if self.local_vocabulary is not None and id in self.local_vocabulary:
+            language = self._get_language(**kwargs)
+            ret = self.local_vocabulary.get_children_display(id, language, self.metadata['default_language'])
+            sort_order = self._get_sort_order(**kwargs)
+            return self._sort(ret, self._get_sort(**kwargs), language, sort_order == 'desc', self._get_limit(**kwargs))
         broader = 'broader'
         type_values = "((?Type = skos:Concept) || (?Type = skos:Collection))"
 
-        query = """SELECT ?Subject ?Id ?Type ?Term (lang(?Term) as ?Lang)
-                {{
-                ?Subject rdf:type ?Type;
-                dc:identifier ?Id; skos:inScheme {}:; gvp:{} {}:{};.
-                OPTIONAL {{
-                  {{?Subject xl:prefLabel [skosxl:literalForm ?Term]}}
-                          }}
-                FILTER({})
-                }}""".format(self.vocab_id, broader, self.vocab_id, id, type_values)
+        pattern = "?Subject rdf:type ?Type; dc:identifier ?Id; skos:inScheme {}:; gvp:{} {}:{};.".format(
+            self.vocab_id, broader, self.vocab_id, id)
+        with tracing.span('build_query'):
+            query = self._build_select(pattern, type_values, **kwargs)
 
-        ret = self._get_answer(query, **kwargs)
+        ret = self._get_answer(query, 'get_children_display', **kwargs)
         language = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
-        return self._sort(ret, sort, language, sort_order == 'desc')
+        return self._sort(ret, sort, language, sort_order == 'desc', self._get_limit(**kwargs))
+
+    @traced
+    def get_path_to_root(self, id, language=None, all_paths=False):
+        """ Return the ancestors of a concept or collection, up to the top of the hierarchy.
+
+        The ancestors and their labels are requested with one SPARQL query,
+        following `gvp:broaderPreferred`. With `all_paths`, every path
+        through the polyhierarchy is returned, following `gvp:broader` and
+        `gvp:broaderExtended`.
+
+        The paths of all ancestors are kept in the `path_cache` of the
+        provider, so looking up an ancestor or a concept that was already
+        looked up does not send a request.
+
+        .. code-block:: python
+
+            # Render a breadcrumb
+            path = provider.get_path_to_root('300007466', language='nl')
+            print(' > '.join(item['label'] for item in path))
 
-    def expand(self, id):
+        :param str id: A concept or collection id.
+        :param str language: Optional. The language of the labels, defaults
+            to the default language of the provider.
+        :param bool all_paths: Return all paths instead of only the
+            preferred one.
+        :returns: A :class:`lst` of dicts with the keys `id`, `uri`, `type`
+            and `label`, in the same shape as the results of :meth:`find`,
+            starting at the top of the hierarchy and ending with the parent
+            of the concept or collection. With `all_paths`, a :class:`lst`
+            of such lists. Returns False if the input id does not exist.
+        """
+        kwargs = {} if language is None else {'language': language}
+        paths = self._get_paths(str(id), all_paths, **kwargs)
+        if paths is False or all_paths:
+            return paths
+        return paths[0]
+
+    def _get_path_key(self, id, all_paths, **kwargs):
+        return 'path:{}/{}|{}|{}{}'.format(
+            self.url, id, self._get_language(**kwargs), self.metadata['default_language'],
+            '#all' if all_paths else '')
+
+    def _get_paths(self, id, all_paths=False, **kwargs):
+        key = self._get_path_key(id, all_paths, **kwargs)
+        cached = self.path_cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        uri = '{}/{}'.format(self.url, id)
+        if all_paths:
+            ancestors = "{{BIND(<{0}> AS ?Subject)}} UNION {{<{0}> gvp:broaderExtended ?Subject}}".format(uri)
+            parent = "gvp:broader"
+        else:
+            ancestors = "<{}> gvp:broaderPreferred* ?Subject.".format(uri)
+            parent = "gvp:broaderPreferred"
+        query = """SELECT ?Subject ?Id ?Type ?Parent ?Term (lang(?Term) as ?Lang) {{
+            {}
+            ?Subject rdf:type ?Type; dc:identifier ?Id.
+            OPTIONAL {{?Subject {} ?Parent}}
+            OPTIONAL {{?Subject xl:prefLabel [skosxl:literalForm ?Term]}}
+            FILTER((?Type = skos:Concept) || (?Type = skos:Collection))
+            }}""".format(ancestors, parent)
+        res = self._do_get_request(self.base_url + "sparql.json", params={'query': query})
+        with tracing.span('parse'):
+            bindings = res.json()["results"]["bindings"]
+            nodes = {item['uri']: item for item in self._read_answer(bindings, **kwargs)}
+            parents = {}
+            for result in bindings:
+                parents.setdefault(result["Subject"]["value"], {})
+                if "Parent" in result and result["Parent"]["value"] in nodes:
+                    parents[result["Subject"]["value"]][result["Parent"]["value"]] = None
+        if uri not in nodes:
+            return False
+        paths = {}
+
+        def paths_of(node, seen=()):
+            if node not in paths:
+                ret = []
+                for p in parents.get(node, ()):
+                    if p not in seen:
+                        ret.extend(path + [nodes[p]] for path in paths_of(p, seen + (node,)))
+                paths[node] = ret or [[]]
+            return paths[node]
+
+        for node in nodes:
+            self.path_cache.set(
+                self._get_path_key(nodes[node]['id'], all_paths, **kwargs),
+                json.dumps(paths_of(node)).encode('utf-8'))
+        return paths[uri]
+
+    @traced
+    def expand(self, id, page_size=None):
         """ Expand a concept or collection to all it's narrower concepts.
             If the id passed belongs to a :class:`skosprovider.skos.Concept`,
             the id of the concept itself should be include in the return value.
 
+        When the provider has an `expand_cache`, the result is read from and
+        stored in it.
+
         :param str id: A concept or collection id.
+        :param int page_size: Optional. Retrieve the narrower concepts in
+            pages of this size, for very large subtrees. See
+            :meth:`iter_expand`.
         :returns: A :class:`lst` of id's. Returns false if the input id does not exists
         """
+        if self.local_vocabulary is not None and id in self.local_vocabulary:
+            return self.local_vocabulary.expand(id)
+        key = f'expand:{self.url}/{id}'
+        if self.expand_cache is not None:
+            cached = self.expand_cache.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        result = list(self.iter_expand(id, page_size))
+        if len(result) == 0 and not self._exists(id):
+            return False
+        if self.expand_cache is not None:
+            self.expand_cache.set(key, json.dumps(result).encode('utf-8'))
+        return result
 
-        query = """SELECT DISTINCT ?Id{{
-                {{
-                ?Subject dc:identifier ?Id; skos:inScheme {}:; gvp:broaderExtended {};.
-                }}
-                UNION
-                {{
-                VALUES ?Id {{'{}'}}
-                ?Subject dc:identifier ?Id; skos:inScheme {}:; rdf:type skos:Concept.
-                }}
-                }}
-                """.format(self.vocab_id, self.vocab_id + ":" + id, id, self.vocab_id)
+    def iter_expand(self, id, page_size=None):
+        """ Expand a concept or collection to all it's narrower concepts, as a generator.
 
-        print(query)
+        Unlike :meth:`expand`, nothing is yielded for an id that does not exist.
+
+        :param str id: A concept or collection id.
+        :param int page_size: Optional. When present, the ids are requested
+            in pages of this size, ordered by id, so huge subtrees never
+            have to be transferred in one response.
+        :returns: A generator of id's.
+        """
+        cursor = None
+        while True:
+            cursor_filter = ""
+            if cursor is not None:
+                cursor_filter = "FILTER(STR(?Id) > {})".format(sparql_literal(cursor))
+            paging = ""
+            if page_size is not None:
+                paging = "ORDER BY STR(?Id) LIMIT {}".format(page_size)
+            query = """SELECT DISTINCT ?Id{{
+                    {{
+                    ?Subject dc:identifier ?Id; skos:inScheme {}:; gvp:broaderExtended {};.
+                    }}
+                    UNION
+                    {{
+                    VALUES ?Id {{{}}}
+                    ?Subject dc:identifier ?Id; skos:inScheme {}:; rdf:type skos:Concept.
+                    }}
+                    {}
+                    }} {}
+                    """.format(self.vocab_id, self.vocab_id + ":" + id, sparql_literal(id), self.vocab_id,
+                               cursor_filter, paging)
+            ids = self._get_cached_answer(query, None, 'expand', partial(self._fetch_ids, query))
+            if ids is None:
+                ids = self._fetch_ids(query)
+            for i in ids:
+                yield i
+            if page_size is None or len(ids) < page_size:
+                return
+            cursor = ids[-1]
+
+    def _fetch_ids(self, query):
         request = self.base_url + "sparql.json"
-        res = do_get_request(request, self.session, params={'query': query})
-        r = res.json()
+        res = self._do_get_request(request, params={'query': query})
+        with tracing.span('parse'):
+            bindings = res.json()['results']['bindings']
+        tracing.record(bindings=len(bindings))
+        ids = [result['Id']['value'] for result in bindings]
+        self._set_cached_answer(query, None, ids)
+        return ids
 
-        result = [result['Id']['value'] for result in r['results']['bindings']]
-        if len(result) == 0 and self.get_by_id(id) is False:
-            return False
-        return result
+    def _exists(self, id):
+        """ Check if a concept or collection exists with a SPARQL ASK query.
+
+        :param str id: A concept or collection id.
+        :rtype: bool
+        """
+        query = "ASK {{<{}/{}> skos:inScheme {}:}}".format(self.url, id, self.vocab_id)
+        request = self.base_url + "sparql.json"
+        res = self._do_get_request(request, params={'query': query})
+        with tracing.span('parse'):
+            return res.json().get('boolean', False)
+
+    def iter_changes(self, since, page_size=1000):
+        """ Iterate over the concepts and collections that changed since a moment.
+
+        The revision history of the Getty vocabularies (the `prov:startedAtTime`
+        of the revisions in the `skos:changeNote` of every concept) is used.
+        Results are ordered by the moment of their last change and requested
+        in pages.
+
+        :param since: A :class:`datetime.datetime` or an ISO 8601 string.
+        :param int page_size: Number of changes to request per query.
+        :returns: A generator of dicts with the keys `id`, `uri` and
+            `modified`, the ISO 8601 timestamp of the last change.
+        """
+        if not isinstance(since, datetime):
+            try:
+                since = datetime.fromisoformat(since)
+            except (TypeError, ValueError):
+                raise ValueError('since: should be a datetime or an ISO 8601 string')
+        since = sparql_literal(since.isoformat())
+        cursor = None
+        while True:
+            if cursor is None:
+                having = "?Modified > {}^^xsd:dateTime".format(since)
+            else:
+                having = (
+                    "?Modified > {0}^^xsd:dateTime || "
+                    "(?Modified = {0}^^xsd:dateTime && STR(?Id) > {1})"
+                ).format(sparql_literal(cursor['modified']), sparql_literal(cursor['id']))
+            query = """PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+                PREFIX prov: <http://www.w3.org/ns/prov#>
+                SELECT ?Subject ?Id (MAX(?Time) AS ?Modified) {{
+                ?Subject skos:inScheme {}:; dc:identifier ?Id; skos:changeNote ?Revision.
+                ?Revision prov:startedAtTime ?Time.
+                FILTER(?Time > {}^^xsd:dateTime)
+                }} GROUP BY ?Subject ?Id
+                HAVING({})
+                ORDER BY ?Modified STR(?Id) LIMIT {}""".format(self.vocab_id, since, having, page_size)
+            request = self.base_url + "sparql.json"
+            res = self._do_get_request(request, params={'query': query})
+            changes = [{
+                'id': result['Id']['value'],
+                'uri': result['Subject']['value'],
+                'modified': result['Modified']['value']
+            } for result in res.json()['results']['bindings']]
+            for change in changes:
+                yield change
+            if len(changes) < page_size:
+                return
+            cursor = changes[-1]
+
+    def sync_changes(self, since, refetch=False, page_size=1000):
+        """ Bring the cached data up to date with the changes since a moment.
+
+        For all concepts and collections that changed:
+
+        * their RDF documents are removed from the `cache`, their concepts
+          and collections from the `object_cache` and their own result
+          from the `expand_cache`,
+        * they are removed from the `match_index`, `label_index` and
+          `spatial_index`,
+        * they are fetched again when `refetch` is set, which registers
+          them in the indexes again.
+
+        The `path_cache` and `label_cache` are cleared when anything
+        changed, since a label or broader concept of one concept is part of
+        the paths of all its descendants.
+
+        Not kept in sync are the `sparql_cache` and the results of
+        :meth:`expand` for the ancestors of the changed concepts in the
+        `expand_cache`, give those caches a ttl. A `local_vocabulary` is
+        read-only, build it again.
+
+        :param since: A :class:`datetime.datetime` or an ISO 8601 string,
+            usually the result of the previous sync.
+        :param bool refetch: Fetch the changed concepts and collections again.
+        :param int page_size: Number of changes to request per query.
+        :returns: The ISO 8601 timestamp of the last change seen, to pass as
+            `since` to the next sync.
+        """
+        last = since.isoformat() if isinstance(since, datetime) else since
+        changed = []
+        for change in self.iter_changes(since, page_size):
+            changed.append(change['id'])
+            last = change['modified']
+        if not changed:
+            return last
+        for id in changed:
+            if self.cache is not None:
+                self.cache.delete(self.get_rdf_url(id))
+            if self.object_cache is not None:
+                self.object_cache.delete(self._get_object_key(id))
+                self.object_cache.delete(self._get_object_key(id, True))
+            if self.expand_cache is not None:
+                self.expand_cache.delete(f'expand:{self.url}/{id}')
+        self.path_cache.clear()
+        self.label_cache.clear()
+        uris = ['{}/{}'.format(self.url, id) for id in changed]
+        for index in (self.match_index, self.label_index, self.spatial_index):
+            if index is not None:
+                index.remove(uris)
+        if refetch:
+            for id in changed:
+                self.get_by_id(id)
+        return last
 
     def _build_keywords(self, label):
         if label is None:
@@ -416,13 +1331,87 @@ class GettyProvider(VocabularyProvider):
 
         return "luc:term '" + keywords + "';"
 
-    def _sort(self, items, sort, language='en', reverse=False):
+    def _get_limit(self, **kwargs):
+        limit = kwargs.get('limit', None)
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError('limit: should be a positive integer')
+        return limit
+
+    def _build_select(self, pattern, type_values, **kwargs):
+        """ Build a query listing the concepts and collections matching a pattern.
+
+        When a `limit` is passed, ordering and limiting is done by the SPARQL
+        endpoint in a subquery, so only the first `limit` concepts or
+        collections are transferred. The endpoint can only sort labels
+        byte-wise on a label in the requested language (or English), so the
+        selection follows that order, even though the final ordering of the
+        selected items is done by :meth:`_sort`.
+
+        :param str pattern: Triple patterns binding `?Subject`, `?Type` and `?Id`.
+        :param str type_values: A filter expression on `?Type`.
+        :returns: A SPARQL query.
+        """
+        label_pattern = """OPTIONAL {
+                  {?Subject xl:prefLabel [skosxl:literalForm ?Term]}
+                          }"""
+        limit = self._get_limit(**kwargs)
+        if limit is None:
+            return """SELECT ?Subject ?Term ?Type ?Id (lang(?Term) as ?Lang) {{
+                {}
+                {}
+                FILTER({})
+                }}""".format(pattern, label_pattern, type_values)
+        sort = self._get_sort(**kwargs)
+        direction = 'DESC' if self._get_sort_order(**kwargs) == 'desc' else 'ASC'
+        if sort in ('label', 'sortlabel'):
+            language = self._get_language(**kwargs).split('-')[0].lower()
+            sort_select = "(SAMPLE(COALESCE(?SortLang, ?SortEn, '')) AS ?SortTerm)"
+            sort_pattern = """OPTIONAL {{?Subject xl:prefLabel [skosxl:literalForm ?SortLang]
+                    FILTER(langMatches(lang(?SortLang), '{}'))}}
+                OPTIONAL {{?Subject xl:prefLabel [skosxl:literalForm ?SortEn]
+                    FILTER(langMatches(lang(?SortEn), 'en'))}}""".format(language)
+            group = "GROUP BY ?Subject ?Id ?Type"
+            order = "LCASE(?SortTerm)"
+        else:
+            sort_select = ""
+            sort_pattern = ""
+            group = ""
+            order = "STR(?Id)"
+        return """SELECT ?Subject ?Term ?Type ?Id (lang(?Term) as ?Lang) {{
+                {{
+                SELECT ?Subject ?Id ?Type {} {{
+                {}
+                {}
+                FILTER({})
+                }} {} ORDER BY {}({}) LIMIT {}
+                }}
+                {}
+                }}""".format(
+                    sort_select, pattern, sort_pattern, type_values,
+                    group, direction, order, limit, label_pattern)
+
+    def _sort(self, items, sort, language='en', reverse=False, limit=None):
+        """ Sort a list of results on `id`, `label` or `sortlabel`.
+
+        Labels are compared with :func:`skosprovider_getty.utils.collation_key`
+        so accents and case do not disturb the ordering. When a `limit` is
+        given, only the first `limit` items are selected with a heap instead
+        of sorting the entire list.
+        """
         if sort is None:
             sort = 'id'
-        if sort == 'sortlabel':
-            sort = 'label'
-        items.sort(key=lambda item: item[sort], reverse=reverse)
-        return items
+        if sort in ('label', 'sortlabel'):
+            def key(item):
+                return collation_key(item['label'])
+        else:
+            key = itemgetter(sort)
+        with tracing.span('sort', items=len(items)):
+            if limit is not None and limit < len(items):
+                if reverse:
+                    return heapq.nlargest(limit, items, key=key)
+                return heapq.nsmallest(limit, items, key=key)
+            items.sort(key=key, reverse=reverse)
+            return items
 
 
 class AATProvider(GettyProvider):
@@ -474,6 +1463,44 @@ class TGNProvider(GettyProvider):
             **kwargs
         )
 
+    def _get_spatial_index(self):
+        if self.spatial_index is None:
+            raise ValueError('The provider has no spatial_index')
+        return self.spatial_index
+
+    def find_within(self, bbox, **kwargs):
+        """ Find the places within a bounding box.
+
+        The places are read from the
+        :class:`skosprovider_getty.indexes.SpatialIndex` of the provider, no
+        request is sent to the Getty services.
+
+        :param bbox: A tuple `(west, south, east, north)` in degrees.
+        :returns: A :class:`lst` of concepts, in the same shape as :meth:`find`.
+            Supports the `language`, `sort`, `sort_order` and `limit` keywords.
+        """
+        language = self._get_language(**kwargs)
+        ret = self._get_spatial_index().find_within(bbox, language, self.metadata['default_language'])
+        sort_order = self._get_sort_order(**kwargs)
+        return self._sort(ret, self._get_sort(**kwargs), language, sort_order == 'desc', self._get_limit(**kwargs))
+
+    def find_nearest(self, lat, lon, k=10, **kwargs):
+        """ Find the places nearest to a point.
+
+        The places are read from the
+        :class:`skosprovider_getty.indexes.SpatialIndex` of the provider, no
+        request is sent to the Getty services.
+
+        :param float lat: Latitude in degrees.
+        :param float lon: Longitude in degrees.
+        :param int k: Number of places to return.
+        :returns: A :class:`lst` of concepts, in the same shape as :meth:`find`,
+            with an extra `distance` in kilometres. The nearest place comes
+            first.
+        """
+        return self._get_spatial_index().find_nearest(
+            lat, lon, k, self._get_language(**kwargs), self.metadata['default_language'])
+
 
 class ULANProvider(GettyProvider):
     """ Union List of Artist Names
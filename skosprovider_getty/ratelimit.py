@@ -0,0 +1,170 @@
+'''
+This module contains a rate controller that paces the requests to the Getty
+services to what they can sustain.
+
+.. code-block:: python
+
+    controller = AdaptiveRateController()
+    aat = AATProvider({'id': 'AAT'}, rate_controller=controller)
+    tgn = TGNProvider({'id': 'TGN'}, rate_controller=controller)
+
+The controller combines a token bucket, that limits the number of requests
+per second, with a limit on the number of requests running at the same
+time. Both limits grow additively while the Getty services answer quickly
+and are halved when they answer with `429 Too Many Requests` or
+`503 Service Unavailable`, fail to answer or answer much slower than usual
+(AIMD). Throttled requests are retried after a pause.
+'''
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+#: Status codes the Getty services use to ask clients to slow down.
+THROTTLED_STATUS_CODES = (429, 503)
+
+
+class AdaptiveRateController:
+    '''
+    Controls the pace and concurrency of requests, adapting both to the
+    responses. Share one controller between all providers of a process.
+
+    :param float rate: Initial number of requests per second.
+    :param float min_rate: Lowest number of requests per second.
+    :param float max_rate: Highest number of requests per second.
+    :param int concurrency: Initial number of requests at the same time.
+    :param int max_concurrency: Highest number of requests at the same time.
+    :param float backoff: Factor the limits are multiplied with when the
+        services are overloaded.
+    :param float latency_factor: A response that takes this many times
+        longer than the average response is a latency spike.
+    :param float min_spike: Responses faster than this number of seconds
+        are never a latency spike.
+    :param int max_retries: Number of times a throttled request is retried.
+    :param float retry_delay: Seconds to wait before retrying a throttled
+        request, doubled on every retry, unless the response has a
+        `Retry-After` header.
+    '''
+
+    def __init__(self, rate=5.0, min_rate=0.5, max_rate=50.0, concurrency=4, max_concurrency=16,
+                 backoff=0.5, latency_factor=4.0, min_spike=1.0, max_retries=3, retry_delay=1.0):
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError('rate: should be between min_rate and max_rate')
+        if not 1 <= concurrency <= max_concurrency:
+            raise ValueError('concurrency: should be between 1 and max_concurrency')
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.min_spike = min_spike
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        #: Moving average of the latency of successful requests, in seconds.
+        self.latency = None
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._active = 0
+        self._last_backoff = None
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        # Allow a burst of at most one second of requests.
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        '''
+        Wait until a request may be sent.
+        '''
+        with self._condition:
+            while True:
+                self._refill(time.monotonic())
+                if self._active >= int(self.concurrency):
+                    self._condition.wait()
+                elif self._tokens < 1:
+                    self._condition.wait((1 - self._tokens) / self.rate)
+                else:
+                    self._tokens -= 1
+                    self._active += 1
+                    return
+
+    def release(self, status_code=None, latency=None):
+        '''
+        Report the outcome of a request sent after :meth:`acquire`.
+
+        :param int status_code: Status code of the response, `None` if the
+            request failed without a response.
+        :param float latency: Number of seconds the request took.
+        '''
+        with self._condition:
+            self._active -= 1
+            if status_code is None or status_code in THROTTLED_STATUS_CODES:
+                self._back_off('status %s' % status_code)
+            elif self.latency is not None and latency is not None \
+                    and latency > max(self.min_spike, self.latency_factor * self.latency):
+                self._back_off('latency %.1fs' % latency)
+            elif status_code < 500:
+                self._ramp_up(latency)
+            self._condition.notify_all()
+
+    def _back_off(self, reason):
+        now = time.monotonic()
+        # Requests that fail together are a single signal.
+        if self._last_backoff is not None and now - self._last_backoff < max(1.0, self.latency or 0):
+            return
+        self._last_backoff = now
+        self.concurrency = max(1.0, self.concurrency * self.backoff)
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        log.info('Getty services overloaded (%s), slowing down to %.1f requests/s and %d at a time.',
+                 reason, self.rate, int(self.concurrency))
+
+    def _ramp_up(self, latency):
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        # Grows with about one request per second and one concurrent
+        # request per round of requests.
+        self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _retry_after(self, res, attempt):
+        try:
+            return min(float(res.headers['Retry-After']), 60.0)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return self.retry_delay * 2 ** attempt
+
+    def send(self, request):
+        '''
+        Send a request under control of the rate controller, retrying it
+        while it is throttled.
+
+        :param request: A callable without arguments that sends the request
+            and returns a :class:`requests.Response`.
+        :returns: The last response.
+        '''
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            try:
+                res = request()
+            except Exception:
+                self.release(None, time.monotonic() - start)
+                raise
+            self.release(res.status_code, time.monotonic() - start)
+            if res.status_code not in THROTTLED_STATUS_CODES or attempt == self.max_retries:
+                return res
+            delay = self._retry_after(res, attempt)
+            log.debug('Request throttled with status %s, retrying in %.1fs.', res.status_code, delay)
+            # Hand the connection of a streamed response back to the pool.
+            res.close()
+            time.sleep(delay)
+
+    @property
+    def active(self):
+        '''
+        Number of requests running at the moment.
+        '''
+        return self._active
@@ -0,0 +1,102 @@
+'''
+This module contains a resolver for batches of Getty :term:`URI` that can
+belong to any of the Getty vocabularies.
+
+.. code-block:: python
+
+    resolver = GettyResolver()
+    things = resolver.resolve([
+        'http://vocab.getty.edu/aat/300007466',
+        'https://vocab.getty.edu/tgn/7000084-place',
+        'http://vocab.getty.edu/ulan/500115493-agent/',
+    ])
+'''
+import logging
+
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.providers import TGNProvider
+from skosprovider_getty.providers import ULANProvider
+from skosprovider_getty.utils import normalise_uri
+from skosprovider_getty.utils import uri_to_id
+from skosprovider_getty.utils import uri_to_vocab_id
+
+log = logging.getLogger(__name__)
+
+
+class GettyResolver:
+    '''
+    Routes Getty URIs to the provider of their vocabulary and resolves them
+    in batches.
+
+    :param providers: Optional. A list of
+        :class:`skosprovider_getty.providers.GettyProvider`, at most one per
+        vocabulary. By default an AAT, TGN and ULAN provider are created
+        with the keyword arguments passed to the resolver, eg. a `session`
+        or an `object_cache`.
+    '''
+
+    def __init__(self, providers=None, **kwargs):
+        if providers is None:
+            providers = [
+                AATProvider({'id': 'AAT'}, **kwargs),
+                TGNProvider({'id': 'TGN'}, **kwargs),
+                ULANProvider({'id': 'ULAN'}, **kwargs),
+            ]
+        self.providers = {provider.vocab_id: provider for provider in providers}
+
+    def route(self, uris):
+        '''
+        Group a batch of URIs per vocabulary.
+
+        :param uris: An iterable of :term:`URI`.
+        :returns: A tuple of a :class:`dict` mapping every vocabulary id to
+            a list of unique ids and a :class:`dict` mapping every URI to a
+            tuple of its vocabulary and id, or `None` if the URI does not
+            belong to a vocabulary of this resolver.
+        '''
+        groups = {}
+        routes = {}
+        for uri in uris:
+            if uri in routes:
+                continue
+            normalised = normalise_uri(uri)
+            vocab_id = uri_to_vocab_id(normalised) if normalised else None
+            if vocab_id in self.providers:
+                id = uri_to_id(normalised)
+            else:
+                # Providers with a custom base_url
+                for vocab_id, provider in self.providers.items():
+                    id = provider.id_from_uri(uri)
+                    if id is not None:
+                        break
+                else:
+                    log.debug('Not a Getty URI we can resolve: %s', uri)
+                    routes[uri] = None
+                    continue
+            routes[uri] = (vocab_id, id)
+            groups.setdefault(vocab_id, {})[id] = None
+        return {vocab_id: list(ids) for vocab_id, ids in groups.items()}, routes
+
+    def resolve(self, uris):
+        '''
+        Resolve a batch of URIs.
+
+        Every vocabulary in the batch is resolved with
+        :meth:`skosprovider_getty.providers.GettyProvider.get_by_ids`, so
+        duplicates and variants of the same URI are only fetched once.
+
+        :param uris: An iterable of :term:`URI`.
+        :returns: A :class:`dict` mapping every URI to the corresponding
+            :class:`skosprovider.skos.Concept` or
+            :class:`skosprovider.skos.Collection`, `False` if it does not
+            exist or `None` if it is not a Getty URI.
+        '''
+        groups, routes = self.route(uris)
+        things = {
+            vocab_id: self.providers[vocab_id].get_by_ids(ids)
+            for vocab_id, ids in groups.items()
+        }
+        return {
+            uri: things[route[0]][route[1]] if route is not None else None
+            for uri, route in routes.items()
+        }
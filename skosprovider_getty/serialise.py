@@ -0,0 +1,261 @@
+'''
+This module converts :class:`skosprovider.skos.Concept` and
+:class:`skosprovider.skos.Collection` objects to and from a compact
+representation, so built objects can be kept in a
+:mod:`skosprovider_getty.cache` backend and shared between processes.
+
+Two representations are available. :func:`thing_to_dict` produces JSON
+friendly dicts, where labels, notes and sources are stored as lists instead
+of objects and empty fields are left out. :func:`encode_thing` produces a
+versioned binary format that is smaller and faster to load:
+
+* The magic bytes `SGC` and a version byte.
+* The number of strings, the number of integers and the number of bytes the
+  integers take, as unsigned LEB128 varints.
+* The integers, as varints. They start with the length of every string, in
+  characters, followed by the structure of the concept or collection, where
+  every string is referred to by its position in the string table plus one,
+  zero meaning `None`.
+* All strings, concatenated and encoded in UTF-8.
+
+Every distinct string is stored once, so label types, languages and ids only
+take a byte or two when repeated. The concept scheme is never stored, it is
+passed again when loading.
+'''
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import Label
+from skosprovider.skos import Note
+from skosprovider.skos import Source
+
+CONCEPT_FIELDS = ('broader', 'narrower', 'related', 'member_of', 'subordinate_arrays')
+COLLECTION_FIELDS = ('members', 'member_of', 'superordinates')
+
+CODEC_MAGIC = b'SGC'
+CODEC_VERSION = 1
+
+
+def thing_to_dict(thing):
+    '''
+    Convert a concept or collection to a dict that can be dumped as JSON.
+
+    :param thing: A :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection`.
+    :rtype: dict
+    '''
+    data = {'type': thing.type, 'id': thing.id, 'uri': thing.uri}
+    if thing.labels:
+        data['labels'] = [[label.label, label.type, label.language] for label in thing.labels]
+    if thing.notes:
+        data['notes'] = [
+            [note.note, note.type, note.language, note.markup] for note in thing.notes
+        ]
+    if thing.sources:
+        data['sources'] = [[source.citation, source.markup] for source in thing.sources]
+    fields = CONCEPT_FIELDS if thing.type == 'concept' else COLLECTION_FIELDS
+    for field in fields:
+        value = getattr(thing, field)
+        if value:
+            data[field] = list(value)
+    if thing.type == 'concept':
+        matches = {type: list(uris) for type, uris in thing.matches.items() if uris}
+        if matches:
+            data['matches'] = matches
+    return data
+
+
+def thing_from_dict(data, concept_scheme=None):
+    '''
+    Convert a dict made by :func:`thing_to_dict` back to a concept or
+    collection.
+
+    :param dict data: The dict.
+    :param concept_scheme: Optional. The
+        :class:`skosprovider.skos.ConceptScheme` of the concept or collection.
+    '''
+    kwargs = {
+        'uri': data['uri'],
+        'concept_scheme': concept_scheme,
+        'labels': [Label(*label) for label in data.get('labels', [])],
+        'notes': [Note(*note) for note in data.get('notes', [])],
+        'sources': [Source(*source) for source in data.get('sources', [])],
+    }
+    if data['type'] == 'concept':
+        for field in CONCEPT_FIELDS:
+            kwargs[field] = data.get(field, [])
+        kwargs['matches'] = data.get('matches', {})
+        return Concept(data['id'], **kwargs)
+    for field in COLLECTION_FIELDS:
+        kwargs[field] = data.get(field, [])
+    return Collection(data['id'], **kwargs)
+
+
+def _varints(values):
+    if not values or max(values) < 0x80:
+        return bytes(values)
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _read_varints(data, pos, count):
+    values = []
+    for i in range(count):
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append(value)
+    return values, pos
+
+
+def encode_thing(thing):
+    '''
+    Encode a concept or collection in the binary format.
+
+    :param thing: A :class:`skosprovider.skos.Concept` or
+        :class:`skosprovider.skos.Collection`.
+    :rtype: bytes
+    '''
+    strings = {}
+    ints = []
+
+    def ref(value):
+        if value is None:
+            return 0
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings) + 1
+        return index
+
+    def refs(values):
+        ints.append(len(values))
+        ints.extend(ref(value) for value in values)
+
+    is_concept = thing.type == 'concept'
+    ints += [0 if is_concept else 1, ref(thing.id), ref(thing.uri), len(thing.labels)]
+    for label in thing.labels:
+        ints += [ref(label.label), ref(label.type), ref(label.language)]
+    ints.append(len(thing.notes))
+    for note in thing.notes:
+        ints += [ref(note.note), ref(note.type), ref(note.language), ref(note.markup)]
+    ints.append(len(thing.sources))
+    for source in thing.sources:
+        ints += [ref(source.citation), ref(source.markup)]
+    for field in CONCEPT_FIELDS if is_concept else COLLECTION_FIELDS:
+        refs(getattr(thing, field) or [])
+    if is_concept:
+        matches = [(type, uris) for type, uris in thing.matches.items() if uris]
+        ints.append(len(matches))
+        for type, uris in matches:
+            ints.append(ref(type))
+            refs(uris)
+    ints = [len(string) for string in strings] + ints
+    body = _varints(ints)
+    return b''.join((
+        CODEC_MAGIC,
+        bytes((CODEC_VERSION,)),
+        _varints([len(strings), len(ints), len(body)]),
+        body,
+        ''.join(strings).encode('utf-8', 'surrogatepass')
+    ))
+
+
+def _restore(cls, **attributes):
+    # The language tags and markup were validated when the label, note or
+    # source was built. Validating language tags again takes most of the
+    # time of decoding.
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attributes)
+    return obj
+
+
+def decode_thing(data, concept_scheme=None):
+    '''
+    Decode a concept or collection encoded with :func:`encode_thing`.
+
+    :param bytes data: The encoded concept or collection.
+    :param concept_scheme: Optional. The
+        :class:`skosprovider.skos.ConceptScheme` of the concept or collection.
+    :raises ValueError: If the data is not in a known version of the format.
+    '''
+    if data[:3] != CODEC_MAGIC:
+        raise ValueError('Not an encoded concept or collection.')
+    if data[3] != CODEC_VERSION:
+        raise ValueError('Unsupported version of the binary format: %d' % data[3])
+    (string_count, int_count, body_size), pos = _read_varints(data, 4, 3)
+    if body_size == int_count:
+        ints = data[pos:pos + body_size]
+    else:
+        ints = _read_varints(data, pos, int_count)[0]
+    pos += body_size
+    text = data[pos:].decode('utf-8', 'surrogatepass')
+    strings = [None]
+    offset = 0
+    for length in ints[:string_count]:
+        strings.append(text[offset:offset + length])
+        offset += length
+    values = iter(ints[string_count:])
+
+    def take(count):
+        return [strings[next(values)] for i in range(count)]
+
+    def label():
+        label, type, language = take(3)
+        return _restore(Label, label=label, type=type, language=language)
+
+    def note():
+        note, type, language, markup = take(4)
+        return _restore(Note, note=note, type=type, language=language, markup=markup)
+
+    def source():
+        citation, markup = take(2)
+        return _restore(Source, citation=citation, markup=markup)
+
+    is_concept = next(values) == 0
+    id, uri = take(2)
+    kwargs = {
+        'uri': uri,
+        'concept_scheme': concept_scheme,
+        'labels': [label() for i in range(next(values))],
+        'notes': [note() for i in range(next(values))],
+        'sources': [source() for i in range(next(values))],
+    }
+    for field in CONCEPT_FIELDS if is_concept else COLLECTION_FIELDS:
+        kwargs[field] = take(next(values))
+    if not is_concept:
+        return Collection(id, **kwargs)
+    matches = {}
+    for i in range(next(values)):
+        type = strings[next(values)]
+        matches[type] = take(next(values))
+    kwargs['matches'] = matches
+    return Concept(id, **kwargs)
+
+
+def dump_thing(thing):
+    '''
+    Serialise a concept or collection, with :func:`encode_thing`.
+
+    :rtype: bytes
+    '''
+    return encode_thing(thing)
+
+
+def load_thing(data, concept_scheme=None):
+    '''
+    Load a concept or collection serialised with :func:`dump_thing`.
+
+    :param bytes data: The serialised concept or collection.
+    :param concept_scheme: Optional. The
+        :class:`skosprovider.skos.ConceptScheme` of the concept or collection.
+    '''
+    return decode_thing(data, concept_scheme)
@@ -0,0 +1,203 @@
+'''
+This module traces where the time of a call to a provider goes.
+
+Every traced call of a provider, eg. :meth:`~skosprovider_getty.providers.GettyProvider.find`,
+is split in stages:
+
+* `build_query`: building the SPARQL query.
+* `http`: waiting for the Getty services.
+* `parse`: decoding the JSON or RDF answer and reading the results from it.
+* `things_from_graph`: building concepts and collections from a graph.
+* `get_super_ordinates`: looking up the superordinates of collections.
+* `sort`: sorting the results.
+
+The stages can be reported as spans to an `OpenTelemetry
+<https://opentelemetry.io/>`_ tracer, or any object with a compatible
+`start_as_current_span` method. Calls that take longer than a threshold are
+logged to the `skosprovider_getty.slow_queries` logger, with the SPARQL
+queries, the number of bindings and the time spent in every stage.
+
+.. code-block:: python
+
+    from opentelemetry import trace
+
+    aat = AATProvider(
+        {'id': 'AAT'},
+        tracer=trace.get_tracer('skosprovider_getty'),
+        slow_query_threshold=2.0
+    )
+'''
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from skosprovider_getty.cache import normalise_query
+
+slow_query_log = logging.getLogger('skosprovider_getty.slow_queries')
+
+STAGES = ('build_query', 'http', 'parse', 'things_from_graph', 'get_super_ordinates', 'sort')
+
+SPAN_PREFIX = 'skosprovider_getty.'
+
+_current = contextvars.ContextVar('skosprovider_getty_trace', default=None)
+
+
+class Trace:
+    '''
+    The stages of a single traced call.
+
+    The time of a stage does not include the stages nested in it, so the
+    time spent waiting for the Getty services while building a collection
+    counts as `http` and not as `things_from_graph`.
+
+    :param str name: Name of the traced method.
+    :param tracer: Optional. An OpenTelemetry compatible tracer.
+    '''
+
+    def __init__(self, name, tracer=None):
+        self.name = name
+        self.tracer = tracer
+        #: Maps the name of every stage to the number of seconds spent in it.
+        self.stages = {}
+        #: The normalised SPARQL queries that were sent.
+        self.queries = []
+        #: The number of bindings in the answers to the queries.
+        self.bindings = 0
+        #: The number of seconds the call took.
+        self.duration = None
+        self._nested = []
+
+    def _enter(self):
+        self._nested.append(0.0)
+
+    def _exit(self, stage, elapsed):
+        nested = self._nested.pop()
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed - nested
+        if self._nested:
+            self._nested[-1] += elapsed
+
+    def breakdown(self):
+        '''
+        Describe the time spent in every stage, eg.
+        `http=3.812s parse=0.120s sort=0.002s other=0.010s`.
+
+        :rtype: str
+        '''
+        stages = sorted(self.stages, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+        parts = ['%s=%.3fs' % (stage, self.stages[stage]) for stage in stages]
+        if self.duration is not None:
+            parts.append('other=%.3fs' % max(0.0, self.duration - sum(self.stages.values())))
+        return ' '.join(parts)
+
+
+class Tracing:
+    '''
+    Traces the calls of a provider.
+
+    :param tracer: Optional. An OpenTelemetry tracer, eg.
+        `opentelemetry.trace.get_tracer('skosprovider_getty')`, or any
+        object with a `start_as_current_span(name, attributes=None)` method
+        returning a context manager.
+    :param float slow_query_threshold: Optional. Calls that take at least
+        this number of seconds are logged to the
+        `skosprovider_getty.slow_queries` logger.
+    '''
+
+    def __init__(self, tracer=None, slow_query_threshold=None):
+        self.tracer = tracer
+        self.slow_query_threshold = slow_query_threshold
+
+    @property
+    def enabled(self):
+        return self.tracer is not None or self.slow_query_threshold is not None
+
+    @contextmanager
+    def trace(self, name):
+        '''
+        Trace a call. Calls made while another call is traced are traced as
+        part of it.
+
+        :param str name: Name of the traced method.
+        :returns: The :class:`Trace`, or `None` if nothing is traced.
+        '''
+        if not self.enabled or _current.get() is not None:
+            yield _current.get()
+            return
+        trace = Trace(name, self.tracer)
+        token = _current.set(trace)
+        start = time.perf_counter()
+        try:
+            if self.tracer is None:
+                yield trace
+            else:
+                with self.tracer.start_as_current_span(SPAN_PREFIX + name):
+                    yield trace
+        finally:
+            trace.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._log_slow(trace)
+
+    def _log_slow(self, trace):
+        if self.slow_query_threshold is None or trace.duration < self.slow_query_threshold:
+            return
+        slow_query_log.warning(
+            'Slow %s took %.3fs (%s), %d bindings: %s',
+            trace.name, trace.duration, trace.breakdown(), trace.bindings,
+            ' | '.join(trace.queries) or '-',
+            extra={'trace': trace}
+        )
+
+
+@contextmanager
+def span(stage, **attributes):
+    '''
+    Trace a stage of the call that is being traced. Does nothing when no
+    call is being traced.
+
+    :param str stage: Name of the stage, eg. `http`.
+    :param attributes: Attributes to add to the span.
+    '''
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    trace._enter()
+    start = time.perf_counter()
+    try:
+        if trace.tracer is None:
+            yield
+        else:
+            with trace.tracer.start_as_current_span(SPAN_PREFIX + stage, attributes=attributes or None):
+                yield
+    finally:
+        trace._exit(stage, time.perf_counter() - start)
+
+
+def record(query=None, bindings=0):
+    '''
+    Record a SPARQL query or the number of bindings in its answer in the
+    call that is being traced.
+
+    :param str query: Optional. The SPARQL query.
+    :param int bindings: Optional. The number of bindings in the answer.
+    '''
+    trace = _current.get()
+    if trace is None:
+        return
+    if query is not None:
+        trace.queries.append(normalise_query(query))
+    trace.bindings += bindings
+
+
+def traced(method):
+    '''
+    Decorate a provider method, so its calls are traced by the
+    :class:`Tracing` of the provider.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.tracing.trace(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,128 @@
+'''
+This module contains the transport every request to the Getty services goes
+through. It keeps a pool of connections per host alive between requests and
+asks for compressed responses.
+
+All providers that are not given a `session` share the default transport of
+the process, see :func:`get_default_transport`. Pass a :class:`Transport` to
+tune the pools:
+
+.. code-block:: python
+
+    transport = Transport(pool_maxsize=20, timeout=(5, 60))
+    aat = AATProvider({'id': 'AAT'}, session=transport)
+    tgn = TGNProvider({'id': 'TGN'}, session=transport)
+'''
+import threading
+
+
+class Transport:
+    '''
+    A pooled HTTP transport, built on a :class:`requests.Session`. It can
+    be used anywhere a session is expected.
+
+    The session is created on first use, so creating a transport does not
+    import :mod:`requests`.
+
+    :param int pool_connections: Number of hosts a pool of connections is
+        kept for.
+    :param int pool_maxsize: Number of connections kept alive per host.
+        Raise it when sending many requests at the same time.
+    :param bool pool_block: Wait for a free connection when all
+        connections to a host are in use, instead of opening an extra one
+        that is not kept.
+    :param int max_retries: Number of times a failed connection is retried.
+    :param timeout: Optional. Default timeout of a request, in seconds, or a
+        `(connect, read)` tuple.
+    :param bool keep_alive: Keep connections open between requests.
+    :param bool compression: Ask for gzip or deflate (and brotli, if
+        supported) compressed responses.
+    :param dict headers: Optional. Extra headers sent with every request.
+    '''
+
+    def __init__(self, pool_connections=4, pool_maxsize=10, pool_block=False, max_retries=0,
+                 timeout=None, keep_alive=True, compression=True, headers=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.compression = compression
+        self.headers = headers or {}
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        '''
+        The :class:`requests.Session` requests are sent with.
+        '''
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=self.max_retries
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = ACCEPT_ENCODING if self.compression else 'identity'
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        session.headers.update(self.headers)
+        return session
+
+    def get(self, url, **kwargs):
+        '''
+        Send a GET request.
+
+        :param str url: The URL to request.
+        :param kwargs: Passed on to :meth:`requests.Session.get`.
+        :rtype: requests.Response
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        '''
+        Close all pooled connections. The transport can still be used
+        afterwards, new connections are opened as needed.
+        '''
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport():
+    '''
+    Get the :class:`Transport` shared by all providers and functions in this
+    process that were not given a session.
+    '''
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
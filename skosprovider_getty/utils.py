@@ -1,18 +1,16 @@
 '''
 This module contains utility functions for :mod:`skosprovider_getty`.
+
+:mod:`rdflib` and :mod:`requests` take long to import, they are only imported
+when they are first needed. This keeps importing the providers fast for
+tools that never send a request or parse a graph.
 '''
+import functools
+import io
 import logging
+import re
+import unicodedata
 
-import rdflib
-import requests
-from rdflib.graph import Graph
-from rdflib.namespace import DC
-from rdflib.namespace import RDF
-from rdflib.namespace import RDFS
-from rdflib.namespace import SKOS
-from rdflib.term import URIRef
-from requests.exceptions import ConnectionError
-from requests.exceptions import Timeout
 from skosprovider.exceptions import ProviderUnavailableException
 from skosprovider.skos import Collection
 from skosprovider.skos import Concept
@@ -20,12 +18,39 @@ from skosprovider.skos import ConceptScheme
 from skosprovider.skos import Label
 from skosprovider.skos import Note
 
+from skosprovider_getty import tracing
+from skosprovider_getty.transport import get_default_transport
+
 log = logging.getLogger(__name__)
 
 
-PROV = rdflib.Namespace('http://www.w3.org/ns/prov#')
-ISO = rdflib.Namespace('http://purl.org/iso25964/skos-thes#')
-GVP = rdflib.Namespace('http://vocab.getty.edu/ontology#')
+#: The namespaces available as `PROV`, `ISO` and `GVP`. The
+#: :class:`rdflib.namespace.Namespace` objects are created on first use.
+NAMESPACES = {
+    'PROV': 'http://www.w3.org/ns/prov#',
+    'ISO': 'http://purl.org/iso25964/skos-thes#',
+    'GVP': 'http://vocab.getty.edu/ontology#',
+}
+
+GETTY_URI = re.compile(
+    r'^https?://vocab\.getty\.edu/(?P<vocab>aat|tgn|ulan)/(?P<id>[^/#?]+?)(?:-place|-agent)?/*$'
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _namespace(name):
+    from rdflib.namespace import Namespace
+    return Namespace(NAMESPACES[name])
+
+
+def __getattr__(name):
+    if name in NAMESPACES:
+        return _namespace(name)
+    if name in ('DC', 'RDF', 'RDFS', 'SKOS'):
+        # Still available from this module, as before rdflib was imported lazily.
+        from rdflib import namespace
+        return getattr(namespace, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def conceptscheme_from_uri(conceptscheme_uri, **kwargs):
@@ -35,12 +60,15 @@ def conceptscheme_from_uri(conceptscheme_uri, **kwargs):
     :param string conceptscheme_uri: URI of the conceptscheme.
     :rtype: skosprovider.skos.ConceptScheme
     '''
+    from rdflib.namespace import RDFS
+    from rdflib.term import URIRef
 
     # get the conceptscheme
     # ensure it only ends in one slash
     conceptscheme_uri = conceptscheme_uri.strip('/') + '/'
-    s = kwargs.get('session', requests.Session())
-    graph = uri_to_graph('%s.rdf' % (conceptscheme_uri), session=s)
+    s = kwargs.get('session', None) or get_default_transport()
+    graph = uri_to_graph(
+        '%s.rdf' % (conceptscheme_uri), session=s, rate_controller=kwargs.get('rate_controller', None))
 
     notes = []
     labels = []
@@ -58,7 +86,34 @@ def conceptscheme_from_uri(conceptscheme_uri, **kwargs):
 
 
 def things_from_graph(graph, subclasses, conceptscheme, **kwargs):
-    s = kwargs.get('session', requests.Session())
+    '''
+    Build :class:`skosprovider.skos.Concept` and
+    :class:`skosprovider.skos.Collection` instances from a graph.
+
+    :param rdflib.Graph graph: The graph to read.
+    :param SubClassCollector subclasses: Knows the subclasses of
+        `skos:Concept` and `skos:Collection`.
+    :param skosprovider.skos.ConceptScheme conceptscheme: The conceptscheme
+        the concepts and collections belong to.
+    :param boolean change_notes: Optional. Include the revision history as
+        `changeNote` notes. Defaults to `False`.
+    :param rate_controller: Optional. A
+        :class:`skosprovider_getty.ratelimit.AdaptiveRateController` for the
+        queries needed to find the superordinates of collections.
+    :rtype: list
+    '''
+    with tracing.span('things_from_graph'):
+        return _things_from_graph(graph, subclasses, conceptscheme, **kwargs)
+
+
+def _things_from_graph(graph, subclasses, conceptscheme, **kwargs):
+    from rdflib.graph import Graph
+    from rdflib.namespace import RDF
+    from rdflib.namespace import SKOS
+
+    ISO = _namespace('ISO')
+    s = kwargs.get('session', None) or get_default_transport()
+    change_notes = kwargs.get('change_notes', False)
     valid_label_types = Label.valid_types[:]
     valid_label_types.remove('sortLabel')
     graph = graph
@@ -79,7 +134,8 @@ def things_from_graph(graph, subclasses, conceptscheme, **kwargs):
             uri=uri,
             concept_scheme=conceptscheme,
             labels=_create_from_subject_typelist(graph, sub, valid_label_types),
-            notes=_create_from_subject_typelist(graph, sub, hierarchy_notetypes(Note.valid_types)),
+            notes=_create_from_subject_typelist(
+                graph, sub, hierarchy_notetypes(Note.valid_types), change_notes),
             sources=[],
             broader=_create_from_subject_predicate(graph, sub, SKOS.broader),
             narrower=_create_from_subject_predicate(graph, sub, SKOS.narrower),
@@ -96,39 +152,46 @@ def things_from_graph(graph, subclasses, conceptscheme, **kwargs):
             uri=uri,
             concept_scheme=conceptscheme,
             labels=_create_from_subject_typelist(graph, sub, valid_label_types),
-            notes=_create_from_subject_typelist(graph, sub, hierarchy_notetypes(Note.valid_types)),
+            notes=_create_from_subject_typelist(
+                graph, sub, hierarchy_notetypes(Note.valid_types), change_notes),
             sources=[],
             members=_create_from_subject_predicate(graph, sub, SKOS.member),
-            superordinates=_get_super_ordinates(conceptscheme, sub, session=s)
+            superordinates=_get_super_ordinates(
+                conceptscheme, sub, session=s, rate_controller=kwargs.get('rate_controller', None))
         )
         clist.append(col)
 
     return clist
 
 
-def _create_from_subject_typelist(graph, subject, typelist):
+def _create_from_subject_typelist(graph, subject, typelist, change_notes=False):
+    from rdflib.namespace import SKOS
+
     list = []
     note_uris = []
     for p in typelist:
         term = SKOS.__getitem__(p)
-        list.extend(_create_from_subject_predicate(graph, subject, term, note_uris))
+        list.extend(_create_from_subject_predicate(graph, subject, term, note_uris, change_notes))
     return list
 
 
 def _get_super_ordinates(conceptscheme, sub, **kwargs):
-    ret = []
-    s = kwargs.get('session', requests.Session())
-    query = """PREFIX ns:<{}>
-    SELECT * WHERE {{?s iso-thes:subordinateArray ns:{}}}""".format(conceptscheme.uri, uri_to_id(sub))
-    url = conceptscheme.uri.strip('/').rsplit('/', 1)[0] + "/sparql.json"
-    res = do_get_request(url, s, params={'query': query})
-    r = res.json()
-    for result in r["results"]["bindings"]:
-        ret.append(uri_to_id(result["s"]["value"]))
-    return ret
-
-
-def _create_from_subject_predicate(graph, subject, predicate, note_uris=None):
+    with tracing.span('get_super_ordinates'):
+        ret = []
+        s = kwargs.get('session', None) or get_default_transport()
+        query = """PREFIX ns:<{}>
+        SELECT * WHERE {{?s iso-thes:subordinateArray ns:{}}}""".format(conceptscheme.uri, uri_to_id(sub))
+        url = conceptscheme.uri.strip('/').rsplit('/', 1)[0] + "/sparql.json"
+        res = do_get_request(url, s, params={'query': query}, rate_controller=kwargs.get('rate_controller', None))
+        with tracing.span('parse'):
+            bindings = res.json()["results"]["bindings"]
+        tracing.record(bindings=len(bindings))
+        for result in bindings:
+            ret.append(uri_to_id(result["s"]["value"]))
+        return ret
+
+
+def _create_from_subject_predicate(graph, subject, predicate, note_uris=None, change_notes=False):
     list = []
     for s, p, o in graph.triples((subject, predicate, None)):
         type = predicate.split('#')[-1]
@@ -137,7 +200,7 @@ def _create_from_subject_predicate(graph, subject, predicate, note_uris=None):
         elif Note.is_valid_type(type):
             if o.toPython() not in note_uris:
                 note_uris.append(o.toPython())
-                o = _create_note(graph, o, type, False)
+                o = _create_note(graph, o, type, change_notes)
             else:
                 o = None
         else:
@@ -160,6 +223,10 @@ def _create_label(literal, type):
 
 
 def _create_note(graph, uri, type, change_notes=False):
+    from rdflib.namespace import DC
+    from rdflib.namespace import RDF
+
+    PROV = _namespace('PROV')
     if not change_notes and '/rev/' in uri:
         return None
     else:
@@ -185,14 +252,24 @@ def _create_note(graph, uri, type, change_notes=False):
 class SubClassCollector:
     '''
     A utility class to collect all the subclasses of a certain Class from an ontology file.
+
+    :param namespace: The namespace of the ontology.
+    :param session: Optional. The :class:`requests.Session` or
+        :class:`skosprovider_getty.transport.Transport` the ontology files
+        are fetched with.
     '''
 
-    def __init__(self, namespace):
+    def __init__(self, namespace, session=None):
         self.ontology_graphs = {}
         self.namespace = namespace
+        self.session = session
         self.init_skos()
 
     def init_skos(self):
+        from rdflib.namespace import SKOS
+
+        ISO = _namespace('ISO')
+        GVP = _namespace('GVP')
         self.subclasses = {}
         self.subclasses[SKOS.Concept] = [
             SKOS.Concept,
@@ -231,32 +308,36 @@ class SubClassCollector:
         :param clazz: An RDF class
         :return: A list of all subclasses, including the original class.
         '''
+        from rdflib.namespace import RDFS
+
         self.subclasses[clazz] = [clazz]
-        if self.namespace not in self.ontology_graphs:
-            try:
-                graph = rdflib.Graph()
-                graph.parse(str(self.namespace), format="application/rdf+xml")
-                self.ontology_graphs[self.namespace] = graph
-            except:  # pragma: no cover # noqa: E722
-                self.ontology_graphs[self.namespace] = None
-        g = self.ontology_graphs[self.namespace]
+        g = self._get_ontology_graph(self.namespace)
         if g is not None:
             for sub, pred, obj in g.triples((None, RDFS.subClassOf, None)):
                 self._is_subclass_of(sub, clazz)
         return self.subclasses[clazz]
 
-    def _is_subclass_of(self, subject, clazz):
-        namespace = subject.split('#')[0] + "#"
-        if subject in self.subclasses[clazz]:
-            return True
+    def _get_ontology_graph(self, namespace):
+        from rdflib.graph import Graph
+
         if namespace not in self.ontology_graphs:
             try:
-                graph = rdflib.Graph()
-                graph.parse(str(namespace), format="application/rdf+xml")
+                res = do_get_request(str(namespace), self.session, headers={'Accept': 'application/rdf+xml'})
+                res.raise_for_status()
+                graph = Graph()
+                graph.parse(data=res.content, format="application/rdf+xml")
                 self.ontology_graphs[namespace] = graph
             except:  # pragma: no cover # noqa: E722
                 self.ontology_graphs[namespace] = None
-        g = self.ontology_graphs[namespace]
+        return self.ontology_graphs[namespace]
+
+    def _is_subclass_of(self, subject, clazz):
+        from rdflib.namespace import RDFS
+
+        namespace = subject.split('#')[0] + "#"
+        if subject in self.subclasses[clazz]:
+            return True
+        g = self._get_ontology_graph(namespace)
         if g is not None:
             for sub, pred, obj in g.triples((subject, RDFS.subClassOf, None)):
                 if obj in self.subclasses[clazz]:
@@ -281,6 +362,38 @@ def hierarchy_notetypes(list):
     return list
 
 
+@functools.lru_cache(maxsize=65536)
+def collation_key(label):
+    '''
+    Get a key to sort labels on, ignoring case and accents.
+
+    The label is decomposed (NFKD), stripped of combining marks and
+    casefolded. The normalised original is used to break ties, so `église`
+    sorts right after `eglise`. Keys are cached, since the same labels
+    tend to be sorted over and over.
+
+    :param string label: The label to get a key for.
+    :rtype: tuple
+    '''
+    decomposed = unicodedata.normalize('NFKD', label)
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return (folded.casefold(), unicodedata.normalize('NFC', label))
+
+
+SPARQL_ESCAPES = {'\\': '\\\\', "'": "\\'", '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+
+def sparql_literal(value):
+    '''
+    Quote a value as a SPARQL string literal, so it can safely be put in a
+    query.
+
+    :param string value: eg. `it's`
+    :returns: eg. `'it\\'s'`
+    '''
+    return "'{}'".format(''.join(SPARQL_ESCAPES.get(c, c) for c in str(value)))
+
+
 def uri_to_id(uri):
     try:
         return uri.strip('/').rsplit('/', 1)[1]
@@ -288,27 +401,172 @@ def uri_to_id(uri):
         return uri
 
 
+def uri_to_vocab_id(uri):
+    '''
+    Get the id of the vocabulary a Getty :term:`URI` belongs to.
+
+    :param string uri: eg. `http://vocab.getty.edu/tgn/7000084`
+    :returns: eg. `tgn`, or `None` if the URI contains no vocabulary.
+    '''
+    parts = uri.strip('/').rsplit('/', 2)
+    if len(parts) < 3:
+        return None
+    return parts[1]
+
+
+def normalise_uri(uri):
+    '''
+    Normalise the variants of a Getty :term:`URI`.
+
+    Both `http` and `https` are accepted, trailing slashes are ignored and
+    the `-place` and `-agent` suffixes of the TGN and ULAN real world
+    things are mapped to the concept that describes them.
+
+    :param string uri: eg. `https://vocab.getty.edu/tgn/7000084-place/`
+    :returns: eg. `http://vocab.getty.edu/tgn/7000084`, or `None` if the URI
+        is not a Getty concept or collection.
+    '''
+    m = GETTY_URI.match(uri.strip())
+    if m is None:
+        return None
+    return 'http://vocab.getty.edu/{}/{}'.format(m.group('vocab'), m.group('id'))
+
+
+class ResponseReader(io.RawIOBase):
+    '''
+    A file-like object that reads the body of a response sent with
+    `stream=True` while it arrives, so it can be parsed without keeping the
+    entire body in memory.
+
+    :param res: A :class:`requests.Response`.
+    :param int chunk_size: Number of bytes to read from the network at once.
+    :param list chunks: Optional. A list every chunk read is appended to, eg.
+        to cache the body once it is parsed.
+    '''
+
+    def __init__(self, res, chunk_size=65536, chunks=None):
+        self._chunks = res.iter_content(chunk_size)
+        self._chunk = memoryview(b'')
+        self.chunks = chunks
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            if self.chunks is not None:
+                self.chunks.append(chunk)
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
 def uri_to_graph(uri, **kwargs):
     '''
     :param string uri: :term:`URI` where the RDF data can be found.
+    :param cache: Optional. A :class:`skosprovider_getty.cache.CacheBackend`
+        that holds the RDF documents that have already been fetched.
+    :param rate_controller: Optional. A
+        :class:`skosprovider_getty.ratelimit.AdaptiveRateController`.
+    :param boolean stream: Optional. Parse the document while it is being
+        received, instead of reading it completely first. Defaults to `False`.
     :rtype: rdflib.Graph or `False` if the URI does not exist
     :raises skosprovider.exceptions.ProviderUnavailableException: if the
         getty.edu services are down
     '''
-    s = kwargs.get('session', requests.Session())
-    graph = rdflib.Graph()
-    res = do_get_request(uri, s)
-    if res.status_code == 404:
-        return False
-    graph.parse(data=res.content, format="application/rdf+xml")
+    from rdflib.graph import Graph
+
+    s = kwargs.get('session', None) or get_default_transport()
+    cache = kwargs.get('cache', None)
+    graph = Graph()
+    content = cache.get(uri) if cache is not None else None
+    if content is None and kwargs.get('stream', False):
+        res = do_get_request(uri, s, rate_controller=kwargs.get('rate_controller', None), stream=True)
+        if res.status_code == 404:
+            res.close()
+            return False
+        chunks = [] if cache is not None else None
+        # The time spent waiting for the rest of the body counts as parsing.
+        with tracing.span('parse', url=uri):
+            stream_to_graph(res, graph, chunks)
+        if cache is not None:
+            cache.set(uri, b''.join(chunks))
+        return graph
+    if content is None:
+        res = do_get_request(uri, s, rate_controller=kwargs.get('rate_controller', None))
+        if res.status_code == 404:
+            return False
+        content = res.content
+        if cache is not None:
+            cache.set(uri, content)
+    with tracing.span('parse', url=uri):
+        graph.parse(data=content, format="application/rdf+xml")
     return graph
 
 
-def do_get_request(url, session=None, headers=None, params=None):
+def stream_to_graph(res, graph=None, chunks=None):
+    '''
+    Parse the RDF/XML body of a response sent with `stream=True` while it
+    is being received. The response is closed afterwards.
+
+    :param res: A :class:`requests.Response`.
+    :param rdflib.Graph graph: Optional. The graph to add the triples to.
+    :param list chunks: Optional. A list the chunks of the body are appended to.
+    :rtype: rdflib.Graph
+    :raises skosprovider.exceptions.ProviderUnavailableException: if the
+        connection breaks before the entire body was received
+    '''
+    from rdflib.graph import Graph
+    from requests.exceptions import RequestException
+
+    if graph is None:
+        graph = Graph()
+    try:
+        graph.parse(source=ResponseReader(res, chunks=chunks), format="application/rdf+xml")
+    except RequestException:
+        raise ProviderUnavailableException(f"Response could not be read completely - Request: {res.url}")
+    finally:
+        res.close()
+    return graph
+
+
+def do_get_request(url, session=None, headers=None, params=None, rate_controller=None, stream=False):
+    '''
+    Send a GET request to the Getty services.
+
+    :param string url: The URL to request.
+    :param session: Optional. The :class:`requests.Session` or
+        :class:`skosprovider_getty.transport.Transport` to use. Defaults to
+        the transport shared by the process.
+    :param rate_controller: Optional. A
+        :class:`skosprovider_getty.ratelimit.AdaptiveRateController` that
+        paces the request and retries it while it is throttled.
+    :param boolean stream: Optional. Return as soon as the headers are
+        received, the body is read while it is used.
+    :raises skosprovider.exceptions.ProviderUnavailableException: if the
+        getty.edu services are down
+    '''
+    from requests.exceptions import ConnectionError
+    from requests.exceptions import Timeout
+
     if not session:
-        session = requests.Session()
+        session = get_default_transport()
+    if params and 'query' in params:
+        tracing.record(query=params['query'])
     try:
-        res = session.get(url, headers=headers, params=params)
+        with tracing.span('http', url=url):
+            request = functools.partial(session.get, url, headers=headers, params=params)
+            if stream:
+                request = functools.partial(request, stream=True)
+            if rate_controller is None:
+                res = request()
+            else:
+                res = rate_controller.send(request)
     except ConnectionError:
         raise ProviderUnavailableException(f"Request could not be executed due to connection issues- Request: {url}")
     except Timeout:  # pragma: no cover
@@ -0,0 +1,177 @@
+'''
+This module contains a command line tool that fills the persistent cache of a
+Getty provider, so the first users after a deploy do not have to wait for
+the Getty services.
+
+.. code-block:: bash
+
+    # Warm up a few concepts
+    $ getty_warmup aat 300007466 300007494 --cache /var/cache/getty.sqlite
+    # Warm up everything under the churches (AAT 300007466)
+    $ getty_warmup aat --expand 300007466 --cache /var/cache/getty.sqlite
+    # Warm up a file with one Getty URI per line
+    $ getty_warmup tgn --uri-file places.txt --cache /var/cache/getty.sqlite
+
+Concepts and collections that are already present in the cache are skipped,
+so an interrupted warm up can simply be started again.
+'''
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from skosprovider.exceptions import ProviderUnavailableException
+
+from skosprovider_getty.cache import SQLiteCache
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.providers import TGNProvider
+from skosprovider_getty.providers import ULANProvider
+from skosprovider_getty.ratelimit import AdaptiveRateController
+
+log = logging.getLogger(__name__)
+
+PROVIDERS = {
+    'aat': AATProvider,
+    'tgn': TGNProvider,
+    'ulan': ULANProvider,
+}
+
+
+def warm_up(provider, ids, concurrency=4, progress=None):
+    '''
+    Fetch concepts and collections so they end up in the cache of a provider.
+
+    The requests are paced by the `rate_controller` of the provider, if it
+    has one.
+
+    :param provider: A :class:`skosprovider_getty.providers.GettyProvider`
+        with a cache.
+    :param ids: An iterable of concept or collection ids.
+    :param int concurrency: Number of concepts to fetch at the same time.
+    :param progress: Optional. A callable that is called with the statistics
+        after every concept.
+    :returns: A dict with the number of concepts that were `fetched`,
+        `skipped` because they were cached already, or `failed`, and the
+        number of `seconds` it took.
+    '''
+    if provider.cache is None:
+        raise ValueError('The provider has no cache to warm up.')
+    stats = {'total': 0, 'fetched': 0, 'skipped': 0, 'failed': 0, 'seconds': 0}
+    start = time.monotonic()
+    todo = []
+    for id in dict.fromkeys(str(id) for id in ids):
+        stats['total'] += 1
+        if provider.get_rdf_url(id) in provider.cache:
+            stats['skipped'] += 1
+        else:
+            todo.append(id)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(provider.get_by_id, id): id for id in todo}
+        try:
+            for future in as_completed(futures):
+                try:
+                    if future.result() is False:
+                        log.warning('%s does not exist.', futures[future])
+                        stats['failed'] += 1
+                    else:
+                        stats['fetched'] += 1
+                except ProviderUnavailableException as e:
+                    log.warning('Could not fetch %s: %s', futures[future], e)
+                    stats['failed'] += 1
+                stats['seconds'] = time.monotonic() - start
+                if progress:
+                    progress(stats)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    stats['seconds'] = time.monotonic() - start
+    return stats
+
+
+def _read_ids(args, provider):
+    ids = list(args.ids)
+    if args.uri_file:
+        with open(args.uri_file) as f:
+            for line in f:
+                uri = line.strip()
+                if not uri:
+                    continue
+                id = provider.id_from_uri(uri)
+                if id is None:
+                    log.warning('Skipping %s, not a URI of %s.', uri, provider.url)
+                else:
+                    ids.append(id)
+    for root in args.expand or []:
+        expanded = provider.expand(root)
+        if expanded is False:
+            log.warning('%s does not exist, nothing to expand.', root)
+        else:
+            ids.extend(expanded)
+    return ids
+
+
+def _format_stats(stats):
+    done = stats['fetched'] + stats['failed']
+    speed = done / stats['seconds'] if stats['seconds'] else 0
+    return '{}/{} fetched, {} skipped, {} failed, {:.1f} concepts/s'.format(
+        done, stats['total'] - stats['skipped'], stats['skipped'], stats['failed'], speed)
+
+
+def _rate_controller(args):
+    if not args.rate:
+        return None
+    concurrency = max(1, args.concurrency)
+    return AdaptiveRateController(
+        rate=args.rate, min_rate=min(0.5, args.rate), max_rate=args.rate,
+        concurrency=concurrency, max_concurrency=concurrency
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='getty_warmup',
+        description='Fill the persistent cache of a Getty provider.'
+    )
+    parser.add_argument('vocabulary', choices=sorted(PROVIDERS))
+    parser.add_argument('ids', nargs='*', help='Ids of concepts or collections.')
+    parser.add_argument('--uri-file', help='A file with one Getty URI per line.')
+    parser.add_argument(
+        '--expand', action='append', metavar='ID',
+        help='Warm up this concept or collection and everything under it.'
+    )
+    parser.add_argument('--cache', required=True, help='Path of the SQLite cache.')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument(
+        '--rate', type=float, default=None,
+        help='Maximum requests per second. The rate is lowered when the Getty services are overloaded.'
+    )
+    parser.add_argument('--report-every', type=int, default=100, metavar='N')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    provider = PROVIDERS[args.vocabulary](
+        {'id': args.vocabulary.upper()},
+        cache=SQLiteCache(args.cache),
+        rate_controller=_rate_controller(args)
+    )
+    ids = _read_ids(args, provider)
+
+    def progress(stats):
+        done = stats['fetched'] + stats['failed']
+        if done % args.report_every == 0:
+            print(_format_stats(stats), file=sys.stderr)
+
+    try:
+        stats = warm_up(provider, ids, args.concurrency, progress)
+    except KeyboardInterrupt:
+        print('Interrupted, run again to resume.', file=sys.stderr)
+        return 130
+    print(_format_stats(stats), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
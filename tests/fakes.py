@@ -0,0 +1,188 @@
+'''
+Test doubles that allow running tests without access to the Getty services.
+'''
+import json
+import socketserver
+import threading
+
+
+class FakeResponse:
+
+    def __init__(self, data=None, status_code=200, content=None, headers=None):
+        self.data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content if content is not None else json.dumps(data).encode('utf-8')
+        self.encoding = 'utf-8'
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    '''
+    Stands in for a :class:`requests.Session` so tests can run without
+    access to the Getty services. Every call to :meth:`get` is answered by
+    the `responder` callable.
+    '''
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.requests = []
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        self.requests.append((url, params))
+        return self.responder(url, params)
+
+
+def sparql_bindings(rows):
+    '''
+    Build a SPARQL JSON answer from a list of
+    `(id, type, label, lang)` or `(id, type, label, lang, vocab)` tuples.
+    '''
+    bindings = []
+    for row in rows:
+        id, type, label, lang = row[:4]
+        vocab = row[4] if len(row) > 4 else 'aat'
+        binding = {
+            'Subject': {'value': 'http://vocab.getty.edu/%s/%s' % (vocab, id)},
+            'Id': {'value': id},
+            'Type': {'value': 'http://www.w3.org/2004/02/skos/core#%s' % type},
+            'Lang': {'value': lang or ''}
+        }
+        if label is not None:
+            binding['Term'] = {'value': label}
+        bindings.append(binding)
+    return {'results': {'bindings': bindings}}
+
+
+def concept_rdf(id, labels=(), broader=(), vocab='aat', extra=''):
+    '''
+    Build an RDF/XML document for a single concept, as served by
+    `http://vocab.getty.edu/{vocab}/{id}.rdf`.
+
+    :param labels: A list of `(label, language)` tuples used as prefLabels.
+    :param extra: RDF/XML to add to the concept.
+    '''
+    body = ''.join(
+        '<skos:prefLabel xml:lang="%s">%s</skos:prefLabel>' % (lang, label)
+        for label, lang in labels
+    )
+    body += ''.join(
+        '<skos:broader rdf:resource="http://vocab.getty.edu/%s/%s"/>' % (vocab, b)
+        for b in broader
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+        'xmlns:skos="http://www.w3.org/2004/02/skos/core#" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:prov="http://www.w3.org/ns/prov#">'
+        '<skos:Concept rdf:about="http://vocab.getty.edu/%s/%s">%s%s</skos:Concept>'
+        '</rdf:RDF>' % (vocab, id, body, extra)
+    ).encode('utf-8')
+
+
+#: Coordinates of Belgium, to pass as `extra` to :func:`concept_rdf`.
+TGN_PLACE = (
+    '<foaf:focus xmlns:foaf="http://xmlns.com/foaf/0.1/">'
+    '<rdf:Description rdf:about="http://vocab.getty.edu/tgn/7000084-place" '
+    'xmlns:wgs="http://www.w3.org/2003/01/geo/wgs84_pos#">'
+    '<wgs:lat rdf:datatype="http://www.w3.org/2001/XMLSchema#decimal">50.833333</wgs:lat>'
+    '<wgs:long rdf:datatype="http://www.w3.org/2001/XMLSchema#decimal">4</wgs:long>'
+    '</rdf:Description></foaf:focus>'
+)
+
+
+def concepts_rdf(concepts, vocab='aat'):
+    '''
+    Build an RDF/XML document for several concepts, as answered by a SPARQL
+    CONSTRUCT query on `http://vocab.getty.edu/sparql.rdf`.
+
+    :param concepts: A list of `(id, label)` tuples, the labels are English
+        prefLabels.
+    '''
+    body = ''.join(
+        '<skos:Concept rdf:about="http://vocab.getty.edu/%s/%s">'
+        '<skos:prefLabel xml:lang="en">%s</skos:prefLabel></skos:Concept>' % (vocab, id, label)
+        for id, label in concepts
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+        'xmlns:skos="http://www.w3.org/2004/02/skos/core#">%s</rdf:RDF>' % body
+    ).encode('utf-8')
+
+
+class FakeRedisServer:
+    '''
+    A stand-in for a Redis server that understands just enough of the Redis
+    protocol for :class:`skosprovider_getty.cache.RedisCache`. Expiry is
+    ignored.
+    '''
+
+    def __init__(self):
+        self.data = {}
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        data = self.data
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                args = []
+                for i in range(int(line[1:-2])):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def bulk(self, value):
+                if value is None:
+                    return b'$-1\r\n'
+                return b'$%d\r\n%s\r\n' % (len(value), value)
+
+            def handle(self):
+                while True:
+                    args = self.read_command()
+                    if args is None:
+                        return
+                    command = args[0].upper()
+                    if command == b'GET':
+                        reply = self.bulk(data.get(args[1]))
+                    elif command == b'SET':
+                        data[args[1]] = args[2]
+                        reply = b'+OK\r\n'
+                    elif command == b'DEL':
+                        count = sum(1 for k in args[1:] if data.pop(k, None) is not None)
+                        reply = b':%d\r\n' % count
+                    elif command == b'SCAN':
+                        prefix = args[3][:-1]
+                        keys = [k for k in data if k.startswith(prefix)]
+                        reply = b'*2\r\n' + self.bulk(b'0') + b'*%d\r\n' % len(keys)
+                        reply += b''.join(self.bulk(k) for k in keys)
+                    elif command == b'SELECT':
+                        reply = b'+OK\r\n'
+                    else:
+                        reply = b'-ERR unknown command\r\n'
+                    self.wfile.write(reply)
+
+        return Handler
@@ -0,0 +1,241 @@
+import multiprocessing
+import threading
+import time
+
+from fakes import FakeRedisServer
+
+from skosprovider_getty.cache import BackgroundRefresher
+from skosprovider_getty.cache import MemoryCache
+from skosprovider_getty.cache import RedisCache
+from skosprovider_getty.cache import SQLiteCache
+from skosprovider_getty.cache import normalise_query
+from skosprovider_getty.cache import query_key
+
+
+class TestMemoryCache:
+
+    def test_get_set(self):
+        cache = MemoryCache()
+        assert cache.get('a') is None
+        cache.set('a', b'1')
+        assert cache.get('a') == b'1'
+        assert 'a' in cache
+        cache.delete('a')
+        assert 'a' not in cache
+
+    def test_evicts_least_recently_used(self):
+        cache = MemoryCache(maxsize=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        cache.get('a')
+        cache.set('c', b'3')
+        assert cache.get('b') is None
+        assert cache.get('a') == b'1'
+        assert len(cache) == 2
+
+    def test_ttl(self):
+        cache = MemoryCache(ttl=60)
+        cache.set('a', b'1')
+        cache.set('b', b'2', ttl=-1)
+        assert cache.get('a') == b'1'
+        assert cache.get('b') is None
+
+
+class TestSQLiteCache:
+
+    def test_persistent(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+        cache = SQLiteCache(path)
+        cache.set('a', b'1')
+        cache.close()
+        cache = SQLiteCache(path)
+        assert cache.get('a') == b'1'
+        assert len(cache) == 1
+        cache.clear()
+        assert cache.get('a') is None
+
+    def test_ttl(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), ttl=-1)
+        cache.set('a', b'1')
+        assert cache.get('a') is None
+        cache.set('a', b'1', ttl=60)
+        assert cache.get('a') == b'1'
+
+
+class TestSQLiteCacheMaxsize:
+
+    def test_maxsize(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), maxsize=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        cache.set('c', b'3')
+        assert len(cache) == 2
+        assert cache.get('a') is None
+        assert cache.get('c') == b'3'
+
+    def test_purge(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / 'cache.sqlite'))
+        cache.set('a', b'1', ttl=-1)
+        cache.set('b', b'2')
+        cache.purge()
+        assert len(cache) == 1
+
+
+def _write_entries(path, worker, count):
+    cache = SQLiteCache(path, wal=True, timeout=30)
+    for i in range(count):
+        cache.set('%s-%s' % (worker, i), b'x' * 100)
+    cache.close()
+
+
+class TestSQLiteCacheShared:
+
+    def test_max_bytes(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), max_bytes=250)
+        cache.set('a', b'1' * 100)
+        cache.set('b', b'2' * 100)
+        cache.set('c', b'3' * 100)
+        assert len(cache) == 2
+        assert cache.get('a') is None
+        assert cache.get('b') is not None
+        assert cache.get('c') is not None
+
+    def test_size(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+        cache = SQLiteCache(path, ttl=60)
+        cache.set('a', b'1' * 100)
+        cache.set('b', b'2' * 100)
+        cache.set('a', b'1' * 10)
+        assert cache.size == 110
+        cache.delete('b')
+        assert cache.size == 10
+        cache.close()
+        assert SQLiteCache(path).size == 10
+        SQLiteCache(path).clear()
+        assert SQLiteCache(path).size == 0
+
+    def test_max_bytes_evicts_in_batches(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), max_bytes=1000)
+        for i in range(11):
+            cache.set(str(i), b'x' * 100)
+        # Room was made for a tenth of max_bytes at once
+        assert len(cache) == 9
+        cache.set('11', b'x' * 100)
+        assert len(cache) == 10
+        assert cache.size == 1000
+
+    def test_concurrent_writers(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+        cache = SQLiteCache(path, wal=True)
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(target=_write_entries, args=(path, worker, 50))
+            for worker in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        assert len(cache) == 200
+        assert cache.get('3-49') == b'x' * 100
+        assert cache._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+class TestRedisCache:
+
+    def setup_method(self, method):
+        self.server = FakeRedisServer()
+
+    def teardown_method(self, method):
+        self.server.close()
+
+    def test_get_set(self):
+        cache = RedisCache(port=self.server.port, ttl=60)
+        assert cache.get('a') is None
+        cache.set('a', b'1')
+        assert cache.get('a') == b'1'
+        assert b'skosprovider_getty:a' in self.server.data
+        cache.delete('a')
+        assert cache.get('a') is None
+        cache.close()
+
+    def test_clear_only_removes_prefixed_keys(self):
+        self.server.data[b'other'] = b'x'
+        cache = RedisCache(port=self.server.port, prefix='test:')
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        cache.clear()
+        assert cache.get('a') is None
+        assert self.server.data == {b'other': b'x'}
+
+    def test_unavailable_is_a_miss(self):
+        port = self.server.port
+        self.server.close()
+        cache = RedisCache(port=port, timeout=0.1)
+        cache.set('a', b'1')
+        assert cache.get('a') is None
+
+
+class TestQueryKey:
+
+    def test_layout_does_not_matter(self):
+        endpoint = 'http://vocab.getty.edu/sparql.json'
+        assert query_key(endpoint, 'SELECT ?s\n  {?s ?p ?o}') == query_key(endpoint, 'SELECT ?s {?s ?p ?o}')
+        assert query_key(endpoint, 'SELECT ?s {?s ?p ?o}', 'nl') != query_key(endpoint, 'SELECT ?s {?s ?p ?o}', 'en')
+
+    def test_literals_are_kept(self):
+        endpoint = 'http://vocab.getty.edu/sparql.json'
+        assert query_key(endpoint, 'SELECT ?s {?s ?p "a  b"}') != query_key(endpoint, 'SELECT ?s {?s ?p "a b"}')
+        assert normalise_query("{?s ?p 'it\\'s  a'}") != normalise_query("{?s ?p 'it\\'s a'}")
+        assert normalise_query('SELECT ?s\n  {?s ?p \'a  b\'.\n ?s ?q """c\n d"""}  ') == \
+            'SELECT ?s {?s ?p \'a  b\'. ?s ?q """c\n d"""}'
+
+
+class TestBackgroundRefresher:
+
+    def test_deduplicates(self):
+        refresher = BackgroundRefresher(max_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+
+        assert refresher.schedule('a', refresh)
+        started.wait(1)
+        assert not refresher.schedule('a', refresh)
+        release.set()
+        refresher.shutdown()
+        assert calls == [1]
+        assert refresher.pending == 0
+
+    def test_max_pending(self):
+        refresher = BackgroundRefresher(max_workers=1, max_pending=1)
+        release = threading.Event()
+        assert refresher.schedule('a', lambda: release.wait(1))
+        assert not refresher.schedule('b', lambda: None)
+        release.set()
+        refresher.shutdown()
+
+    def test_failing_refresh_is_logged(self):
+        refresher = BackgroundRefresher()
+
+        def refresh():
+            raise ValueError()
+
+        refresher.schedule('a', refresh)
+        refresher.shutdown()
+        assert refresher.pending == 0
+
+    def test_entries_know_when_they_were_stored(self, tmp_path):
+        for cache in (MemoryCache(), SQLiteCache(str(tmp_path / 'cache.sqlite'))):
+            before = time.time()
+            cache.set('a', b'1')
+            value, stored = cache.get_entry('a')
+            assert value == b'1'
+            assert before <= stored <= time.time()
+            assert cache.get_entry('b') is None
@@ -0,0 +1,74 @@
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import Label
+from skosprovider.skos import Note
+
+from skosprovider_getty.compact import CompactVocabularyBuilder
+
+
+def _build():
+    builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+    builder.add_all([
+        Concept(
+            '1', labels=[Label('churches', 'prefLabel', 'en'), Label('kerken', 'prefLabel', 'nl'),
+                         Label('kerk', 'altLabel', 'nl')],
+            notes=[Note('Buildings for worship.', 'scopeNote', 'en')],
+            narrower=['2'], subordinate_arrays=['3'], matches={'exact': ['sh85123119']}
+        ),
+        Concept('2', labels=[Label('cathedrals', 'prefLabel', 'en')], broader=['1'], narrower=['4']),
+        Collection('3', labels=[Label('<churches by form>', 'prefLabel', 'en')], members=['5'],
+                   superordinates=['1']),
+        Concept('5', labels=[Label('basilicas', 'prefLabel', 'en')], broader=['1']),
+        False,
+    ])
+    return builder.build()
+
+
+class TestCompactVocabulary:
+
+    def test_lookup(self):
+        vocabulary = _build()
+        assert '1' in vocabulary
+        assert '3' in vocabulary
+        # Only referenced, never added
+        assert '4' not in vocabulary
+        assert 'foo' not in vocabulary
+        assert vocabulary.get_by_id('4') is False
+
+    def test_get_concept(self):
+        concept = _build().get_by_id('1')
+        assert concept.type == 'concept'
+        assert concept.uri == 'http://vocab.getty.edu/aat/1'
+        assert concept.label('nl').label == 'kerken'
+        assert 'kerk' in [label.label for label in concept.labels if label.type == 'altLabel']
+        assert concept.notes[0].note == 'Buildings for worship.'
+        assert concept.notes[0].type == 'scopeNote'
+        assert concept.narrower == ['2']
+        assert concept.subordinate_arrays == ['3']
+        assert concept.matches['exact'] == ['sh85123119']
+
+    def test_get_collection(self):
+        collection = _build().get_by_id('3')
+        assert collection.type == 'collection'
+        assert collection.members == ['5']
+        assert collection.superordinates == ['1']
+
+    def test_get_children_display(self):
+        vocabulary = _build()
+        children = vocabulary.get_children_display('1', 'nl-BE')
+        assert [('2', 'concept', 'cathedrals'), ('3', 'collection', '<churches by form>')] == [
+            (c['id'], c['type'], c['label']) for c in children]
+        assert 'kerken' == vocabulary.label(vocabulary.index_of('1'), 'nl-BE')
+        assert vocabulary.get_children_display('foo') is False
+
+    def test_expand(self):
+        vocabulary = _build()
+        # Descendant collections and concepts that were only referenced are included
+        assert ['1', '2', '3', '4', '5'] == sorted(vocabulary.expand('1'))
+        assert ['5'] == vocabulary.expand('3')
+        assert vocabulary.expand('foo') is False
+
+    def test_memory_usage(self):
+        vocabulary = _build()
+        assert vocabulary.memory_usage() > 0
+        assert vocabulary.bytes_per_concept() == vocabulary.memory_usage() / 4
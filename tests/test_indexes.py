@@ -0,0 +1,341 @@
+import io
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import rdflib
+from fakes import TGN_PLACE
+from fakes import FakeSession
+from fakes import concept_rdf
+from rdflib.namespace import SKOS
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import Label
+
+from skosprovider_getty.indexes import COLLECTION_TYPES
+from skosprovider_getty.indexes import LabelIndex
+from skosprovider_getty.indexes import MatchIndex
+from skosprovider_getty.indexes import SpatialIndex
+from skosprovider_getty.indexes import edit_distance
+from skosprovider_getty.indexes import haversine
+from skosprovider_getty.providers import AATProvider
+
+LCSH = 'http://id.loc.gov/authorities/subjects/sh85123119'
+
+
+class TestMatchIndex:
+
+    def test_add_and_lookup(self):
+        index = MatchIndex()
+        index.add(LCSH, 'http://vocab.getty.edu/aat/300191778', 'exact')
+        index.add(LCSH, 'http://vocab.getty.edu/tgn/1000', 'close')
+        assert LCSH in index
+        assert len(index) == 1
+        assert [
+            {'id': '1000', 'uri': 'http://vocab.getty.edu/tgn/1000', 'match': 'close'},
+            {'id': '300191778', 'uri': 'http://vocab.getty.edu/aat/300191778', 'match': 'exact'},
+        ] == index.lookup(LCSH)
+        assert ['300191778'] == [m['id'] for m in index.lookup(LCSH, prefix='http://vocab.getty.edu/aat/')]
+        assert ['1000'] == [m['id'] for m in index.lookup(LCSH, type='close')]
+        assert [] == index.lookup('http://example.com')
+
+    def test_remove(self):
+        index = MatchIndex()
+        index.add(LCSH, 'http://vocab.getty.edu/aat/1', 'exact')
+        index.add(LCSH, 'http://vocab.getty.edu/aat/2', 'close')
+        index.add('http://example.com', 'http://vocab.getty.edu/aat/1', 'close')
+        assert 2 == index.remove(['http://vocab.getty.edu/aat/1'])
+        assert ['2'] == [m['id'] for m in index.lookup(LCSH)]
+        assert 'http://example.com' not in index
+
+    def test_load_ntriples(self):
+        dump = io.StringIO(
+            '<http://vocab.getty.edu/aat/1> <http://www.w3.org/2004/02/skos/core#exactMatch> <%s> .\n'
+            '<http://vocab.getty.edu/aat/1> <http://www.w3.org/2004/02/skos/core#prefLabel> "a"@en .\n'
+            '<http://vocab.getty.edu/aat/2> <http://www.w3.org/2004/02/skos/core#broadMatch> <%s> .\n'
+            % (LCSH, LCSH)
+        )
+        index = MatchIndex()
+        assert index.load_ntriples(dump) == 2
+        assert [('1', 'exact'), ('2', 'broad')] == [(m['id'], m['match']) for m in index.lookup(LCSH)]
+
+    def test_add_graph(self):
+        graph = rdflib.Graph()
+        graph.parse(data=concept_rdf('1'), format='application/rdf+xml')
+        graph.add((
+            rdflib.URIRef('http://vocab.getty.edu/aat/1'),
+            rdflib.namespace.SKOS.closeMatch,
+            rdflib.URIRef(LCSH)
+        ))
+        index = MatchIndex()
+        assert index.add_graph(graph) == 1
+        assert 'close' == index.lookup(LCSH)[0]['match']
+
+
+class TestLabelIndex:
+
+    def _get_index(self):
+        index = LabelIndex()
+        index.add_all([
+            Concept('1', uri='http://vocab.getty.edu/aat/1', labels=[
+                Label('churches', 'prefLabel', 'en'), Label('kerken', 'prefLabel', 'nl'),
+                Label('church', 'altLabel', 'en')]),
+            Concept('2', uri='http://vocab.getty.edu/aat/2', labels=[
+                Label('church towers', 'prefLabel', 'en'), Label('kerktorens', 'prefLabel', 'nl')]),
+            Collection('3', uri='http://vocab.getty.edu/aat/3', labels=[
+                Label('Église', 'prefLabel', 'fr')]),
+            False,
+        ])
+        return index
+
+    def test_suggest(self):
+        suggestions = self._get_index().suggest('CHURCH')
+        # The exact altLabel match ranks first, every concept only once
+        assert [('1', 'church'), ('2', 'church towers')] == [(s['id'], s['label']) for s in suggestions]
+        assert suggestions[0]['uri'] == 'http://vocab.getty.edu/aat/1'
+
+    def test_language(self):
+        suggestions = self._get_index().suggest('kerk', 'nl-BE')
+        assert ['kerken', 'kerktorens'] == [s['label'] for s in suggestions]
+        assert [] == self._get_index().suggest('kerk', limit=0)
+
+    def test_accents_and_type(self):
+        suggestions = self._get_index().suggest('egl')
+        assert [('3', 'collection', 'Église')] == [(s['id'], s['type'], s['label']) for s in suggestions]
+
+    def test_limit_and_uri_prefix(self):
+        index = self._get_index()
+        assert 1 == len(index.suggest('c', limit=1))
+        assert [] == index.suggest('church', uri_prefix='http://vocab.getty.edu/tgn/')
+        assert [] == index.suggest('  ')
+
+    def test_incremental(self):
+        index = self._get_index()
+        index.suggest('church')
+        index.add('http://vocab.getty.edu/aat/4', 'chapels', 'prefLabel', 'en')
+        assert ['4'] == [s['id'] for s in index.suggest('chap')]
+        assert 7 == len(index)
+
+    def test_merge_size(self):
+        index = LabelIndex(merge_size=2)
+        index.add('http://vocab.getty.edu/aat/1', 'churches', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/2', 'church towers', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/3', 'chapels', 'prefLabel', 'en')
+        assert ['1', '2'] == [s['id'] for s in index.suggest('church')]
+        # Sorted into the delta, searched alongside the other labels
+        index.add('http://vocab.getty.edu/aat/4', 'church', 'prefLabel', 'en')
+        assert ['4', '1', '2'] == [s['id'] for s in index.suggest('church')]
+        index.add('http://vocab.getty.edu/aat/5', 'chapter houses', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/6', 'chancels', 'prefLabel', 'en')
+        assert ['3', '6', '5'] == [s['id'] for s in index.suggest('cha')]
+        assert 6 == len(index)
+        assert 2 == index.remove(['http://vocab.getty.edu/aat/4', 'http://vocab.getty.edu/aat/6'])
+        assert ['3', '5'] == [s['id'] for s in index.suggest('cha')]
+
+    def test_rank_beyond_max_scan(self):
+        index = LabelIndex(max_scan=100)
+        for i in range(200):
+            index.add('http://vocab.getty.edu/aat/%d' % i, 'aa %03d' % i, 'altLabel', 'fr')
+        index.add('http://vocab.getty.edu/aat/1000', 'ab', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/1001', 'a', 'altLabel', 'fr')
+        assert ['1001', '1000', '0'] == [s['id'] for s in index.suggest('a', 'en', 3)]
+
+    def test_add_thing_from_threads(self):
+        index = LabelIndex()
+        concepts = [
+            Concept(str(i), uri='http://vocab.getty.edu/aat/%s' % i, labels=[Label('church %s' % i, 'prefLabel', 'en')])
+            for i in range(50)
+        ]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            counts = list(executor.map(index.add_thing, concepts * 8))
+            list(executor.map(index.suggest, ['church'] * 20))
+        assert 50 == sum(counts)
+        assert 50 == len(index)
+        assert 0 == index.add_thing(concepts[0])
+
+    def test_remove(self):
+        index = self._get_index()
+        index.suggest('church')
+        index.add('http://vocab.getty.edu/aat/1', 'chapels', 'prefLabel', 'en')
+        assert 4 == index.remove(['http://vocab.getty.edu/aat/1'])
+        assert ['2'] == [s['id'] for s in index.suggest('church')]
+        assert [] == index.suggest('chap')
+        # Registered again when the concept is added again
+        assert 1 == index.add_thing(Concept('1', uri='http://vocab.getty.edu/aat/1', labels=[
+            Label('chapels', 'prefLabel', 'en')]))
+        assert ['1'] == [s['id'] for s in index.suggest('chap')]
+
+    def test_load_ntriples(self):
+        index = LabelIndex()
+        count = index.load_ntriples([
+            b'<http://vocab.getty.edu/aat/1> <http://www.w3.org/2004/02/skos/core#prefLabel> '
+            b'"\\u00E9glises"@fr .\n',
+            '<http://vocab.getty.edu/aat/3> <http://www.w3.org/2004/02/skos/core#altLabel> '
+            '"<\\"eglise\\" forms>" .\n',
+            '<http://vocab.getty.edu/aat/3> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+            '<http://vocab.getty.edu/ontology#GuideTerm> .\n',
+        ])
+        assert 2 == count
+        assert [('1', 'concept', 'églises')] == [
+            (s['id'], s['type'], s['label']) for s in index.suggest('eglise')]
+        assert [('3', 'collection', '<"eglise" forms>')] == [
+            (s['id'], s['type'], s['label']) for s in index.suggest('<')]
+
+    def test_load_ntriples_collection_types(self):
+        provider = AATProvider({'id': 'AAT'}, session=FakeSession(None))
+        collection_types = provider.subclasses.get_subclasses(SKOS.Collection)
+        assert set(COLLECTION_TYPES) == {str(t) for t in collection_types}
+        index = LabelIndex()
+        index.load_ntriples([
+            '<http://vocab.getty.edu/aat/3> <http://www.w3.org/2004/02/skos/core#prefLabel> "<forms>" .\n',
+            '<http://vocab.getty.edu/aat/3> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+            '<http://vocab.getty.edu/ontology#Facet> .\n',
+        ], collection_types)
+        assert 'collection' == index.suggest('<')[0]['type']
+        assert provider.session.requests == []
+
+    def test_invalid_type(self):
+        with pytest.raises(ValueError):
+            LabelIndex().add('http://vocab.getty.edu/aat/1', 'foo', 'hiddenLabel')
+
+
+class TestFuzzySearch:
+
+    def _get_index(self):
+        index = LabelIndex()
+        index.add('http://vocab.getty.edu/aat/1', 'églises', 'prefLabel', 'fr')
+        index.add('http://vocab.getty.edu/aat/1', 'churches', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/2', 'Gothic cathedrals', 'prefLabel', 'en')
+        index.add('http://vocab.getty.edu/aat/3', 'cathedral towers', 'altLabel', 'en')
+        index.add('http://vocab.getty.edu/tgn/4', 'Cathedral Rock', 'prefLabel', 'en')
+        return index
+
+    def test_edit_distance(self):
+        assert 0 == edit_distance('church', 'church', 2)
+        assert 1 == edit_distance('eglise', 'eglises', 2)
+        assert 1 == edit_distance('cathedral', 'cahtedral', 2)
+        assert 2 == edit_distance('cathedral', 'cahtedrla', 2)
+        assert 2 == edit_distance('church', 'abbey', 1)
+        assert 2 == edit_distance('a', 'abcdef', 1)
+
+    def test_accents(self):
+        results = self._get_index().search('eglise', 'fr')
+        assert [('1', 'églises')] == [(r['id'], r['label']) for r in results]
+        assert results[0]['score'] < 1
+
+    def test_typos_and_words(self):
+        index = self._get_index()
+        results = index.search('cathedral', uri_prefix='http://vocab.getty.edu/aat/')
+        assert ['3', '2'] == [r['id'] for r in results]
+        assert results[0]['score'] == 1
+        assert ['2'] == [r['id'] for r in index.search('gothik cathedrals')]
+        assert ['3', '2'] == [r['id'] for r in index.search('cahtedral', uri_prefix='http://vocab.getty.edu/aat/')]
+        assert ['1'] == [r['id'] for r in index.search('chruches')]
+        assert [] == index.search('gothic churches')
+        assert [] == index.search('chruch xyz')
+
+    def test_short_words_exact(self):
+        index = LabelIndex()
+        index.add('http://vocab.getty.edu/aat/1', 'axe', 'prefLabel', 'en')
+        assert ['1'] == [r['id'] for r in index.search('AXE')]
+        assert [] == index.search('axo')
+
+    def test_incremental(self):
+        index = self._get_index()
+        index.search('church')
+        index.add('http://vocab.getty.edu/aat/5', 'chapels', 'prefLabel', 'en')
+        assert ['5'] == [r['id'] for r in index.search('chapel')]
+
+    def test_budget(self):
+        assert [] == self._get_index().search('cathedral', budget=-1)
+
+
+class TestSpatialIndex:
+
+    def _get_index(self):
+        index = SpatialIndex()
+        index.add('http://vocab.getty.edu/tgn/7000084-place', 50.833333, 4)
+        index.add('http://vocab.getty.edu/tgn/7007868', 51.216667, 4.416667)
+        index.add('http://vocab.getty.edu/tgn/7000874', 64, -150)
+        index.add('http://vocab.getty.edu/tgn/1000', -17, 179.5)
+        index.add('http://vocab.getty.edu/tgn/1001', -17.5, -179.5)
+        index.add_label('http://vocab.getty.edu/tgn/7000084', 'Belgium', 'en')
+        index.add_label('http://vocab.getty.edu/tgn/7000084', 'België', 'nl')
+        return index
+
+    def test_haversine(self):
+        assert 0 == haversine(50, 4, 50, 4)
+        assert 110 < haversine(0, 0, 1, 0) < 112
+        assert 105 < haversine(-17, 179.5, -17, -179.5) < 108
+
+    def test_find_within(self):
+        index = self._get_index()
+        assert 5 == len(index)
+        assert 'http://vocab.getty.edu/tgn/7000084' in index
+        results = index.find_within((2.5, 49.5, 6.4, 51.5), 'nl')
+        assert ['7000084', '7007868'] == sorted(r['id'] for r in results)
+        assert 'België' in [r['label'] for r in results]
+        assert '7007868' in [r['label'] for r in results]
+        # Crossing the antimeridian
+        assert ['1000', '1001'] == sorted(r['id'] for r in index.find_within((179, -18, -179, -16)))
+        with pytest.raises(ValueError):
+            index.find_within((0, 10, 5, 5))
+
+    def test_find_nearest(self):
+        index = self._get_index()
+        results = index.find_nearest(50.85, 4.35, 2, 'en')
+        assert ['7000084', '7007868'] == [r['id'] for r in results]
+        assert results[0]['label'] == 'Belgium'
+        assert results[0]['type'] == 'concept'
+        assert results[0]['distance'] < results[1]['distance']
+        assert ['1001', '1000'] == [r['id'] for r in index.find_nearest(-17.5, -179.9, 2)]
+        assert [] == SpatialIndex().find_nearest(0, 0)
+
+    def test_find_nearest_matches_brute_force(self):
+        rnd = random.Random(7)
+        index = SpatialIndex(cell_size=5)
+        points = {}
+        for i in range(500):
+            points['http://vocab.getty.edu/tgn/%d' % i] = (rnd.uniform(-90, 90), rnd.uniform(-180, 180))
+            index.add('http://vocab.getty.edu/tgn/%d' % i, *points['http://vocab.getty.edu/tgn/%d' % i])
+        for i in range(20):
+            lat, lon = rnd.uniform(-90, 90), rnd.uniform(-180, 180)
+            expected = sorted(points, key=lambda uri: haversine(lat, lon, *points[uri]))[:5]
+            assert expected == [r['uri'] for r in index.find_nearest(lat, lon, 5)]
+
+    def test_move(self):
+        index = self._get_index()
+        index.add('http://vocab.getty.edu/tgn/1000', 10, 10)
+        assert ['1000'] == [r['id'] for r in index.find_within((9, 9, 11, 11))]
+        assert ['1001'] == [r['id'] for r in index.find_within((179, -18, -179, -16))]
+        with pytest.raises(ValueError):
+            index.add('http://vocab.getty.edu/tgn/1000', 100, 10)
+
+    def test_remove(self):
+        index = self._get_index()
+        assert 1 == index.remove(['http://vocab.getty.edu/tgn/7000084', 'http://vocab.getty.edu/tgn/1'])
+        assert 'http://vocab.getty.edu/tgn/7000084' not in index
+        assert ['7007868'] == [r['id'] for r in index.find_within((2.5, 49.5, 6.4, 51.5))]
+        index.add('http://vocab.getty.edu/tgn/7000084', 50.833333, 4)
+        assert '7000084' in [r['label'] for r in index.find_within((2.5, 49.5, 6.4, 51.5))]
+
+    def test_load_ntriples(self):
+        index = SpatialIndex()
+        count = index.load_ntriples([
+            b'<http://vocab.getty.edu/tgn/7000084-place> <http://www.w3.org/2003/01/geo/wgs84_pos#lat> '
+            b'"50.833333"^^<http://www.w3.org/2001/XMLSchema#decimal> .\n',
+            b'<http://vocab.getty.edu/tgn/7000084> <http://www.w3.org/2004/02/skos/core#prefLabel> '
+            b'"Belgi\\u00EB"@nl .\n',
+            b'<http://vocab.getty.edu/tgn/7000084-place> <http://www.w3.org/2003/01/geo/wgs84_pos#long> '
+            b'"4"^^<http://www.w3.org/2001/XMLSchema#decimal> .\n',
+        ])
+        assert 1 == count
+        assert [('7000084', 'België')] == [(r['id'], r['label']) for r in index.find_nearest(50, 4, 1)]
+
+    def test_add_graph(self):
+        graph = rdflib.Graph()
+        graph.parse(data=concept_rdf('7000084', [('Belgium', 'en')], vocab='tgn', extra=TGN_PLACE),
+                    format='application/rdf+xml')
+        index = SpatialIndex()
+        assert 1 == index.add_graph(graph)
+        assert [('7000084', 'Belgium')] == [(r['id'], r['label']) for r in index.find_within((3, 50, 5, 51))]
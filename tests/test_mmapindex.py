@@ -0,0 +1,134 @@
+import multiprocessing
+
+import pytest
+from fakes import FakeResponse
+from fakes import FakeSession
+from test_compact import _build
+
+from skosprovider_getty.mmapindex import build_index_from_ntriples
+from skosprovider_getty.mmapindex import open_index
+from skosprovider_getty.mmapindex import write_index
+from skosprovider_getty.providers import AATProvider
+
+
+def _label_in_child(path, queue):
+    with open_index(path) as vocabulary:
+        queue.put(vocabulary.get_by_id('2').label('en').label)
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / 'aat.idx')
+    write_index(_build(), path)
+    return path
+
+
+class TestMappedVocabulary:
+
+    def test_round_trip(self, index_path):
+        original = _build()
+        with open_index(index_path) as vocabulary:
+            assert len(vocabulary) == len(original)
+            assert '4' not in vocabulary
+            concept = vocabulary.get_by_id('1')
+            assert concept.label('nl').label == 'kerken'
+            assert concept.notes[0].note == 'Buildings for worship.'
+            assert concept.narrower == ['2']
+            assert concept.matches['exact'] == ['sh85123119']
+            assert vocabulary.get_by_id('3').members == ['5']
+            assert vocabulary.get_children_display('1') == original.get_children_display('1')
+            assert sorted(vocabulary.expand('1')) == sorted(original.expand('1'))
+
+    def test_shared_between_processes(self, index_path):
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(target=_label_in_child, args=(index_path, queue))
+        process.start()
+        assert queue.get(timeout=30) == 'cathedrals'
+        process.join()
+
+    def test_rewrite_does_not_disturb_open_index(self, index_path):
+        with open_index(index_path) as vocabulary:
+            write_index(_build(), index_path)
+            assert vocabulary.get_by_id('5').label().label == 'basilicas'
+
+    def test_provider(self, index_path):
+        def responder(url, params):
+            return FakeResponse({'results': {'bindings': []}})
+
+        vocabulary = open_index(index_path)
+        provider = AATProvider({'id': 'AAT'}, session=FakeSession(responder), local_vocabulary=vocabulary)
+        assert provider.get_by_id('2').label('en').label == 'cathedrals'
+        assert ['2', '3'] == [c['id'] for c in provider.get_children_display('1')]
+        assert provider.session.requests == []
+        vocabulary.close()
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / 'foo.idx'
+        path.write_bytes(b'not an index file at all, just some text')
+        with pytest.raises(ValueError):
+            open_index(str(path))
+
+    def test_lookup_label(self, index_path):
+        with open_index(index_path) as vocabulary:
+            assert ['1'] == [c['id'] for c in vocabulary.lookup_label('Churches')]
+            assert 'kerken' == vocabulary.lookup_label('KERK', language='nl')[0]['label']
+            assert ['1'] == [c['id'] for c in vocabulary.lookup_label('church', prefix=True)]
+            assert 'collection' == vocabulary.lookup_label('<churches by', prefix=True)[0]['type']
+            assert ['2'] == [c['id'] for c in vocabulary.lookup_label('cath', prefix=True)]
+            assert [] == vocabulary.lookup_label('cath')
+            assert 1 == len(vocabulary.lookup_label('c', prefix=True, limit=1))
+
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+AAT = 'http://vocab.getty.edu/aat/'
+
+#: An N-Triples dump, `{}` in the subject and object is replaced by `AAT`.
+DUMP = [
+    ('<{}1>', RDF + 'type', '<http://vocab.getty.edu/ontology#Concept>'),
+    ('<{}1>', RDF + 'type', '<%sConcept>' % SKOS),
+    ('<{}1>', SKOS + 'prefLabel', '"churches"@en'),
+    ('<{}1>', SKOS + 'prefLabel', '"\\u00E9glises"@fr'),
+    ('<{}1>', SKOS + 'altLabel', '"kerk"@nl'),
+    ('<{}1>', SKOS + 'narrower', '<{}2>'),
+    ('<{}1>', 'http://purl.org/iso25964/skos-thes#subordinateArray', '<{}3>'),
+    ('<{}1>', SKOS + 'exactMatch', '<http://id.loc.gov/authorities/subjects/sh85025615>'),
+    ('<{}1>', SKOS + 'scopeNote', '<{}scopeNote/1>'),
+    ('<{}scopeNote/1>', RDF + 'value', '"Buildings for worship."@en'),
+    ('<{}2>', RDF + 'type', '<%sConcept>' % SKOS),
+    ('<{}2>', SKOS + 'prefLabel', '"cathedrals"@en'),
+    ('<{}2>', SKOS + 'broader', '<{}1>'),
+    ('<{}3>', RDF + 'type', '<%sCollection>' % SKOS),
+    ('<{}3>', SKOS + 'prefLabel', '"<churches by form>"@en'),
+    ('<{}3>', SKOS + 'member', '<{}2>'),
+    ('<http://vocab.getty.edu/tgn/7000084>', SKOS + 'prefLabel', '"Belgium"@en'),
+]
+
+
+def _dump():
+    for s, p, o in DUMP:
+        yield ('%s <%s> %s .\n' % (s.format(AAT), p, o.format(AAT))).encode('utf-8')
+
+
+class TestBuildFromNTriples:
+
+    def test_build(self, tmp_path):
+        path = str(tmp_path / 'aat.idx')
+        assert 3 == build_index_from_ntriples(_dump(), path, AAT)
+        with open_index(path) as vocabulary:
+            concept = vocabulary.get_by_id('1')
+            assert concept.label('fr').label == 'églises'
+            assert concept.narrower == ['2']
+            assert concept.subordinate_arrays == ['3']
+            assert concept.matches['exact'] == ['sh85025615']
+            assert concept.notes[0].note == 'Buildings for worship.'
+            assert concept.notes[0].type == 'scopeNote'
+            assert vocabulary.get_by_id('2').broader == ['1']
+            collection = vocabulary.get_by_id('3')
+            assert collection.type == 'collection'
+            assert collection.members == ['2']
+            assert collection.superordinates == ['1']
+            assert '7000084' not in vocabulary
+            assert ['1'] == [c['id'] for c in vocabulary.lookup_label('eglises')]
+            assert ['1'] == [c['id'] for c in vocabulary.lookup_label('KERK')]
@@ -1,14 +1,69 @@
 #!/usr/bin/python
+import subprocess
+import sys
 import unittest
+from datetime import datetime
 
 import pytest
 import requests
+from fakes import FakeResponse
+from fakes import FakeSession
+from fakes import TGN_PLACE
+from fakes import concept_rdf
+from fakes import concepts_rdf
+from fakes import sparql_bindings
+from rdflib.namespace import SKOS
 from skosprovider.exceptions import ProviderUnavailableException
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import ConceptScheme
+from skosprovider.skos import Label
+from skosprovider.skos import Note
 
+from skosprovider_getty.cache import BackgroundRefresher
+from skosprovider_getty.cache import MemoryCache
+from skosprovider_getty.cache import SQLiteCache
+from skosprovider_getty.compact import CompactVocabularyBuilder
+from skosprovider_getty.indexes import LabelIndex
+from skosprovider_getty.indexes import MatchIndex
+from skosprovider_getty.indexes import SpatialIndex
 from skosprovider_getty.providers import AATProvider
 from skosprovider_getty.providers import GettyProvider
 from skosprovider_getty.providers import TGNProvider
 from skosprovider_getty.providers import ULANProvider
+from skosprovider_getty.transport import get_default_transport
+
+LCSH = 'http://id.loc.gov/authorities/subjects/sh85123119'
+
+
+def _fake_provider(responder, cls=AATProvider, metadata=None, **kwargs):
+    '''
+    Build a provider that is answered by `responder` instead of the
+    Getty services.
+
+    :param responder: Called with the `url` and `params` of every request,
+        returns a :class:`fakes.FakeResponse`.
+    :param cls: The provider class, :class:`AATProvider` by default.
+    :param metadata: The metadata of the provider, by default only the id
+        that goes with `cls`.
+    '''
+    if metadata is None:
+        metadata = {'id': cls.__name__[:-len('Provider')]}
+    return cls(metadata, session=FakeSession(responder), **kwargs)
+
+
+def _bindings_responder(*pages):
+    '''
+    Answer every SPARQL query with the next page of rows, as accepted by
+    :func:`fakes.sparql_bindings`. The last page is repeated.
+    '''
+    pages = list(pages)
+
+    def responder(url, params):
+        return FakeResponse(sparql_bindings(pages.pop(0) if len(pages) > 1 else pages[0]))
+
+    return responder
+
 
 global clazzes, ontologies
 clazzes = []
@@ -354,3 +409,861 @@ class TGNProviderTests():
         for key in ['id', 'type', 'label', 'uri']:
             assert key in keys_first_display
         assert 'Brussels Hoofdstedelijk Gewest' in [label['label'] for label in childeren_tgn_belgie]
+
+
+class TestIterAll:
+
+    def _get_provider(self, pages):
+        return _fake_provider(_bindings_responder(*pages))
+
+    def test_iter_all_pages(self):
+        provider = self._get_provider([
+            [('1', 'Concept', 'one', 'en'), ('1', 'Concept', 'een', 'nl'),
+             ('2', 'Collection', 'two', 'en')],
+            [('3', 'Concept', 'three', 'en')],
+        ])
+        res = list(provider.iter_all(page_size=2))
+        assert ['1', '2', '3'] == [r['id'] for r in res]
+        assert 'one' == res[0]['label']
+        assert 'collection' == res[1]['type']
+        queries = [params['query'] for url, params in provider.session.requests]
+        assert len(queries) == 2
+        assert 'LIMIT 2' in queries[0]
+        assert "> '2'" in queries[1]
+
+    def test_iter_all_resume_from_cursor(self):
+        provider = self._get_provider([[('5', 'Concept', 'five', 'en')]])
+        res = list(provider.iter_all(cursor='4', page_size=10))
+        assert ['5'] == [r['id'] for r in res]
+        assert "> '4'" in provider.session.requests[0][1]['query']
+
+    def test_iter_all_escapes_cursor(self):
+        provider = self._get_provider([[]])
+        assert [] == list(provider.iter_all(cursor="4') || ('1"))
+        assert "> '4\\') || (\\'1')" in provider.session.requests[0][1]['query']
+
+    def test_iter_all_wrong_type(self):
+        provider = self._get_provider([])
+        with pytest.raises(ValueError):
+            list(provider.iter_all(type='collectie'))
+
+    def test_get_all_stream(self):
+        provider = self._get_provider([[('1', 'Concept', 'one', 'en')]])
+        res = provider.get_all(stream=True, page_size=10)
+        assert ['1'] == [r['id'] for r in res]
+
+
+class TestSort:
+
+    def _get_provider(self, rows=()):
+        return _fake_provider(_bindings_responder(rows))
+
+    def test_sort_label_ignores_accents_and_case(self):
+        provider = self._get_provider()
+        items = [
+            {'id': '1', 'label': 'Eglises'},
+            {'id': '2', 'label': 'église'},
+            {'id': '3', 'label': 'eglise'},
+            {'id': '4', 'label': 'abbey'},
+        ]
+        res = provider._sort(items, 'sortlabel')
+        assert ['4', '3', '2', '1'] == [i['id'] for i in res]
+
+    def test_sort_top_k(self):
+        provider = self._get_provider()
+        items = [{'id': str(i), 'label': 'l%03d' % i} for i in range(100)]
+        assert ['0', '1'] == [i['id'] for i in provider._sort(list(items), 'label', limit=2)]
+        assert ['99', '98'] == [i['id'] for i in provider._sort(list(items), 'label', reverse=True, limit=2)]
+        assert 100 == len(provider._sort(list(items), 'id'))
+
+    def test_find_limit_is_sent_to_endpoint(self):
+        provider = self._get_provider([
+            ('2', 'Concept', 'b', 'en'), ('1', 'Concept', 'a', 'en'), ('3', 'Concept', 'c', 'en')
+        ])
+        res = provider.find({'label': 'church'}, limit=2, sort='label', language='nl')
+        assert ['1', '2'] == [r['id'] for r in res]
+        query = provider.session.requests[0][1]['query']
+        assert 'LIMIT 2' in query
+        assert 'ORDER BY ASC(LCASE(?SortTerm))' in query
+        assert "langMatches(lang(?SortLang), 'nl')" in query
+
+    def test_find_without_limit(self):
+        provider = self._get_provider([('1', 'Concept', 'a', 'en')])
+        provider.get_children_display('300007466')
+        query = provider.session.requests[0][1]['query']
+        assert 'LIMIT' not in query
+        assert '{?Subject xl:prefLabel [skosxl:literalForm ?Term]}' in query
+
+    def test_find_wrong_limit(self):
+        provider = self._get_provider()
+        with pytest.raises(ValueError):
+            provider.find({'label': 'church'}, limit=-1)
+
+
+class TestFindVocabularies:
+
+    def _get_provider(self, rows):
+        return _fake_provider(_bindings_responder(rows))
+
+    def test_find_in_several_vocabularies(self):
+        provider = self._get_provider([
+            ('300007466', 'Concept', 'churches', 'en', 'aat'),
+            ('7000084', 'Concept', 'Belgium', 'en', 'tgn'),
+        ])
+        res = provider.find({'label': 'b', 'vocabularies': ['aat', 'tgn']}, sort='label')
+        assert [('tgn', '7000084'), ('aat', '300007466')] == [(r['vocabulary'], r['id']) for r in res]
+        query = provider.session.requests[0][1]['query']
+        assert 'VALUES ?Scheme {aat: tgn:}' in query
+        assert 'skos:inScheme ?Scheme' in query
+
+    def test_find_single_vocabulary(self):
+        provider = self._get_provider([('300007466', 'Concept', 'churches', 'en')])
+        res = provider.find({'label': 'church'})
+        assert 'vocabulary' not in res[0]
+        assert 'skos:inScheme aat:;' in provider.session.requests[0][1]['query']
+
+    def test_find_wrong_vocabularies(self):
+        provider = self._get_provider([])
+        with pytest.raises(ValueError):
+            provider.find({'label': 'church', 'vocabularies': ['aat', 'foo']})
+        with pytest.raises(ValueError):
+            provider.find({'label': 'church', 'vocabularies': []})
+
+
+class TestFindMatches:
+
+    def test_find_matches_remote(self):
+        uri = 'http://id.loc.gov/authorities/subjects/sh85123119'
+
+        def responder(url, params):
+            return FakeResponse({'results': {'bindings': [{
+                'Subject': {'value': 'http://vocab.getty.edu/aat/300191778'},
+                'Match': {'value': uri},
+                'Pred': {'value': 'http://www.w3.org/2004/02/skos/core#exactMatch'},
+            }]}})
+
+        provider = _fake_provider(responder)
+        res = provider.find_matches([uri, uri, 'http://example.com/1'])
+        assert {
+            uri: [{'id': '300191778', 'uri': 'http://vocab.getty.edu/aat/300191778', 'match': 'exact'}],
+            'http://example.com/1': []
+        } == res
+        assert len(provider.session.requests) == 1
+        assert 'VALUES ?Match {<%s> <http://example.com/1>}' % uri in provider.session.requests[0][1]['query']
+
+    def test_find_matches_index(self):
+        uri = 'http://id.loc.gov/authorities/subjects/sh85123119'
+
+        def responder(url, params):
+            rdf = concept_rdf('300191778').replace(
+                b'</skos:Concept>', b'<skos:exactMatch rdf:resource="%s"/></skos:Concept>' % uri.encode())
+            return FakeResponse(content=rdf)
+
+        provider = _fake_provider(responder, match_index=MatchIndex())
+        assert {uri: []} == provider.find_matches([uri])
+        provider.get_by_id('300191778')
+        assert ['300191778'] == [m['id'] for m in provider.find_matches([uri])[uri]]
+        assert [] == provider.find_matches([uri], type='close')[uri]
+        assert len(provider.session.requests) == 1
+
+    def test_find_matches_wrong_type(self):
+        with pytest.raises(ValueError):
+            AATProvider({'id': 'AAT'}).find_matches(['http://example.com'], type='foo')
+
+
+class TestExpand:
+
+    def _get_provider(self, pages, exists=True, **kwargs):
+        pages = list(pages)
+
+        def responder(url, params):
+            if params['query'].startswith('ASK'):
+                return FakeResponse({'head': {}, 'boolean': exists})
+            return FakeResponse({'results': {'bindings': [{'Id': {'value': id}} for id in pages.pop(0)]}})
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_expand(self):
+        provider = self._get_provider([['300007466', '300007467']])
+        assert ['300007466', '300007467'] == provider.expand('300007466')
+        assert len(provider.session.requests) == 1
+
+    def test_expand_invalid_uses_ask(self):
+        provider = self._get_provider([[]], exists=False)
+        assert provider.expand('invalid') is False
+        query = provider.session.requests[1][1]['query']
+        assert 'ASK {<http://vocab.getty.edu/aat/invalid> skos:inScheme aat:}' == query
+
+    def test_expand_existing_without_narrower(self):
+        provider = self._get_provider([[]], exists=True)
+        assert [] == provider.expand('300007494')
+
+    def test_expand_paged(self):
+        provider = self._get_provider([['1', '2'], ['3', '4'], []])
+        assert ['1', '2', '3', '4'] == provider.expand('300007466', page_size=2)
+        queries = [params['query'] for url, params in provider.session.requests]
+        assert len(queries) == 3
+        assert 'LIMIT 2' in queries[0]
+        assert "STR(?Id) > '4'" in queries[2]
+
+    def test_iter_expand(self):
+        provider = self._get_provider([['1', '2'], ['3']])
+        res = provider.iter_expand('300007466', page_size=2)
+        assert '1' == next(res)
+        assert len(provider.session.requests) == 1
+        assert ['2', '3'] == list(res)
+
+    def test_iter_expand_escapes_cursor(self):
+        provider = self._get_provider([['1', "2'"], []])
+        assert ['1', "2'"] == list(provider.iter_expand('300007466', page_size=2))
+        assert "STR(?Id) > '2\\'')" in provider.session.requests[1][1]['query']
+        assert "VALUES ?Id {'300007466'}" in provider.session.requests[1][1]['query']
+
+    def test_expand_cache(self):
+        provider = self._get_provider([['1', '2']], expand_cache=MemoryCache(ttl=60))
+        assert ['1', '2'] == provider.expand('300007466')
+        assert ['1', '2'] == provider.expand('300007466')
+        assert len(provider.session.requests) == 1
+
+
+class TestSparqlCache:
+
+    def test_answers_are_shared(self):
+        def responder(url, params):
+            return FakeResponse(sparql_bindings([('1', 'Concept', 'one', 'en'), ('1', 'Concept', 'een', 'nl')]))
+
+        session = FakeSession(responder)
+        cache = MemoryCache()
+        aat = AATProvider({'id': 'AAT'}, session=session, sparql_cache=cache)
+        other = AATProvider({'id': 'AAT'}, session=session, sparql_cache=cache)
+        assert 'one' == aat.find({'label': 'one'})[0]['label']
+        assert 'one' == other.find({'label': 'one'})[0]['label']
+        assert len(session.requests) == 1
+        assert 'een' == aat.find({'label': 'one'}, language='nl')[0]['label']
+        assert len(session.requests) == 2
+
+    def test_expand_query_is_cached(self):
+        def responder(url, params):
+            return FakeResponse({'results': {'bindings': [{'Id': {'value': '1'}}]}})
+
+        provider = _fake_provider(responder, sparql_cache=MemoryCache())
+        assert ['1'] == provider.expand('1')
+        assert ['1'] == provider.expand('1')
+        assert len(provider.session.requests) == 1
+
+
+class TestStaleWhileRevalidate:
+
+    def test_stale_answer_is_served_and_refreshed(self):
+        labels = ['old', 'new']
+
+        def responder(url, params):
+            return FakeResponse(sparql_bindings([('1', 'Concept', labels.pop(0), 'en')]))
+
+        refresher = BackgroundRefresher()
+        provider = _fake_provider(
+            responder, sparql_cache=MemoryCache(),
+            stale_while_revalidate={'find': -1}, refresher=refresher
+        )
+        assert 'old' == provider.find({'label': 'a'})[0]['label']
+        assert 'old' == provider.find({'label': 'a'})[0]['label']
+        refresher.shutdown()
+        assert len(provider.session.requests) == 2
+        provider.stale_while_revalidate = {}
+        assert 'new' == provider.find({'label': 'a'})[0]['label']
+
+    def test_fresh_answer_is_not_refreshed(self):
+        def responder(url, params):
+            return FakeResponse(sparql_bindings([('1', 'Concept', 'a', 'en')]))
+
+        refresher = BackgroundRefresher()
+        provider = _fake_provider(
+            responder, sparql_cache=MemoryCache(),
+            stale_while_revalidate={'get_children_display': 3600}, refresher=refresher
+        )
+        provider.get_children_display('1')
+        provider.get_children_display('1')
+        refresher.shutdown()
+        assert len(provider.session.requests) == 1
+
+    def test_stale_rdf_is_refreshed(self):
+        labels = ['old', 'new']
+
+        def responder(url, params):
+            return FakeResponse(content=concept_rdf('1', [(labels.pop(0), 'en')]))
+
+        refresher = BackgroundRefresher()
+        provider = _fake_provider(
+            responder, cache=MemoryCache(),
+            stale_while_revalidate={'get_by_id': -1}, refresher=refresher
+        )
+        assert 'old' == provider.get_by_id('1').label('en').label
+        assert len(provider.session.requests) == 1
+        # The stale document is served, or the refreshed one if it was quick
+        assert provider.get_by_id('1').label('en').label in ('old', 'new')
+        refresher.shutdown()
+        assert len(provider.session.requests) == 2
+        assert 'new' == provider.get_by_id('1').label('en').label
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            AATProvider({'id': 'AAT'}, stale_while_revalidate={'get_all': 10})
+
+
+class TestChanges:
+
+    REVISION = (
+        '<skos:changeNote><prov:Activity rdf:about="http://vocab.getty.edu/aat/rev/5001">'
+        '<dc:type>modified</dc:type>'
+        '<prov:startedAtTime>2024-01-01T10:00:00</prov:startedAtTime>'
+        '</prov:Activity></skos:changeNote>'
+    )
+
+    def _get_provider(self, pages=(), **kwargs):
+        pages = list(pages)
+
+        def responder(url, params):
+            if url.endswith('.rdf'):
+                return FakeResponse(content=concept_rdf('1', [('one', 'en')], extra=self.REVISION))
+            return FakeResponse({'results': {'bindings': [{
+                'Subject': {'value': 'http://vocab.getty.edu/aat/%s' % id},
+                'Id': {'value': id},
+                'Modified': {'value': modified}
+            } for id, modified in pages.pop(0)]}})
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_get_by_id_change_notes(self):
+        provider = self._get_provider()
+        assert [] == [n for n in provider.get_by_id('1').notes if n.type == 'changeNote']
+        notes = [n for n in provider.get_by_id('1', change_notes=True).notes if n.type == 'changeNote']
+        assert 1 == len(notes)
+        assert 'modified at 2024-01-01T10:00:00' in notes[0].note
+
+    def test_iter_changes(self):
+        provider = self._get_provider([
+            [('1', '2024-01-01T10:00:00'), ('2', '2024-01-02T10:00:00')],
+            [('3', '2024-01-02T10:00:00')],
+        ])
+        changes = list(provider.iter_changes(datetime(2024, 1, 1), page_size=2))
+        assert ['1', '2', '3'] == [c['id'] for c in changes]
+        queries = [params['query'] for url, params in provider.session.requests]
+        assert "FILTER(?Time > '2024-01-01T00:00:00'^^xsd:dateTime)" in queries[0]
+        assert "STR(?Id) > '2'" in queries[1]
+
+    def test_iter_changes_escapes_values(self):
+        provider = self._get_provider([[("1'", '2024-01-01T10:00:00')], []])
+        assert 1 == len(list(provider.iter_changes('2024-01-01T00:00:00+00:00', page_size=1)))
+        query = provider.session.requests[1][1]['query']
+        assert "FILTER(?Time > '2024-01-01T00:00:00+00:00'^^xsd:dateTime)" in query
+        assert "STR(?Id) > '1\\'')" in query
+        with pytest.raises(ValueError):
+            list(provider.iter_changes("2024-01-01'^^xsd:dateTime) } #"))
+
+    def test_sync_changes(self):
+        cache = MemoryCache()
+        cache.set('http://vocab.getty.edu/aat/1.rdf', b'stale')
+        cache.set('http://vocab.getty.edu/aat/2.rdf', b'unchanged')
+        provider = self._get_provider([[('1', '2024-01-01T10:00:00')]], cache=cache)
+        assert '2024-01-01T10:00:00' == provider.sync_changes('2023-12-31T00:00:00')
+        assert cache.get('http://vocab.getty.edu/aat/1.rdf') is None
+        assert cache.get('http://vocab.getty.edu/aat/2.rdf') == b'unchanged'
+
+    def test_sync_changes_refetch(self):
+        cache = MemoryCache()
+        provider = self._get_provider([[('1', '2024-01-01T10:00:00')]], cache=cache)
+        provider.sync_changes('2023-12-31T00:00:00', refetch=True)
+        assert b'modified' in cache.get('http://vocab.getty.edu/aat/1.rdf')
+
+    def test_sync_changes_indexes_and_caches(self):
+        provider = self._get_provider(
+            [[('1', '2024-01-01T10:00:00')]], label_index=LabelIndex(), match_index=MatchIndex(),
+            expand_cache=MemoryCache())
+        provider.get_by_id('1')
+        provider.match_index.add(LCSH, 'http://vocab.getty.edu/aat/1', 'exact')
+        provider.label_index.add('http://vocab.getty.edu/aat/1', 'old', 'prefLabel', 'en')
+        provider.expand_cache.set('expand:http://vocab.getty.edu/aat/1', b'["1"]')
+        provider.expand_cache.set('expand:http://vocab.getty.edu/aat/2', b'["2"]')
+        provider.path_cache.set('path:http://vocab.getty.edu/aat/2|en|en', b'[[]]')
+        provider.label_cache.set('label:http://vocab.getty.edu/aat/2|en|en', b'two')
+        provider.sync_changes('2023-12-31T00:00:00', refetch=True)
+        assert [] == provider.match_index.lookup(LCSH)
+        assert [] == provider.label_index.suggest('old')
+        assert ['1'] == [s['id'] for s in provider.label_index.suggest('one')]
+        assert 'expand:http://vocab.getty.edu/aat/1' not in provider.expand_cache
+        assert 'expand:http://vocab.getty.edu/aat/2' in provider.expand_cache
+        assert len(provider.path_cache) == 0
+        assert len(provider.label_cache) == 0
+
+    def test_sync_without_changes(self):
+        provider = self._get_provider([[]])
+        assert '2023-12-31T00:00:00' == provider.sync_changes(datetime(2023, 12, 31))
+
+
+class TestObjectCache:
+
+    def _get_provider(self, **kwargs):
+        def responder(url, params):
+            return FakeResponse(content=concept_rdf('1', [('one', 'en')], broader=['0']))
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_get_by_id(self):
+        cache = MemoryCache()
+        provider = self._get_provider(object_cache=cache)
+        first = provider.get_by_id('1')
+        count = len(provider.session.requests)
+        assert 'thing:http://vocab.getty.edu/aat/1' in cache
+        second = provider.get_by_id('1')
+        assert len(provider.session.requests) == count
+        assert second.label('en').label == first.label('en').label == 'one'
+        assert second.broader == first.broader == ['0']
+        assert second.concept_scheme is provider.concept_scheme
+
+    def test_shared_between_providers(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+        self._get_provider(object_cache=SQLiteCache(path, wal=True)).get_by_id('1')
+        provider = self._get_provider(object_cache=SQLiteCache(path, wal=True))
+        assert provider.get_by_id('1').label('en').label == 'one'
+        assert provider.session.requests == []
+
+    def test_change_notes_cached_separately(self):
+        provider = self._get_provider(object_cache=MemoryCache())
+        provider.get_by_id('1')
+        provider.get_by_id('1', change_notes=True)
+        assert 'thing:http://vocab.getty.edu/aat/1#changes' in provider.object_cache
+
+
+class TestGetByIds:
+
+    def _get_provider(self, **kwargs):
+        def responder(url, params):
+            assert url == 'http://vocab.getty.edu/sparql.rdf'
+            return FakeResponse(content=concepts_rdf([('1', 'one'), ('2', 'two')]))
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_get_by_ids(self):
+        provider = self._get_provider(object_cache=MemoryCache())
+        things = provider.get_by_ids(['1', '2', '3', '1'])
+        assert ['1', '2', '3'] == list(things)
+        assert things['1'].label('en').label == 'one'
+        assert things['2'].uri == 'http://vocab.getty.edu/aat/2'
+        assert things['3'] is False
+        assert len(provider.session.requests) == 1
+        query = provider.session.requests[0][1]['query']
+        assert 'VALUES ?Subject {<http://vocab.getty.edu/aat/1> <http://vocab.getty.edu/aat/2>' in query
+        assert provider.get_by_ids(['1', '2'])['2'].label('en').label == 'two'
+        assert len(provider.session.requests) == 1
+
+    def test_batch_size(self):
+        provider = self._get_provider()
+        provider.get_by_ids(['1', '2', '3'], batch_size=2)
+        assert len(provider.session.requests) == 2
+
+    def test_stream_rdf(self):
+        provider = self._get_provider(stream_rdf=True)
+        things = provider.get_by_ids(['1', '2'])
+        assert things['1'].label('en').label == 'one'
+
+    def test_rdf_cache(self):
+        cache = MemoryCache()
+        cache.set('http://vocab.getty.edu/aat/3.rdf', concept_rdf('3', [('three', 'en')]))
+        provider = self._get_provider(cache=cache)
+        things = provider.get_by_ids(['1', '3'])
+        assert things['3'].label('en').label == 'three'
+        query = provider.session.requests[0][1]['query']
+        assert 'aat/3>' not in query
+        # Only part of the document of 1 was fetched
+        assert 'http://vocab.getty.edu/aat/1.rdf' not in cache
+
+    def test_get_by_uri_custom_base_url(self):
+        def responder(url, params):
+            assert url == 'http://localhost:8080/aat/1.rdf'
+            return FakeResponse(content=concept_rdf('1', [('one', 'en')]))
+
+        provider = _fake_provider(
+            responder, GettyProvider, {'id': 'AAT'}, base_url='http://localhost:8080/',
+            concept_scheme=ConceptScheme('http://vocab.getty.edu/aat/'))
+        assert provider.get_by_uri('http://localhost:8080/aat/1/').label('en').label == 'one'
+        assert provider.get_by_uri('http://vocab.getty.edu/aat/1').id == '1'
+        assert provider.get_by_uri('http://localhost:8080/tgn/1') is None
+        assert provider.get_by_uri('http://localhost:8080/aat/1/foo') is None
+
+    def test_get_by_uri_other_vocabulary(self):
+        provider = self._get_provider()
+        assert provider.get_by_uri('http://vocab.getty.edu/tgn/7000084') is None
+        assert provider.get_by_uri('urn:skosprovider:5') is None
+        assert provider.session.requests == []
+
+    def test_get_by_uri_variants(self):
+        def responder(url, params):
+            assert url == 'http://vocab.getty.edu/tgn/7000084.rdf'
+            return FakeResponse(content=concept_rdf('7000084', [('Belgium', 'en')], vocab='tgn'))
+
+        provider = _fake_provider(responder, TGNProvider)
+        for uri in ('https://vocab.getty.edu/tgn/7000084/', 'http://vocab.getty.edu/tgn/7000084-place'):
+            assert provider.get_by_uri(uri).label('en').label == 'Belgium'
+
+
+class TestResolve:
+
+    def _get_provider(self, **kwargs):
+        def responder(url, params):
+            if url.endswith('.rdf'):
+                return FakeResponse(content=concept_rdf(
+                    '1', [('one', 'en')], broader=['0'],
+                    extra='<skos:narrower rdf:resource="http://vocab.getty.edu/aat/2"/>'
+                          '<skos:narrower rdf:resource="http://vocab.getty.edu/aat/3"/>'))
+            return FakeResponse(sparql_bindings([
+                ('0', 'Concept', 'top', 'en'),
+                ('0', 'Concept', 'top nl', 'nl'),
+                ('2', 'Concept', 'two', 'en'),
+            ]))
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_resolve_in_one_query(self):
+        provider = self._get_provider()
+        concept = provider.get_by_id('1', resolve=['broader', 'narrower'], language='nl')
+        assert len(provider.session.requests) == 2
+        query = provider.session.requests[1][1]['query']
+        assert ('VALUES ?Subject {<http://vocab.getty.edu/aat/0> <http://vocab.getty.edu/aat/2> '
+                '<http://vocab.getty.edu/aat/3>}') in query
+        assert [('0', 'top nl')] == [(n['id'], n['label']) for n in concept.neighbours['broader']]
+        assert [('2', 'two', 'concept'), ('3', None, None)] == [
+            (n['id'], n['label'], n['type']) for n in concept.neighbours['narrower']]
+        assert concept.broader == ['0']
+
+    def test_default_language(self):
+        concept = self._get_provider().get_by_id('1', resolve=['broader'])
+        assert 'top' == concept.neighbours['broader'][0]['label']
+
+    def test_without_resolve(self):
+        provider = self._get_provider()
+        assert not hasattr(provider.get_by_id('1'), 'neighbours')
+        assert len(provider.session.requests) == 1
+
+    def test_nothing_to_resolve(self):
+        provider = self._get_provider()
+        concept = provider.get_by_id('1', resolve=['related', 'members'])
+        assert {'related': [], 'members': []} == concept.neighbours
+        assert len(provider.session.requests) == 1
+
+    def test_object_cache(self):
+        provider = self._get_provider(object_cache=MemoryCache())
+        provider.get_by_id('1', resolve=['broader'])
+        concept = provider.get_by_id('1', resolve=['broader'], language='nl')
+        assert 'top nl' == concept.neighbours['broader'][0]['label']
+        assert not hasattr(provider.get_by_id('1'), 'neighbours')
+
+    def test_get_by_uri(self):
+        concept = self._get_provider().get_by_uri('http://vocab.getty.edu/aat/1', resolve=['broader'])
+        assert 'top' == concept.neighbours['broader'][0]['label']
+
+    def test_wrong_relation(self):
+        provider = self._get_provider()
+        with pytest.raises(ValueError):
+            provider.get_by_id('1', resolve=['matches'])
+        assert provider.session.requests == []
+
+
+class TestPathToRoot:
+
+    #: `(id, label, parents)` of a small polyhierarchy, 4 is the facet.
+    HIERARCHY = [
+        ('1', 'churches', ['2', '3']),
+        ('2', 'religious buildings', ['4']),
+        ('3', 'buildings by function', ['4']),
+        ('4', 'Objects Facet', []),
+        ('5', 'chapels', ['2']),
+    ]
+
+    def _get_provider(self, **kwargs):
+        def responder(url, params):
+            query = params['query']
+            start = query.split('<http://vocab.getty.edu/aat/', 1)[1].split('>', 1)[0]
+            preferred = 'broaderPreferred' in query
+            todo, found = [start], []
+            while todo:
+                id = todo.pop()
+                for i, label, parents in self.HIERARCHY:
+                    if i == id and i not in found:
+                        found.append(i)
+                        todo.extend(parents[:1] if preferred else parents)
+            bindings = []
+            for id, label, parents in self.HIERARCHY:
+                if id not in found:
+                    continue
+                for parent in (parents[:1] if preferred else parents) or [None]:
+                    for term, lang in ((label, 'en'), (label + ' nl', 'nl')):
+                        binding = sparql_bindings([(id, 'Concept', term, lang)])['results']['bindings'][0]
+                        if parent is not None:
+                            binding['Parent'] = {'value': 'http://vocab.getty.edu/aat/%s' % parent}
+                        bindings.append(binding)
+            return FakeResponse({'results': {'bindings': bindings}})
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_preferred_path(self):
+        provider = self._get_provider()
+        path = provider.get_path_to_root('1')
+        assert [('4', 'Objects Facet'), ('2', 'religious buildings')] == [(i['id'], i['label']) for i in path]
+        assert len(provider.session.requests) == 1
+        query = provider.session.requests[0][1]['query']
+        assert '<http://vocab.getty.edu/aat/1> gvp:broaderPreferred* ?Subject' in query
+
+    def test_language(self):
+        path = self._get_provider().get_path_to_root('1', language='nl')
+        assert ['Objects Facet nl', 'religious buildings nl'] == [i['label'] for i in path]
+
+    def test_all_paths(self):
+        provider = self._get_provider()
+        paths = provider.get_path_to_root('1', all_paths=True)
+        assert [['4', '2'], ['4', '3']] == [[i['id'] for i in path] for path in paths]
+        assert 'gvp:broaderExtended' in provider.session.requests[0][1]['query']
+
+    def test_top(self):
+        assert [] == self._get_provider().get_path_to_root('4')
+
+    def test_invalid(self):
+        assert self._get_provider().get_path_to_root('6') is False
+
+    def test_prefixes_are_cached(self):
+        provider = self._get_provider()
+        provider.get_path_to_root('1')
+        assert ['4'] == [i['id'] for i in provider.get_path_to_root('2')]
+        assert [] == provider.get_path_to_root('4')
+        assert len(provider.session.requests) == 1
+        provider.get_path_to_root('2', language='nl')
+        provider.get_path_to_root('2', all_paths=True)
+        assert len(provider.session.requests) == 3
+
+    def test_shared_cache(self):
+        cache = MemoryCache()
+        self._get_provider(path_cache=cache).get_path_to_root('1')
+        provider = self._get_provider(path_cache=cache)
+        assert ['4'] == [i['id'] for i in provider.get_path_to_root('2')]
+        assert provider.session.requests == []
+
+
+class TestGetLabels:
+
+    def _get_provider(self, **kwargs):
+        def responder(url, params):
+            ids = [uri.rsplit('/', 1)[1] for uri in params['query'].split('{<', 1)[1].split('>}', 1)[0].split('> <')]
+            return FakeResponse(sparql_bindings(
+                [(id, 'Concept', 'label %s' % id, 'en') for id in ids if id != '3'] +
+                [(id, 'Concept', 'label %s nl' % id, 'nl') for id in ids if id == '2']
+            ))
+
+        return _fake_provider(responder, **kwargs)
+
+    def test_get_labels(self):
+        provider = self._get_provider()
+        labels = provider.get_labels(['1', '2', '3', 1], language='nl')
+        assert {'1': 'label 1', '2': 'label 2 nl', '3': None} == labels
+        assert len(provider.session.requests) == 1
+        assert {'2': 'label 2'} == provider.get_labels(['2'])
+
+    def test_batch_size(self):
+        provider = self._get_provider()
+        labels = provider.get_labels([str(i) for i in range(250)], batch_size=100)
+        assert 'label 249' == labels['249']
+        assert len(provider.session.requests) == 3
+
+    def test_cached(self):
+        provider = self._get_provider()
+        provider.get_labels(['1', '2'])
+        assert {'1': 'label 1', '2': 'label 2', '4': 'label 4'} == provider.get_labels(['1', '2', '4'])
+        assert len(provider.session.requests) == 2
+        assert 'VALUES ?Subject {<http://vocab.getty.edu/aat/4>}' in provider.session.requests[1][1]['query']
+
+    def test_shared_cache(self):
+        cache = MemoryCache()
+        self._get_provider(label_cache=cache).get_labels(['1'])
+        provider = self._get_provider(label_cache=cache)
+        assert {'1': 'label 1'} == provider.get_labels(['1'])
+        assert provider.session.requests == []
+
+
+class TestSuggest:
+
+    def test_suggest(self):
+        def responder(url, params):
+            return FakeResponse(content=concept_rdf('1', [('churches', 'en'), ('kerken', 'nl')]))
+
+        provider = _fake_provider(responder, label_index=LabelIndex())
+        assert provider.suggest('chu') == []
+        provider.get_by_id('1')
+        count = len(provider.session.requests)
+        assert [('1', 'churches')] == [(s['id'], s['label']) for s in provider.suggest('Chu')]
+        assert [('1', 'kerken')] == [(s['id'], s['label']) for s in provider.suggest('k', 'nl')]
+        assert len(provider.session.requests) == count
+
+    def test_no_label_index(self):
+        with pytest.raises(ValueError):
+            AATProvider({'id': 'AAT'}).suggest('chu')
+        with pytest.raises(ValueError):
+            AATProvider({'id': 'AAT'}).find({'label': 'chu', 'fuzzy': True})
+
+    def test_find_fuzzy(self):
+        index = LabelIndex()
+        index.add_all([
+            Concept('1', uri='http://vocab.getty.edu/aat/1', labels=[Label('églises', 'prefLabel', 'fr')]),
+            Collection('2', uri='http://vocab.getty.edu/aat/2', labels=[Label('<eglise forms>', 'prefLabel', 'en')]),
+        ])
+        provider = _fake_provider(None, label_index=index)
+        assert ['2', '1'] == [r['id'] for r in provider.find({'label': 'eglise', 'fuzzy': True})]
+        assert ['1'] == [r['id'] for r in provider.find({'label': 'eglise', 'fuzzy': True, 'type': 'concept'})]
+        assert ['2'] == [r['id'] for r in provider.find({'label': 'eglise', 'fuzzy': True}, limit=1)]
+        assert ['1', '2'] == [
+            r['id'] for r in provider.find({'label': 'eglise', 'fuzzy': True}, sort='id')]
+        assert provider.session.requests == []
+        with pytest.raises(ValueError):
+            provider.find({'label': 'eglise', 'fuzzy': True, 'collection': {'id': '2'}})
+
+
+class TestSpatial:
+
+    def test_find_within_and_nearest(self):
+        def responder(url, params):
+            return FakeResponse(content=concept_rdf('7000084', [('Belgium', 'en')], vocab='tgn', extra=TGN_PLACE))
+
+        provider = _fake_provider(responder, TGNProvider, spatial_index=SpatialIndex())
+        assert provider.find_within((3, 50, 5, 51)) == []
+        provider.get_by_id('7000084')
+        count = len(provider.session.requests)
+        assert [{'id': '7000084', 'uri': 'http://vocab.getty.edu/tgn/7000084', 'type': 'concept',
+                 'label': 'Belgium'}] == provider.find_within((3, 50, 5, 51), limit=1)
+        nearest = provider.find_nearest(51.2, 4.4, k=3)
+        assert ['7000084'] == [r['id'] for r in nearest]
+        assert 40 < nearest[0]['distance'] < 60
+        assert len(provider.session.requests) == count
+
+    def test_no_spatial_index(self):
+        with pytest.raises(ValueError):
+            TGNProvider({'id': 'TGN'}).find_nearest(51.2, 4.4)
+
+
+class TestLocalVocabulary:
+
+    def _get_provider(self):
+        builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+        builder.add_all([
+            Concept('1', labels=[Label('b', 'prefLabel', 'en')], narrower=['2', '3'],
+                    notes=[Note('modified', 'changeNote', 'en')]),
+            Concept('2', labels=[Label('z', 'prefLabel', 'en')], broader=['1']),
+            Concept('3', labels=[Label('a', 'prefLabel', 'en')], broader=['1']),
+        ])
+
+        def responder(url, params):
+            return FakeResponse({'results': {'bindings': []}})
+
+        return _fake_provider(responder, local_vocabulary=builder.build())
+
+    def test_served_locally(self):
+        provider = self._get_provider()
+        assert provider.get_by_id('1').notes == []
+        assert len(provider.get_by_id('1', change_notes=True).notes) == 1
+        assert provider.get_by_id('1').concept_scheme.uri == 'http://vocab.getty.edu/aat/'
+        assert ['3', '2'] == [c['id'] for c in provider.get_children_display('1', sort='label')]
+        assert ['3'] == [c['id'] for c in provider.get_children_display('1', sort='label', limit=1)]
+        assert ['1', '2', '3'] == sorted(provider.expand('1'))
+        assert provider.session.requests == []
+
+    def test_expand_like_getty(self):
+        builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+        builder.add_all([
+            Concept('1', labels=[Label('a', 'prefLabel', 'en')], narrower=['2'], subordinate_arrays=['3']),
+            Concept('2', labels=[Label('b', 'prefLabel', 'en')], broader=['1']),
+            Collection('3', labels=[Label('<c>', 'prefLabel', 'en')], members=['4'], superordinates=['1']),
+            Concept('4', labels=[Label('d', 'prefLabel', 'en')]),
+        ])
+        # The answers of the gvp:broaderExtended query for the same hierarchy
+        answers = {'1': ['1', '2', '3', '4'], '3': ['4']}
+
+        def responder(url, params):
+            id = params['query'].split('VALUES ?Id {\'', 1)[1].split("'", 1)[0]
+            return FakeResponse({'results': {'bindings': [{'Id': {'value': i}} for i in answers[id]]}})
+
+        remote = _fake_provider(responder)
+        local = _fake_provider(responder, local_vocabulary=builder.build())
+        for id in answers:
+            assert sorted(remote.expand(id)) == sorted(local.expand(id))
+        assert local.session.requests == []
+
+    def test_labels_like_getty(self):
+        labels = [('two', 'en'), ('twee', 'nl'), ('zwei', 'de')]
+        builder = CompactVocabularyBuilder('http://vocab.getty.edu/aat/')
+        builder.add_all([
+            Concept('1', labels=[Label('one', 'prefLabel', 'en')], narrower=['2']),
+            Concept('2', labels=[Label(label, 'prefLabel', lang) for label, lang in labels], broader=['1']),
+        ])
+
+        def responder(url, params):
+            return FakeResponse(sparql_bindings([('2', 'Concept', label, lang) for label, lang in labels]))
+
+        metadata = {'id': 'AAT', 'default_language': 'nl'}
+        remote = _fake_provider(responder, metadata=dict(metadata))
+        local = _fake_provider(responder, metadata=dict(metadata), local_vocabulary=builder.build())
+        for language in ('de', 'de-AT', 'nl-BE', 'en', 'fr'):
+            assert [c['label'] for c in remote.get_children_display('1', language=language)] == \
+                [c['label'] for c in local.get_children_display('1', language=language)]
+        assert 'twee' == local.get_children_display('1', language='de-AT')[0]['label']
+        assert local.session.requests == []
+
+    def test_fall_back_to_getty(self):
+        provider = self._get_provider()
+        assert provider.get_children_display('4') == []
+        assert len(provider.session.requests) == 1
+
+
+class TestStreamRdf:
+
+    def test_get_by_id(self):
+        streamed = []
+
+        def responder(url, params):
+            return FakeResponse(content=concept_rdf('1', [('kerken', 'nl')]))
+
+        session = FakeSession(responder)
+        get = session.get
+        session.get = lambda url, **kwargs: streamed.append(kwargs.get('stream')) or get(url, **kwargs)
+        provider = AATProvider({'id': 'AAT'}, session=session, stream_rdf=True)
+        assert provider.get_by_id('1').label('nl').label == 'kerken'
+        assert streamed == [True]
+
+
+class TestLazyImports:
+
+    def test_import_and_construct_without_heavy_dependencies(self):
+        script = (
+            "import sys\n"
+            "from skosprovider_getty.providers import AATProvider\n"
+            "provider = AATProvider({'id': 'AAT'})\n"
+            "provider.get_vocabulary_uri()\n"
+            "print(','.join(m for m in ('rdflib', 'requests') if m in sys.modules))\n"
+        )
+        res = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        assert res.stdout.strip() == ''
+
+    def test_loaded_on_first_use(self):
+        provider = AATProvider({'id': 'AAT'})
+        assert provider.session is get_default_transport()
+        assert isinstance(provider.session.session, requests.Session)
+        assert provider.subclasses.session is provider.session
+        assert len(provider.subclasses.get_subclasses(SKOS.Collection)) > 1
+
+    def test_assign_session_and_subclasses(self):
+        provider = AATProvider({'id': 'AAT'})
+        collector = provider.subclasses
+        sess = requests.Session()
+        provider.session = sess
+        assert sess == provider.session
+        assert sess == provider.subclasses.session
+        provider.subclasses = None
+        assert provider.subclasses is not collector
+        assert sess == provider.subclasses.session
+        provider.subclasses = collector
+        assert collector is provider.subclasses
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+from fakes import FakeResponse
+from fakes import FakeSession
+from fakes import concept_rdf
+from skosprovider.exceptions import ProviderUnavailableException
+
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.ratelimit import AdaptiveRateController
+
+
+class TestAdaptiveRateController:
+
+    def test_token_bucket(self):
+        controller = AdaptiveRateController(rate=20, min_rate=20, max_rate=20)
+        start = time.monotonic()
+        for i in range(5):
+            controller.send(lambda: FakeResponse())
+        assert time.monotonic() - start >= 0.15
+
+    def test_ramp_up(self):
+        controller = AdaptiveRateController(rate=40, concurrency=2)
+        for i in range(10):
+            controller.send(lambda: FakeResponse())
+        assert controller.rate > 40
+        assert controller.concurrency > 2
+        assert controller.latency is not None
+
+    def test_back_off_and_retry(self):
+        throttled = FakeResponse(status_code=429, headers={'Retry-After': '0'})
+        responses = [throttled, FakeResponse()]
+        controller = AdaptiveRateController(rate=10, concurrency=4)
+        res = controller.send(lambda: responses.pop(0))
+        assert res.status_code == 200
+        assert throttled.closed
+        assert not hasattr(res, 'closed')
+        # Halved by the 429, then grown a little by the 200
+        assert controller.rate < 10
+        assert controller.concurrency < 4
+
+    def test_give_up_after_retries(self):
+        controller = AdaptiveRateController(rate=10, max_retries=2, retry_delay=0)
+        calls = []
+
+        def request():
+            calls.append(1)
+            return FakeResponse(status_code=503)
+
+        assert controller.send(request).status_code == 503
+        assert len(calls) == 3
+
+    def test_latency_spike(self):
+        controller = AdaptiveRateController(rate=10, concurrency=4, min_spike=0.5)
+        for i in range(3):
+            controller.acquire()
+            controller.release(200, 0.1)
+        concurrency = controller.concurrency
+        controller.acquire()
+        controller.release(200, 2.0)
+        assert controller.concurrency < concurrency
+
+    def test_failure_backs_off(self):
+        controller = AdaptiveRateController(rate=10, concurrency=4)
+
+        def request():
+            raise ConnectionError()
+
+        with pytest.raises(ConnectionError):
+            controller.send(request)
+        assert controller.concurrency == 2
+        assert controller.active == 0
+
+    def test_concurrency_limit(self):
+        controller = AdaptiveRateController(rate=50, min_rate=50, concurrency=2, max_concurrency=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def request():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return FakeResponse()
+
+        threads = [threading.Thread(target=controller.send, args=(request,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert max(peak) <= 2
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            AdaptiveRateController(rate=100, max_rate=50)
+        with pytest.raises(ValueError):
+            AdaptiveRateController(concurrency=0)
+
+
+class TestProviderRateControl:
+
+    def test_retry_throttled(self):
+        responses = [FakeResponse(status_code=503, headers={'Retry-After': '0'})]
+
+        def responder(url, params):
+            if responses:
+                return responses.pop(0)
+            return FakeResponse(content=concept_rdf('1', [('one', 'en')]))
+
+        provider = AATProvider(
+            {'id': 'AAT'}, session=FakeSession(responder), rate_controller=AdaptiveRateController()
+        )
+        assert provider.get_by_id('1').label('en').label == 'one'
+        assert len(provider.session.requests) == 2
+
+    def test_without_controller(self):
+        def responder(url, params):
+            return FakeResponse(status_code=503)
+
+        provider = AATProvider({'id': 'AAT'}, session=FakeSession(responder))
+        with pytest.raises(ProviderUnavailableException):
+            provider.get_by_id('1')
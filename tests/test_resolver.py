@@ -0,0 +1,69 @@
+from fakes import FakeResponse
+from fakes import FakeSession
+from fakes import concepts_rdf
+
+from skosprovider_getty.providers import GettyProvider
+from skosprovider_getty.resolver import GettyResolver
+
+
+def responder(url, params):
+    if 'getty.edu/aat/' in params['query']:
+        return FakeResponse(content=concepts_rdf([('300007466', 'churches')], 'aat'))
+    return FakeResponse(content=concepts_rdf([('7000084', 'Belgium')], 'tgn'))
+
+
+class TestGettyResolver:
+
+    def test_route(self):
+        resolver = GettyResolver(session=FakeSession(responder))
+        groups, routes = resolver.route([
+            'http://vocab.getty.edu/aat/300007466',
+            'https://vocab.getty.edu/aat/300007466/',
+            'http://vocab.getty.edu/tgn/7000084-place',
+            'http://vocab.getty.edu/ulan/500115493-agent',
+            'https://id.erfgoed.net/thesauri/materialen/7',
+        ])
+        assert groups == {'aat': ['300007466'], 'tgn': ['7000084'], 'ulan': ['500115493']}
+        assert routes['https://vocab.getty.edu/aat/300007466/'] == ('aat', '300007466')
+        assert routes['https://id.erfgoed.net/thesauri/materialen/7'] is None
+
+    def test_resolve(self):
+        session = FakeSession(responder)
+        resolver = GettyResolver(session=session)
+        things = resolver.resolve([
+            'http://vocab.getty.edu/aat/300007466',
+            'https://vocab.getty.edu/aat/300007466/',
+            'http://vocab.getty.edu/tgn/7000084-place',
+            'http://vocab.getty.edu/tgn/1',
+            'urn:skosprovider:5',
+        ])
+        assert things['http://vocab.getty.edu/aat/300007466'].label('en').label == 'churches'
+        assert things['https://vocab.getty.edu/aat/300007466/'].id == '300007466'
+        assert things['http://vocab.getty.edu/tgn/7000084-place'].label('en').label == 'Belgium'
+        assert things['http://vocab.getty.edu/tgn/1'] is False
+        assert things['urn:skosprovider:5'] is None
+        # One query per vocabulary
+        assert len(session.requests) == 2
+
+    def test_only_given_providers(self):
+        session = FakeSession(responder)
+        resolver = GettyResolver(
+            [GettyResolver(session=session).providers['tgn']]
+        )
+        assert resolver.resolve(['http://vocab.getty.edu/aat/300007466']) == {
+            'http://vocab.getty.edu/aat/300007466': None
+        }
+        assert session.requests == []
+
+    def test_custom_base_url(self):
+        provider = GettyProvider(
+            {'id': 'AAT'}, base_url='http://localhost:8080/', session=FakeSession(responder))
+        resolver = GettyResolver([provider])
+        groups, routes = resolver.route([
+            'http://localhost:8080/aat/300007466',
+            'http://vocab.getty.edu/aat/300007466',
+            'http://localhost:8080/tgn/7000084',
+        ])
+        assert groups == {'aat': ['300007466']}
+        assert routes['http://localhost:8080/aat/300007466'] == ('aat', '300007466')
+        assert routes['http://localhost:8080/tgn/7000084'] is None
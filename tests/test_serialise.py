@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from skosprovider.skos import Collection
+from skosprovider.skos import Concept
+from skosprovider.skos import ConceptScheme
+from skosprovider.skos import Label
+from skosprovider.skos import Note
+from skosprovider.skos import Source
+
+from skosprovider_getty.serialise import decode_thing
+from skosprovider_getty.serialise import dump_thing
+from skosprovider_getty.serialise import encode_thing
+from skosprovider_getty.serialise import load_thing
+from skosprovider_getty.serialise import thing_to_dict
+
+
+def _concept():
+    return Concept(
+        '1', uri='http://vocab.getty.edu/aat/1',
+        labels=[Label('kerken', 'prefLabel', 'nl'), Label('église', 'altLabel', 'fr')],
+        notes=[Note('<p>Buildings</p>', 'scopeNote', 'en', 'HTML')],
+        sources=[Source('Getty')],
+        broader=['0'], narrower=['2'], subordinate_arrays=['3'],
+        matches={'exact': ['http://id.loc.gov/sh85123119'], 'close': []}
+    )
+
+
+class TestSerialise:
+
+    def test_concept(self):
+        concept = _concept()
+        scheme = ConceptScheme('http://vocab.getty.edu/aat/')
+        loaded = load_thing(dump_thing(concept), scheme)
+        assert loaded.type == 'concept'
+        assert loaded.uri == concept.uri
+        assert loaded.concept_scheme is scheme
+        assert loaded.label('fr').label == 'église'
+        assert loaded.notes[0].markup == 'HTML'
+        assert loaded.sources[0].citation == 'Getty'
+        assert loaded.broader == ['0']
+        assert loaded.subordinate_arrays == ['3']
+        assert loaded.matches['exact'] == ['http://id.loc.gov/sh85123119']
+        assert thing_to_dict(loaded) == thing_to_dict(concept)
+
+    def test_collection(self):
+        collection = Collection(
+            '3', uri='http://vocab.getty.edu/aat/3',
+            labels=[Label('<churches by form>', 'prefLabel', 'en')],
+            members=['4', '5'], superordinates=['1']
+        )
+        loaded = load_thing(dump_thing(collection))
+        assert loaded.type == 'collection'
+        assert loaded.members == ['4', '5']
+        assert loaded.superordinates == ['1']
+
+    def test_empty_fields_left_out(self):
+        data = thing_to_dict(Concept('1', uri='http://vocab.getty.edu/aat/1'))
+        assert data == {'type': 'concept', 'id': '1', 'uri': 'http://vocab.getty.edu/aat/1'}
+
+
+class TestBinaryCodec:
+
+    def test_round_trip(self):
+        concept = _concept()
+        data = encode_thing(concept)
+        assert data[:4] == b'SGC\x01'
+        assert thing_to_dict(decode_thing(data)) == thing_to_dict(concept)
+
+    def test_long_strings_and_many_strings(self):
+        note = 'Churches ' * 100 + '\u6559\u5802'
+        concept = Concept(
+            '300007466', uri='http://vocab.getty.edu/aat/300007466',
+            labels=[Label('label %d' % i, 'altLabel', 'en') for i in range(300)],
+            notes=[Note(note, 'scopeNote', 'zh-Hant')]
+        )
+        loaded = decode_thing(encode_thing(concept))
+        assert loaded.notes[0].note == note
+        assert loaded.notes[0].language == 'zh-Hant'
+        assert loaded.notes[0].markup is None
+        assert [label.label for label in loaded.labels] == [label.label for label in concept.labels]
+
+    def test_smaller_than_json(self):
+        concept = _concept()
+        assert len(encode_thing(concept)) < len(json.dumps(thing_to_dict(concept)))
+
+    def test_unknown_version(self):
+        data = bytearray(encode_thing(_concept()))
+        data[3] = 99
+        with pytest.raises(ValueError):
+            decode_thing(bytes(data))
+        with pytest.raises(ValueError):
+            decode_thing(b'not encoded')
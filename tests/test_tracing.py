@@ -0,0 +1,130 @@
+import logging
+from contextlib import contextmanager
+
+from fakes import FakeResponse
+from fakes import FakeSession
+from fakes import concept_rdf
+from fakes import sparql_bindings
+
+from skosprovider_getty import tracing
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.tracing import Tracing
+
+
+class FakeTracer:
+    '''
+    Records the spans like an OpenTelemetry tracer would start them.
+    '''
+
+    def __init__(self):
+        self.spans = []
+        self._stack = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        parent = self._stack[-1] if self._stack else None
+        self.spans.append((name, parent, attributes))
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+
+
+def _get_provider(**kwargs):
+    def responder(url, params):
+        if url.endswith('.rdf'):
+            return FakeResponse(content=concept_rdf('300007466', [('churches', 'en')]))
+        return FakeResponse(sparql_bindings([
+            ('300007466', 'Concept', 'churches', 'en'),
+            ('300007466', 'Concept', 'kerken', 'nl'),
+            ('300007501', 'Concept', 'cathedrals', 'en'),
+        ]))
+
+    return AATProvider({'id': 'AAT'}, session=FakeSession(responder), **kwargs)
+
+
+class TestTracing:
+
+    def test_stages(self):
+        t = Tracing(slow_query_threshold=0)
+        with t.trace('find') as trace:
+            with tracing.span('http'):
+                with tracing.span('parse'):
+                    pass
+            tracing.record(query='SELECT  *\n  {?s ?p ?o}', bindings=3)
+        assert set(trace.stages) == {'http', 'parse'}
+        assert trace.stages['http'] <= trace.duration
+        assert trace.queries == ['SELECT * {?s ?p ?o}']
+        assert trace.bindings == 3
+        assert trace.breakdown().startswith('http=')
+
+    def test_nested_calls_share_a_trace(self):
+        t = Tracing(slow_query_threshold=0)
+        with t.trace('get_by_uri') as outer:
+            with t.trace('get_by_id') as inner:
+                assert inner is outer
+
+    def test_disabled(self):
+        t = Tracing()
+        with t.trace('find') as trace:
+            with tracing.span('http'):
+                tracing.record(query='ASK {}')
+        assert trace is None
+
+
+class TestProviderTracing:
+
+    def test_spans(self):
+        tracer = FakeTracer()
+        provider = _get_provider(tracer=tracer)
+        provider.find({'label': 'church'}, sort='label')
+        names = [name for name, parent, attributes in tracer.spans]
+        assert names[0] == 'skosprovider_getty.find'
+        for stage in ('build_query', 'http', 'parse', 'sort'):
+            assert ('skosprovider_getty.' + stage, 'skosprovider_getty.find') in [
+                (name, parent) for name, parent, attributes in tracer.spans]
+        http = [attributes for name, parent, attributes in tracer.spans if name.endswith('http')]
+        assert http == [{'url': 'http://vocab.getty.edu/sparql.json'}]
+
+    def test_get_by_id_spans(self):
+        tracer = FakeTracer()
+        provider = _get_provider(tracer=tracer)
+        assert provider.get_by_id('300007466').label('en').label == 'churches'
+        names = [name for name, parent, attributes in tracer.spans]
+        assert names[0] == 'skosprovider_getty.get_by_id'
+        assert 'skosprovider_getty.things_from_graph' in names
+        assert 'skosprovider_getty.parse' in names
+
+    def test_get_all_stream_spans(self):
+        tracer = FakeTracer()
+        provider = _get_provider(tracer=tracer)
+        res = provider.get_all(stream=True, page_size=10)
+        assert tracer.spans == []
+        assert '300007466' == next(res)['id']
+        assert ('skosprovider_getty.http', 'skosprovider_getty.get_all') in [
+            (name, parent) for name, parent, attributes in tracer.spans]
+        # The caller's own calls between the items are traced separately
+        provider.get_by_id('300007466')
+        assert ('skosprovider_getty.get_by_id', None) in [
+            (name, parent) for name, parent, attributes in tracer.spans]
+        assert ['300007501'] == [r['id'] for r in res]
+
+    def test_slow_query_log(self, caplog):
+        provider = _get_provider(slow_query_threshold=0)
+        with caplog.at_level(logging.WARNING, logger='skosprovider_getty.slow_queries'):
+            provider.find({'label': 'church'})
+        assert len(caplog.records) == 1
+        record = caplog.records[0]
+        assert record.trace.name == 'find'
+        assert record.trace.bindings == 3
+        assert "luc:term 'church'" in record.trace.queries[0]
+        assert '\n' not in record.trace.queries[0]
+        assert 'http=' in record.getMessage()
+        assert '3 bindings' in record.getMessage()
+
+    def test_fast_queries_not_logged(self, caplog):
+        provider = _get_provider(slow_query_threshold=60)
+        with caplog.at_level(logging.WARNING, logger='skosprovider_getty.slow_queries'):
+            provider.find({'label': 'church'})
+        assert caplog.records == []
@@ -0,0 +1,135 @@
+import gzip
+import http.server
+import threading
+
+import pytest
+from fakes import concept_rdf
+from skosprovider.skos import ConceptScheme
+
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.providers import GettyProvider
+from skosprovider_getty.transport import Transport
+from skosprovider_getty.transport import get_default_transport
+from skosprovider_getty.utils import SubClassCollector
+from skosprovider_getty.utils import conceptscheme_from_uri
+from skosprovider_getty.utils import do_get_request
+from skosprovider_getty.utils import uri_to_graph
+
+ONTOLOGY = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+    b'xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#">'
+    b'<rdf:Description rdf:about="http://127.0.0.1/ontology#Sub">'
+    b'<rdfs:subClassOf rdf:resource="http://www.w3.org/2004/02/skos/core#Concept"/>'
+    b'</rdf:Description></rdf:RDF>'
+)
+
+
+class GettyServer:
+    '''
+    A local HTTP/1.1 server that serves RDF documents and counts the
+    connections opened to it.
+    '''
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                if self.path.startswith('/ontology'):
+                    body = ONTOLOGY
+                elif self.path.endswith('.rdf'):
+                    body = concept_rdf(self.path.rsplit('/', 1)[1][:-4], [('kerken', 'nl')])
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rdf+xml')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    server = GettyServer()
+    yield server
+    server.close()
+
+
+class TestTransport:
+
+    def test_connections_are_reused(self, server):
+        with Transport() as transport:
+            for i in range(5):
+                assert do_get_request(server.url + 'aat/%d.rdf' % i, transport).status_code == 200
+            assert uri_to_graph(server.url + 'aat/6.rdf', session=transport)
+            assert uri_to_graph(server.url + 'aat/7.rdf', session=transport, stream=True)
+            conceptscheme_from_uri(server.url + 'aat/', session=transport)
+            collector = SubClassCollector(server.url + 'ontology#', session=transport)
+            assert len(collector.collect_subclasses(collector.namespace + 'Sub')) == 1
+        assert len(server.requests) == 9
+        assert server.connections == 1
+
+    def test_provider(self, server):
+        transport = Transport()
+        provider = GettyProvider(
+            {'id': 'AAT'}, session=transport, base_url=server.url, vocab_id='aat',
+            concept_scheme=ConceptScheme(server.url + 'aat/'))
+        for i in range(3):
+            assert provider.get_by_id(str(i)).label('nl').label == 'kerken'
+        assert server.connections == 1
+        transport.close()
+
+    def test_compression(self, server):
+        transport = Transport()
+        res = do_get_request(server.url + 'aat/1.rdf', transport)
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert res.content.startswith(b'<?xml')
+        assert 'gzip' in server.requests[0][1]['Accept-Encoding']
+        transport.close()
+
+    def test_no_compression_no_keep_alive(self, server):
+        transport = Transport(compression=False, keep_alive=False, headers={'User-Agent': 'test'})
+        for i in range(2):
+            res = do_get_request(server.url + 'aat/%d.rdf' % i, transport)
+            assert 'Content-Encoding' not in res.headers
+        assert server.requests[0][1]['Accept-Encoding'] == 'identity'
+        assert server.requests[0][1]['User-Agent'] == 'test'
+        assert server.connections == 2
+        transport.close()
+
+    def test_pool_size(self):
+        transport = Transport(pool_connections=2, pool_maxsize=3)
+        adapter = transport.session.get_adapter('http://vocab.getty.edu/')
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 3
+        transport.close()
+
+    def test_default_transport_is_shared(self):
+        assert get_default_transport() is get_default_transport()
+        assert AATProvider({'id': 'AAT'}).session is get_default_transport()
@@ -1,11 +1,21 @@
+import http.server
+import threading
+
 import pytest
 import rdflib
+from fakes import FakeResponse
+from fakes import concept_rdf
 from rdflib.namespace import SKOS
+from requests.exceptions import ChunkedEncodingError
 from skosprovider.exceptions import ProviderUnavailableException
 
+from skosprovider_getty.cache import MemoryCache
 from skosprovider_getty.utils import GVP
 from skosprovider_getty.utils import ISO
+from skosprovider_getty.utils import ResponseReader
 from skosprovider_getty.utils import SubClassCollector
+from skosprovider_getty.utils import sparql_literal
+from skosprovider_getty.utils import stream_to_graph
 from skosprovider_getty.utils import uri_to_graph
 
 
@@ -54,3 +64,76 @@ class TestUtils:
         list_concept_subclasses = subclasses.collect_subclasses(ISO.ThesaurusArray)
         assert len(list_concept_subclasses)
         assert ISO.ThesaurusArray in list_concept_subclasses
+
+
+class TestStreamToGraph:
+
+    def _get_server(self, document):
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != '/aat/1.rdf':
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rdf+xml')
+                self.send_header('Content-Length', str(len(document)))
+                self.end_headers()
+                for i in range(0, len(document), 1000):
+                    self.wfile.write(document[i:i + 1000])
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def test_reader(self):
+        document = concept_rdf('1', [('kerken %d' % i, 'nl') for i in range(100)])
+        chunks = []
+        reader = ResponseReader(FakeResponse(content=document), chunk_size=100, chunks=chunks)
+        assert reader.read(30) == document[:30]
+        assert reader.read() == document[30:]
+        assert b''.join(chunks) == document
+
+    def test_stream_to_graph(self):
+        res = FakeResponse(content=concept_rdf('1', [('kerken', 'nl')]))
+        graph = stream_to_graph(res)
+        assert len(graph) == 2
+        assert res.closed
+
+    def test_uri_to_graph(self):
+        document = concept_rdf('1', [('label %d' % i, 'en') for i in range(2000)])
+        server = self._get_server(document)
+        url = 'http://127.0.0.1:%d/aat/' % server.server_address[1]
+        cache = MemoryCache()
+        try:
+            graph = uri_to_graph(url + '1.rdf', stream=True, cache=cache)
+            assert len(graph) == 2001
+            assert cache.get(url + '1.rdf') == document
+            assert uri_to_graph(url + '2.rdf', stream=True) is False
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_broken_response(self):
+        class BrokenResponse(FakeResponse):
+            url = 'http://vocab.getty.edu/aat/1.rdf'
+
+            def iter_content(self, chunk_size=1):
+                yield self.content[:50]
+                raise ChunkedEncodingError('Connection broken')
+
+        res = BrokenResponse(content=concept_rdf('1', [('kerken', 'nl')]))
+        with pytest.raises(ProviderUnavailableException):
+            stream_to_graph(res)
+        assert res.closed
+
+
+class TestSparqlLiteral:
+
+    def test_sparql_literal(self):
+        assert "'300007466'" == sparql_literal('300007466')
+        assert "'1\\') || (\\'1'" == sparql_literal("1') || ('1")
+        assert "'a\\\\b\\nc'" == sparql_literal('a\\b\nc')
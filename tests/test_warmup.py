@@ -0,0 +1,96 @@
+import time
+
+from fakes import FakeResponse
+from fakes import FakeSession
+from fakes import concept_rdf
+
+from skosprovider_getty.cache import MemoryCache
+from skosprovider_getty.cache import SQLiteCache
+from skosprovider_getty.providers import AATProvider
+from skosprovider_getty.ratelimit import AdaptiveRateController
+from skosprovider_getty.warmup import main
+from skosprovider_getty.warmup import warm_up
+
+
+def _responder(url, params):
+    id = url.rsplit('/', 1)[1].split('.')[0]
+    if id == 'missing':
+        return FakeResponse(status_code=404, content=b'')
+    return FakeResponse(content=concept_rdf(id, [('concept %s' % id, 'en')]))
+
+
+class TestWarmUp:
+
+    def test_warm_up_fills_cache(self):
+        session = FakeSession(_responder)
+        provider = AATProvider({'id': 'AAT'}, session=session, cache=MemoryCache())
+        stats = warm_up(provider, ['1', '2', '2', 'missing'], concurrency=2)
+        assert stats['total'] == 3
+        assert stats['fetched'] == 2
+        assert stats['failed'] == 1
+        assert 'http://vocab.getty.edu/aat/1.rdf' in provider.cache
+        provider.get_by_id('1')
+        assert len(session.requests) == 3
+
+    def test_warm_up_resumes(self):
+        session = FakeSession(_responder)
+        provider = AATProvider({'id': 'AAT'}, session=session, cache=MemoryCache())
+        warm_up(provider, ['1'])
+        stats = warm_up(provider, ['1', '2'])
+        assert stats['skipped'] == 1
+        assert stats['fetched'] == 1
+        assert len(session.requests) == 2
+
+    def test_paced_by_rate_controller(self):
+        sent = []
+
+        def responder(url, params):
+            sent.append(time.monotonic())
+            return _responder(url, params)
+
+        controller = AdaptiveRateController(rate=20, min_rate=0.5, max_rate=20)
+        provider = AATProvider(
+            {'id': 'AAT'}, session=FakeSession(responder), cache=MemoryCache(), rate_controller=controller
+        )
+        stats = warm_up(provider, [str(i) for i in range(6)], concurrency=4)
+        assert stats['fetched'] == 6
+        # One request may be sent at once, the others are spaced 1/20s apart.
+        assert sent[-1] - sent[0] >= 0.2
+        assert controller.rate == 20
+        assert controller.active == 0
+
+    def test_main_rate(self, tmp_path, monkeypatch):
+        created = []
+        monkeypatch.setattr('requests.Session.get', lambda self, url, **kw: _responder(url, None))
+        monkeypatch.setattr(
+            'skosprovider_getty.warmup.AdaptiveRateController',
+            lambda **kw: created.append(AdaptiveRateController(**kw)) or created[-1]
+        )
+        cache = str(tmp_path / 'cache.sqlite')
+        assert main(['aat', '1', '2', '--cache', cache, '--rate', '10', '--concurrency', '2']) == 0
+        assert created[0].max_rate == 10
+        assert created[0].max_concurrency == 2
+
+    def test_main(self, tmp_path, monkeypatch):
+        uri_file = tmp_path / 'uris.txt'
+        uri_file.write_text('http://vocab.getty.edu/aat/3\n\n')
+        cache = str(tmp_path / 'cache.sqlite')
+        monkeypatch.setattr('requests.Session.get', lambda self, url, **kw: _responder(url, None))
+        assert main(['aat', '1', '2', '--uri-file', str(uri_file), '--cache', cache]) == 0
+        assert len(SQLiteCache(cache)) == 3
+
+    def test_main_uri_variants(self, tmp_path, monkeypatch, caplog):
+        uri_file = tmp_path / 'uris.txt'
+        uri_file.write_text(
+            'https://vocab.getty.edu/tgn/7000084-place\n'
+            'http://vocab.getty.edu/tgn/1000/\n'
+            'http://vocab.getty.edu/aat/300007466\n'
+        )
+        cache = str(tmp_path / 'cache.sqlite')
+        monkeypatch.setattr('requests.Session.get', lambda self, url, **kw: _responder(url, None))
+        assert main(['tgn', '--uri-file', str(uri_file), '--cache', cache]) == 0
+        stored = SQLiteCache(cache)
+        assert 'http://vocab.getty.edu/tgn/7000084.rdf' in stored
+        assert 'http://vocab.getty.edu/tgn/1000.rdf' in stored
+        assert len(stored) == 2
+        assert 'Skipping http://vocab.getty.edu/aat/300007466' in caplog.text